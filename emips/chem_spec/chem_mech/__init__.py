@@ -38,3 +38,6 @@ class ChemMechEnum(Enum):
 
     def lump_RETRO(self, spec, biomass=False):
         return self.value.lump_RETRO(spec, biomass)
+
+    def lump_RETRO_matrix(self, retro_names, biomass=False, molar=True):
+        return self.value.lump_RETRO_matrix(retro_names, biomass, molar)
@@ -64,3 +64,30 @@ class ChemicalMechanism(object):
             the chemical mechanism species.
         """
         pass
+
+    def lump_RETRO_matrix(self, retro_names, biomass=False, molar=True):
+        """
+        Get the lumping coefficient matrix from RETRO species to the NMVOC species of this
+        chemical mechanism.
+        :param retro_names: (*list of str*) The available RETRO species names.
+        :param biomass: (*bool*) Whether is biomass section. Default is `False`.
+        :param molar: (*bool*) Divide the coefficients by the molar mass of the species to get
+            moles or not. Default is `True`.
+        :return: (*tuple*) NMVOC species list, used RETRO species name list and coefficient
+            matrix (list of lists, NMVOC species x used RETRO species).
+        """
+        species = self.nmvoc_species()
+        rows = []
+        names = []
+        for spec in species:
+            row = {}
+            for rspec, ratio in self.lump_RETRO(spec, biomass).items():
+                if rspec.name in retro_names:
+                    if molar and spec.molar_mass is not None:
+                        ratio = ratio / float(spec.molar_mass)
+                    row[rspec.name] = row.get(rspec.name, 0) + ratio
+                    if rspec.name not in names:
+                        names.append(rspec.name)
+            rows.append(row)
+        matrix = [[row.get(name, 0.) for name in names] for row in rows]
+        return species, names, matrix
@@ -1,10 +1,9 @@
-from .species_reference import SpeciesReferenceItem, SpeciesReference
-from .species_profile import SpeciesProfile
-from .pollutant_profile import PollutantProfile
 from .pollutant import Pollutant
+from .speciation_index import get_speciation_index
 import mipylib.numeric as np
 
-__all__ = ['get_pollutant_profile', 'read_file', 'speciation', 'get_model_species_WRFChem', 'get_model_species_CMAQ']
+__all__ = ['get_pollutant_profile', 'read_file', 'get_species_factors', 'speciation', 'get_wrfchem_mechanism_name',
+           'get_model_species_WRFChem', 'get_model_species_CMAQ']
 
 
 def get_pollutant_profile(poll_profiles, pollutant):
@@ -22,81 +21,75 @@ def get_pollutant_profile(poll_profiles, pollutant):
     return None
 
 
-def read_file(ref_fn, profile_fn, scc):
+def read_file(ref_fn, profile_fn, scc, cache_dir=None):
     """
-    Read pollutant profiles from reference and profile files
+    Read pollutant profiles from reference and profile files. The files are indexed once and
+    cached, see `get_speciation_index`.
     :param ref_fn: The reference file
     :param profile_fn: The profile file
     :param scc: Source classification code
+    :param cache_dir: The directory of binary index file. Default is `None`.
     :return: Pollutant profiles
     """
-    # Read reference file
-    spec_ref = SpeciesReference()
-    n = len(scc)
-    ref_f = open(ref_fn)
-    for line in ref_f:
-        line = line.strip()
-        if len(line) < n:
-            continue
-        data = line.split()
-        if data[0] == scc:
-            ref_item = SpeciesReferenceItem.read_string(line)
-            spec_ref.append(ref_item)
-    ref_f.flush()
-    ref_f.close()
-
-    # Read profile file
-    pollutant_profiles = []
-    profile_f = open(profile_fn)
-    poll_names = []
-    for line in profile_f:
-        line = line.strip()
-        if not line:
-            continue
-        if line[0] == "#":
-            continue
-        data = line.split()
-        profile_id = data[0]
-        poll_name = data[1]
-        if spec_ref.contains(profile_id, poll_name):
-            ppi = SpeciesProfile.read_string(line)
-            if poll_name in poll_names:
-                poll_profile = get_pollutant_profile(pollutant_profiles, poll_name)
-                poll_profile.append(ppi)
-            else:
-                poll_profile = PollutantProfile(poll_name)
-                poll_profile.append(ppi)
-                pollutant_profiles.append(poll_profile)
-                poll_names.append(poll_name)
-    profile_f.flush()
-    profile_f.close()
-    return pollutant_profiles
-
-
-def speciation(data, pollutant_profile):
+    index = get_speciation_index(ref_fn, profile_fn, cache_dir)
+    return index.get_pollutant_profiles(scc)
+
+
+def get_species_factors(pollutant_profile, ratio=1., molar=True):
+    """
+    Get the factors to convert pollutant data to species data. The mass fraction, the molar mass
+    and the extra ratio are combined into one factor of each species, so the species data is
+    calculated by one multiplication.
+    :param pollutant_profile: (*PollutantProfile*) The pollutant profile.
+    :param ratio: (*float*) Extra ratio, such as units conversion ratio. Default is 1.
+    :param molar: (*bool*) Divide by the molar mass of the species with molar mass or not. Default
+        is True.
+    :return: (*list*) Species factors.
+    """
+    factors = []
+    for spec_prof in pollutant_profile.species_profiles:
+        factor = spec_prof.mass_fraction * ratio
+        if molar and spec_prof.species.molar_mass is not None:
+            factor = factor / spec_prof.species.molar_mass
+        factors.append(factor)
+    return factors
+
+
+def speciation(data, pollutant_profile, ratio=1., molar=False):
     """
     Chemical speciation.
     :param data: (*array*) Pollutant data array.
     :param pollutant_profile: (*PollutantProfile*) The pollutant profile.
+    :param ratio: (*float*) Extra ratio, such as units conversion ratio. Default is 1.
+    :param molar: (*bool*) Convert to moles by the molar mass of the species or not. Default is
+        False.
     :return: (*array*) Species data array.
     """
-    shape = list(data.shape)
-    n = len(pollutant_profile)
-    shape.insert(0, n)
-    s_data = np.zeros(shape)
-    for i in range(n):
-        s_data[i] = data * pollutant_profile[i].mass_fraction
-    return s_data
+    factors = np.array(get_species_factors(pollutant_profile, ratio, molar))
+    shape = [len(factors)] + [1] * data.ndim
+    return factors.reshape(*shape) * data
+
+
+def get_wrfchem_mechanism_name(mechanism_name):
+    """
+    Get the WRF-Chem mechanism name, which is the lower case name without `_wrfchem` suffix.
+    :param mechanism_name: (*string*) The name of chemical mechanism, such as `CB05_wrfchem`.
+    :return: (*string*) The WRF-Chem mechanism name [cb05 | radm2 | saprc99 | mozart].
+    """
+    mechanism_name = mechanism_name.lower()
+    if mechanism_name.endswith('_wrfchem'):
+        mechanism_name = mechanism_name[:-len('_wrfchem')]
+    return mechanism_name
 
 
 def get_model_species_WRFChem(mechanism_name):
     """
     Get species under different chemical mechanisms in WRF-Chem.
     (E_PM10: saprc99, cb05 E_PM_10: radm2, mozart)
-    :param mechanism_name: (*string*) The name of chemical mechanism.
+    :param mechanism_name: (*string*) The name of chemical mechanism, such as `CB05_wrfchem` or `cb05`.
     :return: (*list*) All species(out_species) and aerosols(out_species_aer) under chemical mechanisms.
     """
-    mechanism_name = mechanism_name.lower()
+    mechanism_name = get_wrfchem_mechanism_name(mechanism_name)
     if mechanism_name == 'cb05':
         ##########################################
         #------CB05, emiss_opt=15, (52, 15)------#
@@ -152,6 +145,8 @@ def get_model_species_WRFChem(mechanism_name):
         out_species_aer = ['E_PM25I', 'E_PM25J', 'E_ECI', 'E_ECJ', 'E_ORGI', 'E_ORGJ', 'E_SO4I', 'E_SO4J',
                            'E_NO3I', 'E_NO3J', 'E_NH4I', 'E_NH4J', 'E_NAI', 'E_NAJ', 'E_CLI', 'E_CLJ',
                            'E_CO_A', 'E_ORGI_A', 'E_ORGJ_A', 'E_CO_BB', 'E_ORGI_BB', 'E_ORGJ_BB', 'E_PM_10']
+    else:
+        raise ValueError('Not supported WRF-Chem chemical mechanism: {}'.format(mechanism_name))
 
     return out_species, out_species_aer
     
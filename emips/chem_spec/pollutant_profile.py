@@ -27,6 +27,9 @@ class PollutantProfile(object):
 
     __repr__ = __str__
 
+    def __len__(self):
+        return len(self.species_profiles)
+
     def __getitem__(self, item):
         if isinstance(item, int):
             return self.species_profiles[item]
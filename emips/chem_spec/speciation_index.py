@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from .species_reference import SpeciesReferenceItem, SpeciesReference
+from .species_profile import SpeciesProfile
+from .pollutant_profile import PollutantProfile
+
+__all__ = ['SpeciationIndex', 'get_speciation_index']
+
+# Speciation indexes by (reference file, modified time, profile file, modified time)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class SpeciationIndex(object):
+
+    def __init__(self, ref_fn, profile_fn, references=None, profiles=None):
+        """
+        Index of speciation reference and profile files. The files are parsed once, the
+        reference items are keyed by source classification code and the profile lines are
+        keyed by profile ID.
+
+        :param ref_fn: (*str*) The reference file.
+        :param profile_fn: (*str*) The profile file.
+        :param references: (*dict*) Parsed (profile ID, pollutant name) list by SCC. Default is
+            `None` that the reference file is parsed.
+        :param profiles: (*dict*) Parsed (line number, pollutant name, line) list by profile ID.
+            Default is `None` that the profile file is parsed.
+        """
+        self.ref_fn = ref_fn
+        self.profile_fn = profile_fn
+        self.references = self._read_ref(ref_fn) if references is None else references
+        self.profiles = self._read_profile(profile_fn) if profiles is None else profiles
+
+    def __str__(self):
+        return 'SpeciationIndex: {}; {}; SCC number: {}; Profile number: {}'.format(
+            self.ref_fn, self.profile_fn, len(self.references), len(self.profiles))
+
+    __repr__ = __str__
+
+    @staticmethod
+    def _read_ref(ref_fn):
+        references = {}
+        ref_f = open(ref_fn)
+        for line in ref_f:
+            line = line.strip()
+            data = line.split()
+            if len(data) < 3:
+                continue
+            item = SpeciesReferenceItem.read_string(line)
+            references.setdefault(item.scc, []).append((item.profile_id, item.pollutant.name))
+        ref_f.close()
+        return references
+
+    @staticmethod
+    def _read_profile(profile_fn):
+        profiles = {}
+        profile_f = open(profile_fn)
+        for i, line in enumerate(profile_f):
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == "#":
+                continue
+            data = line.split()
+            if len(data) < 2:
+                continue
+            profiles.setdefault(data[0], []).append((i, data[1], line))
+        profile_f.close()
+        return profiles
+
+    def get_reference(self, scc):
+        """
+        Get species reference of a source classification code.
+
+        :param scc: (*str*) Source classification code.
+
+        :return: (*SpeciesReference*) Species reference.
+        """
+        return SpeciesReference([SpeciesReferenceItem(scc, profile_id, name)
+                                 for profile_id, name in self.references.get(scc, [])])
+
+    def get_pollutant_profiles(self, scc):
+        """
+        Get pollutant profiles of a source classification code. The pollutant and species
+        orders are same with the profile file.
+
+        :param scc: (*str*) Source classification code.
+
+        :return: (*list of PollutantProfile*) Pollutant profiles.
+        """
+        refs = set(self.references.get(scc, []))
+        lines = []
+        for profile_id in set(r[0] for r in refs):
+            for i, poll_name, line in self.profiles.get(profile_id, []):
+                if (profile_id, poll_name) in refs:
+                    lines.append((i, poll_name, line))
+        lines.sort()
+
+        pollutant_profiles = []
+        poll_profiles = {}
+        for i, poll_name, line in lines:
+            ppi = SpeciesProfile.read_string(line)
+            if poll_name in poll_profiles:
+                poll_profiles[poll_name].append(ppi)
+            else:
+                poll_profile = PollutantProfile(poll_name)
+                poll_profile.append(ppi)
+                pollutant_profiles.append(poll_profile)
+                poll_profiles[poll_name] = poll_profile
+        return pollutant_profiles
+
+    def save(self, fn):
+        """
+        Save the index to a binary file.
+
+        :param fn: (*str*) The file name.
+        """
+        index_f = open(fn, 'wb')
+        pickle.dump((self.ref_fn, self.profile_fn, self.references, self.profiles), index_f,
+                    pickle.HIGHEST_PROTOCOL)
+        index_f.close()
+
+    @classmethod
+    def load(cls, fn):
+        """
+        Load the index from a binary file.
+
+        :param fn: (*str*) The file name.
+
+        :return: (*SpeciationIndex*) The index.
+        """
+        index_f = open(fn, 'rb')
+        ref_fn, profile_fn, references, profiles = pickle.load(index_f)
+        index_f.close()
+        return cls(ref_fn, profile_fn, references, profiles)
+
+
+def get_speciation_index(ref_fn, profile_fn, cache_dir=None):
+    """
+    Get speciation index. The index is cached in memory by the file paths and modified times,
+    so the files are parsed only once in a process.
+
+    :param ref_fn: (*str*) The reference file.
+    :param profile_fn: (*str*) The profile file.
+    :param cache_dir: (*str*) The directory to save and load the binary index file. Default is
+        `None` that the index is only cached in memory.
+
+    :return: (*SpeciationIndex*) Speciation index.
+    """
+    ref_fn = os.path.abspath(ref_fn)
+    profile_fn = os.path.abspath(profile_fn)
+    key = (ref_fn, os.path.getmtime(ref_fn), profile_fn, os.path.getmtime(profile_fn))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            return index
+
+        fn = None
+        if cache_dir is not None:
+            fn = os.path.join(cache_dir, 'spec_index_{}.pkl'.format(hashlib.md5(str(key)).hexdigest()))
+            if os.path.isfile(fn):
+                try:
+                    index = SpeciationIndex.load(fn)
+                except Exception:
+                    print('Alarm! Speciation index file can not be loaded: {}'.format(fn))
+        if index is None:
+            index = SpeciationIndex(ref_fn, profile_fn)
+            if fn is not None:
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                index.save(fn)
+        _indexes[key] = index
+        return index
@@ -61,6 +61,18 @@ class SpeciesReference(list):
         """
         list.__init__([])
         self.extend(spref_items)
+        self._index = None
+        self._index_len = 0
+
+    def _get_index(self):
+        # Rebuild the index when items are added or removed
+        if self._index is None or self._index_len != len(self):
+            index = {}
+            for item in self:
+                index.setdefault((item.profile_id, item.pollutant.name), []).append(item)
+            self._index = index
+            self._index_len = len(self)
+        return self._index
 
     def contains(self, profile_id, pollutant):
         """
@@ -71,7 +83,7 @@ class SpeciesReference(list):
         """
         if isinstance(pollutant, basestring):
             pollutant = Pollutant(pollutant)
-        for item in self:
-            if item.profile_id == profile_id and item.pollutant == pollutant:
+        for item in self._get_index().get((profile_id, pollutant.name), []):
+            if item.pollutant == pollutant:
                 return True
         return False
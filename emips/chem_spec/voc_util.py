@@ -1,6 +1,17 @@
+import hashlib
+import os
+import threading
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 
-__all__ = ["GridSpecReader"]
+from mipylib import dataset
+from mipylib import numeric as np
+
+__all__ = ["GridSpecReader", "GridSpecCache", "get_grid_spec_cache"]
+
+# Grid speciation caches by cache directory
+_grid_spec_caches = {}
+_grid_spec_caches_lock = threading.Lock()
 
 
 class GridSpecReader(object):
@@ -60,3 +71,145 @@ class GridSpecReader(object):
         :return: (*GridDesc*) Species grid description.
         """
         pass
+
+
+class GridSpecCache(object):
+
+    def __init__(self, cache_dir=None):
+        """
+        Cache of grid speciation ratio fields on the model grid. The fields are kept in memory by
+        sector, model grid, regrid method and grid speciation data file (with its modified time),
+        and optionally saved in a directory as netCDF files (one file for each key) to be used
+        by later runs.
+
+        :param cache_dir: (*str*) The directory to save and load the ratio fields. Default is
+            `None` that the fields are only cached in memory.
+        """
+        self.cache_dir = cache_dir
+        self.fields = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def get_key(sector, grid, source=None, method=None):
+        """
+        Get the cache key of the ratio fields.
+
+        :param sector: (*Sector*) The sector.
+        :param grid: (*GridDesc*) The model grid.
+        :param source: (*str*) The grid speciation data file. Its modified time is included, so
+            the fields are updated when the file is changed. Default is `None`.
+        :param method: (*str*) The regrid method and settings to get the fields on the model
+            grid. Default is `None`.
+
+        :return: (*tuple*) The cache key.
+        """
+        key = [sector.name, grid.key(), method]
+        if source is not None and os.path.isfile(source):
+            key.extend([os.path.abspath(source), os.path.getmtime(source)])
+        return tuple(key)
+
+    def get_fn(self, sector, grid, source=None, method=None):
+        """
+        Get the cache file name of the ratio fields.
+
+        :param sector: (*Sector*) The sector.
+        :param grid: (*GridDesc*) The model grid.
+        :param source: (*str*) The grid speciation data file. Default is `None`.
+        :param method: (*str*) The regrid method and settings. Default is `None`.
+
+        :return: (*str*) Cache file name. `None` if the cache directory is not set.
+        """
+        if self.cache_dir is None:
+            return None
+        key = self.get_key(sector, grid, source, method)
+        return os.path.join(self.cache_dir, 'grid_spec_{}_{}.nc'.format(
+            sector.name, hashlib.md5(str(list(key))).hexdigest()))
+
+    def get(self, sector, names, grid, read_func, source=None, method=None):
+        """
+        Get ratio fields on the model grid. The fields not in the cache are got by `read_func`
+        and added into the cache. The fields of different keys can be got at the same time.
+
+        :param sector: (*Sector*) The sector.
+        :param names: (*list of str*) The species names.
+        :param grid: (*GridDesc*) The model grid.
+        :param read_func: (*function*) The function to get the ratio field of a species on the
+            model grid with the species name as argument.
+        :param source: (*str*) The grid speciation data file. Default is `None`.
+        :param method: (*str*) The regrid method and settings used by `read_func`. Default is
+            `None`.
+
+        :return: (*OrderedDict*) The ratio fields by species name.
+        """
+        key = self.get_key(sector, grid, source, method)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                fields = self.fields.get(key)
+            fn = self.get_fn(sector, grid, source, method)
+            if fields is None:
+                fields = {}
+                if fn is not None and os.path.isfile(fn):
+                    print('Load grid speciation ratios: {}'.format(fn))
+                    f = dataset.addfile(fn)
+                    for var in f.variables:
+                        if var.ndim == 2:
+                            fields[var.name] = f[var.name][:]
+                    f.close()
+                with self._lock:
+                    self.fields[key] = fields
+
+            missing = [name for name in names if name not in fields]
+            for name in missing:
+                fields[name] = read_func(name)
+            if missing and fn is not None:
+                self._save(fn, fields, grid)
+
+            return OrderedDict((name, fields[name]) for name in names)
+
+    def _save(self, fn, fields, grid):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        print('Save grid speciation ratios: {}'.format(fn))
+        ydim = np.dimension(grid.y_coord, 'lat', 'Y')
+        xdim = np.dimension(grid.x_coord, 'lon', 'X')
+        dims = [ydim, xdim]
+        gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo', grid=str(grid.key()))
+        dimvars = []
+        for name in fields.keys():
+            dimvar = dataset.DimVariable()
+            dimvar.name = name
+            dimvar.dtype = np.dtype.float
+            dimvar.dims = dims
+            dimvars.append(dimvar)
+        ncfile = dataset.addfile(fn, 'c')
+        ncfile.nc_define(dims, gattrs, dimvars)
+        for name, data in fields.items():
+            ncfile.write(name, data)
+        ncfile.close()
+
+    def clear(self):
+        """
+        Release the ratio fields in memory.
+        """
+        with self._lock:
+            self.fields.clear()
+
+
+def get_grid_spec_cache(cache_dir=None):
+    """
+    Get the grid speciation cache of a cache directory, the cache is shared in a process.
+
+    :param cache_dir: (*str*) The cache directory. Default is `None`.
+
+    :return: (*GridSpecCache*) The grid speciation cache.
+    """
+    with _grid_spec_caches_lock:
+        cache = _grid_spec_caches.get(cache_dir)
+        if cache is None:
+            cache = GridSpecCache(cache_dir)
+            _grid_spec_caches[cache_dir] = cache
+        return cache
@@ -58,9 +58,12 @@ class RunConfigure(object):
         self.emission_month = None
 
         self.spatial_model_grid = None
+        self.spatial_regrid_weights = False
+        self.spatial_regrid_method = 'auto'
 
         self.temporal_prof_file = None
         self.temporal_ref_file = None
+        self.temporal_timeline = False
 
         self.chemical_prof_file = None
         self.chemical_ref_file = None
@@ -69,9 +72,21 @@ class RunConfigure(object):
         self.chemical_mechanism = None
 
         self.vertical_prof_file = None
+        self.vertical_stack_file = None
+        self.vertical_grid_file = None
+        self.vertical_layer_tops = None
+        self.vertical_cache = False
 
         self.run_output_dir = None
+        self.cache_dir = None
         self.is_run_vertical = None
+        self.run_workers = 1
+        self.run_in_memory = False
+        self.keep_intermediate = False
+        self.merge_chunk = 0
+        self.run_incremental = False
+        self.run_resume = False
+        self.run_profile = False
         self.post_process_file = None
 
         self.emission_module = None
@@ -124,12 +139,16 @@ class RunConfigure(object):
         y_num = int(model_grid.getAttribute('YNumber'))
         self.spatial_model_grid = GridDesc(proj=proj, x_orig=x_origin, x_cell=x_cell, x_num=x_num,
                                            y_orig=y_origin, y_cell=y_cell, y_num=y_num)
+        self.spatial_regrid_weights = True if spatial.getAttribute('RegridWeights') == 'True' else False
+        method = spatial.getAttribute('RegridMethod')
+        self.spatial_regrid_method = method if method else 'auto'
 
         # Temporal
         temporal = root.getElementsByTagName('Temporal')[0]
         file_name = temporal.getElementsByTagName('FileName')[0]
         self.temporal_prof_file = file_name.getAttribute('Profile')
         self.temporal_ref_file = file_name.getAttribute('Reference')
+        self.temporal_timeline = True if temporal.getAttribute('Timeline') == 'True' else False
 
         # Chemical
         chemical = root.getElementsByTagName("Chemical")[0]
@@ -148,13 +167,30 @@ class RunConfigure(object):
         vertical = root.getElementsByTagName('Vertical')[0]
         vfile_name = vertical.getElementsByTagName('FileName')[0]
         self.vertical_prof_file = vfile_name.getAttribute('Profile')
+        self.vertical_stack_file = vfile_name.getAttribute('Stack') or None
+        self.vertical_grid_file = vfile_name.getAttribute('Grid') or None
+        layer_tops = vertical.getAttribute('LayerTops')
+        self.vertical_layer_tops = [float(v) for v in layer_tops.split(',')] if layer_tops else None
+        self.vertical_cache = True if vertical.getAttribute('Cache') == "True" else False
 
         # Run
         run = root.getElementsByTagName("Run")[0]
         output = run.getElementsByTagName("Output")[0]
         self.run_output_dir = output.getAttribute("Directory")
+        cache = run.getElementsByTagName("Cache")
+        if len(cache) > 0:
+            self.cache_dir = cache[0].getAttribute("Directory")
         steps = run.getElementsByTagName("Steps")[0]
         self.is_run_vertical = True if steps.getAttribute("RunVertical") == "True" else False
+        workers = steps.getAttribute("Workers")
+        self.run_workers = int(workers) if workers else 1
+        self.run_in_memory = True if steps.getAttribute("InMemory") == "True" else False
+        self.keep_intermediate = True if steps.getAttribute("KeepIntermediate") == "True" else False
+        merge_chunk = steps.getAttribute("MergeChunk")
+        self.merge_chunk = int(merge_chunk) if merge_chunk else 0
+        self.run_incremental = True if steps.getAttribute("Incremental") == "True" else False
+        self.run_resume = True if steps.getAttribute("Resume") == "True" else False
+        self.run_profile = True if steps.getAttribute("Profile") == "True" else False
         post_process = run.getElementsByTagName("PostProcess")[0]
         self.post_process_file = os.path.abspath(os.path.join(dir_configure, post_process.getAttribute("ScriptFile")))
 
@@ -234,6 +270,8 @@ class RunConfigure(object):
 
         # Spatial
         spatial = doc.createElement('Spatial')
+        spatial.setAttribute('RegridWeights', 'True' if self.spatial_regrid_weights else 'False')
+        spatial.setAttribute('RegridMethod', self.spatial_regrid_method)
         model_grid = doc.createElement('ModelGrid')
         model_grid.setAttribute('Projection', self.spatial_model_grid.proj.toProj4String())
         model_grid.setAttribute('XOrigin', str(self.spatial_model_grid.x_orig))
@@ -247,6 +285,7 @@ class RunConfigure(object):
 
         # Temporal
         temporal = doc.createElement('Temporal')
+        temporal.setAttribute('Timeline', 'True' if self.temporal_timeline else 'False')
         file_name = doc.createElement('FileName')
         file_name.setAttribute('Profile', os.path.basename(self.temporal_prof_file))
         file_name.setAttribute('Reference', os.path.basename(self.temporal_ref_file))
@@ -272,8 +311,13 @@ class RunConfigure(object):
 
         # Vertical
         vertical = doc.createElement('Vertical')
+        if self.vertical_layer_tops:
+            vertical.setAttribute('LayerTops', ','.join(str(v) for v in self.vertical_layer_tops))
+        vertical.setAttribute('Cache', "True" if self.vertical_cache else "False")
         vfile_name = doc.createElement('FileName')
         vfile_name.setAttribute('Profile', self.vertical_prof_file)
+        vfile_name.setAttribute('Stack', self.vertical_stack_file or '')
+        vfile_name.setAttribute('Grid', self.vertical_grid_file or '')
         vertical.appendChild(vfile_name)
         root.appendChild(vertical)
 
@@ -282,8 +326,19 @@ class RunConfigure(object):
         output = doc.createElement("Output")
         output.setAttribute("Directory", self.run_output_dir)
         run.appendChild(output)
+        if self.cache_dir:
+            cache = doc.createElement("Cache")
+            cache.setAttribute("Directory", self.cache_dir)
+            run.appendChild(cache)
         steps = doc.createElement("Steps")
         steps.setAttribute("RunVertical", "True" if self.is_run_vertical else "False")
+        steps.setAttribute("Workers", str(self.run_workers))
+        steps.setAttribute("InMemory", "True" if self.run_in_memory else "False")
+        steps.setAttribute("KeepIntermediate", "True" if self.keep_intermediate else "False")
+        steps.setAttribute("MergeChunk", str(self.merge_chunk))
+        steps.setAttribute("Incremental", "True" if self.run_incremental else "False")
+        steps.setAttribute("Resume", "True" if self.run_resume else "False")
+        steps.setAttribute("Profile", "True" if self.run_profile else "False")
         run.appendChild(steps)
         post_process = doc.createElement("PostProcess")
         post_process.setAttribute("ScriptFile", os.path.relpath(self.post_process_file, dir_configure))
@@ -1,3 +1,11 @@
 from ._run import *
+from ._accumulator import *
+from ._checkpoint import *
+from ._manifest import *
+from ._batch import *
 
-__all__ = _run.__all__
\ No newline at end of file
+__all__ = _run.__all__
+__all__ += _accumulator.__all__
+__all__ += _checkpoint.__all__
+__all__ += _manifest.__all__
+__all__ += _batch.__all__
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+from mipylib import dataset
+from mipylib import numeric as np
+
+__all__ = ['SectorAccumulator']
+
+
+class SectorAccumulator(object):
+
+    def __init__(self, sector):
+        """
+        Accumulator of the speciated emission data of a sector. The species data of all the
+        pollutants are summed in memory, so the sector emission file is written only once
+        and the per-pollutant files are not needed.
+
+        :param sector: (*Sector*) The sector.
+        """
+        self.sector = sector
+        self.data = OrderedDict()
+        self.units = {}
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return 'SectorAccumulator: {}; Species: {}'.format(self.sector.name, self.names)
+
+    __repr__ = __str__
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    @property
+    def names(self):
+        """
+        Species names in adding order.
+        """
+        return list(self.data.keys())
+
+    def add(self, name, data, units):
+        """
+        Add species data. The data is summed in place if the species already exists, so the
+        added data array should not be shared with other species.
+
+        :param name: (*str*) Species name.
+        :param data: (*array*) Species data array.
+        :param units: (*str*) Species units.
+        """
+        with self._lock:
+            if name in self.data:
+                self.data[name] += data
+            else:
+                self.data[name] = data
+                self.units[name] = units
+
+    def add_chunk(self, name, data, units, h0, nhour):
+        """
+        Add hour chunk data of a species. The species data of all hours is created with zeros
+        when the species is first added.
+
+        :param name: (*str*) Species name.
+        :param data: (*array*) Species data array of the hour chunk.
+        :param units: (*str*) Species units.
+        :param h0: (*int*) The first hour of the chunk.
+        :param nhour: (*int*) Number of hours of the species data.
+        """
+        h1 = h0 + data.shape[0]
+        with self._lock:
+            sdata = self.data.get(name)
+            if sdata is None:
+                sdata = np.zeros([nhour] + list(data.shape[1:]))
+                self.data[name] = sdata
+                self.units[name] = units
+            sdata[h0:h1] = sdata[h0:h1] + data
+
+    def write(self, fn, dims, gattrs=None, largefile=True):
+        """
+        Write all species data to a netCDF file.
+
+        :param fn: (*str*) Output file name.
+        :param dims: (*list of Dimension*) The dimensions.
+        :param gattrs: (*dict*) Global attributes.
+        :param largefile: (*bool*) Create large netCDF file or not.
+        """
+        if gattrs is None:
+            gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo')
+        dimvars = []
+        for name in self.data.keys():
+            dimvar = dataset.DimVariable()
+            dimvar.name = name
+            dimvar.dtype = np.dtype.float
+            dimvar.dims = dims
+            dimvar.addattr('units', self.units[name])
+            dimvars.append(dimvar)
+        ncfile = dataset.addfile(fn, 'c', largefile=largefile)
+        ncfile.nc_define(dims, gattrs, dimvars)
+        for name, data in self.data.items():
+            ncfile.write(name, data)
+        ncfile.close()
+
+    def clear(self):
+        """
+        Release the species data.
+        """
+        with self._lock:
+            self.data.clear()
+            self.units.clear()
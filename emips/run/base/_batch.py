@@ -0,0 +1,125 @@
+import copy
+import os
+
+from emips import chem_spec
+from emips import ge_data_dir
+from emips import temp_alloc
+from emips.utils import TaskGraph, profile_run
+from ._run import get_cache_dir, add_sector_tasks, run_total
+from ._checkpoint import get_checkpoint
+
+__all__ = ["get_periods", "get_period_config", "prepare_shared", "run_batch"]
+
+
+def get_periods(start, end):
+    """
+    Get the monthly periods between two months.
+
+    :param start: (*tuple*) Start (year, month).
+    :param end: (*tuple*) End (year, month), included.
+
+    :return: (*list*) The (year, month) periods.
+    """
+    year, month = int(start[0]), int(start[1])
+    end_year, end_month = int(end[0]), int(end[1])
+    periods = []
+    while (year, month) <= (end_year, end_month):
+        periods.append((year, month))
+        month += 1
+        if month > 12:
+            year += 1
+            month = 1
+    return periods
+
+
+def get_period_config(run_config, year, month):
+    """
+    Get the run configure of a period. The run configure is copied with the emission year and
+    month changed, other settings and loaded modules are shared.
+
+    :param run_config: (*RunConfigure*) The run configure.
+    :param year: (*int*) The emission year.
+    :param month: (*int*) The emission month.
+
+    :return: (*RunConfigure*) The run configure of the period.
+    """
+    period_config = copy.copy(run_config)
+    period_config.emission_year = year
+    period_config.emission_month = month
+    return period_config
+
+
+def prepare_shared(run_config):
+    """
+    Prepare the state not depending on the period, which is cached in the process and shared
+    by all periods: the temporal profile database, the speciation index and the grid areas of
+    the model grid. The regrid weights and grid speciation ratio fields are cached when they
+    are first used.
+
+    :param run_config: (*RunConfigure*) The run configure.
+    """
+    print('Prepare shared profiles and grids...')
+    temp_alloc.get_temporal_profile_db(os.path.join(ge_data_dir, run_config.temporal_ref_file),
+                                       os.path.join(ge_data_dir, run_config.temporal_prof_file))
+    chem_spec.get_speciation_index(os.path.join(ge_data_dir, run_config.chemical_ref_file),
+                                   os.path.join(ge_data_dir, run_config.chemical_prof_file),
+                                   cache_dir=get_cache_dir(run_config))
+    run_config.spatial_model_grid.grid_areas()
+
+
+@profile_run('batch')
+def run_batch(run_config, periods, workers=None, post_process=False):
+    """
+    Total emission processing of several periods in one process. The profiles, grid areas,
+    regrid weights and grid speciation ratio fields are computed once and shared by the
+    periods, and the sector and pollutant tasks of all periods are run on one worker pool. The
+    checkpoint is cleared once at the start unless `run_resume` of the run configure is True.
+
+    :param run_config: (*RunConfigure*) The run configure.
+    :param periods: (*list*) The (year, month) periods, such as got by `get_periods` function.
+    :param workers: (*int*) Number of workers to run the tasks concurrently. Default is `None`
+        that `run_config.run_workers` is used.
+    :param post_process: (*bool*) Run the post process module of the run configure after the
+        sectors of each period are finished. The post process output files should be named by
+        the period, otherwise the periods overwrite each other (such as WRF-Chem files). Default
+        is `False`.
+    """
+    if workers is None:
+        workers = run_config.run_workers
+
+    prepare_shared(run_config)
+    if not run_config.run_resume:
+        get_checkpoint(run_config.run_output_dir).reset()
+    period_configs = []
+    for year, month in periods:
+        period_config = get_period_config(run_config, year, month)
+        # Only skip the stages completed in this batch run
+        period_config.run_resume = True
+        period_configs.append(period_config)
+
+    if workers > 1:
+        print("Run {} periods with {} workers".format(len(period_configs), workers))
+        graph = TaskGraph(workers)
+        for period_config in period_configs:
+            prefix = '{}_{}_'.format(period_config.emission_year, period_config.emission_month)
+            last_tasks = []
+            for sector in period_config.emission_sectors:
+                last_task = add_sector_tasks(graph, sector, period_config, prefix)
+                if last_task is not None:
+                    last_tasks.append(last_task)
+            if post_process and period_config.post_process_module is not None:
+                graph.add_task(prefix + 'post_process', period_config.post_process_module.run,
+                               (period_config,), deps=last_tasks)
+        graph.run()
+        print("Done batch!")
+        return
+
+    for period_config in period_configs:
+        print("############################")
+        print("Period: {}-{}".format(period_config.emission_year, period_config.emission_month))
+        print("############################")
+        run_total(period_config, 1)
+        if post_process and period_config.post_process_module is not None:
+            period_config.post_process_module.run(period_config)
+
+    print("Done batch!")
@@ -0,0 +1,193 @@
+import errno
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from emips.utils import is_jython, add_io
+
+__all__ = ["Checkpoint", "get_checkpoint", "get_temp_fn", "commit_file", "file_lock"]
+
+# Checkpoints by file name
+_checkpoints = {}
+_checkpoints_lock = threading.Lock()
+
+
+def get_temp_fn(fn):
+    """
+    Get the temporary file name to write an output file. The temporary file is in the same
+    directory and has the same extension of the output file.
+
+    :param fn: (*str*) The output file name.
+
+    :return: (*str*) The temporary file name.
+    """
+    return os.path.join(os.path.dirname(fn), '.tmp_' + os.path.basename(fn))
+
+
+def commit_file(fn, temp_fn=None, count_io=True):
+    """
+    Commit an output file by renaming its temporary file to it, so the output file is either
+    complete or not exists. The existing output file is replaced.
+
+    :param fn: (*str*) The output file name.
+    :param temp_fn: (*str*) The temporary file name. Default is `None` that `get_temp_fn` is used.
+    :param count_io: (*bool*) Add the file size to the bytes written of the profiled stage.
+        Default is `True`, it should be `False` for the bookkeeping files of the run.
+    """
+    if temp_fn is None:
+        temp_fn = get_temp_fn(fn)
+    if is_jython():
+        from java.nio.file import Files, Paths, StandardCopyOption, AtomicMoveNotSupportedException
+        src = Paths.get(temp_fn)
+        dst = Paths.get(fn)
+        try:
+            Files.move(src, dst, StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE)
+        except AtomicMoveNotSupportedException:
+            Files.move(src, dst, StandardCopyOption.REPLACE_EXISTING)
+    else:
+        if os.name == 'nt' and os.path.exists(fn):
+            # Rename does not replace the existing file on Windows
+            os.remove(fn)
+        os.rename(temp_fn, fn)
+    if count_io:
+        add_io(written=os.path.getsize(fn))
+
+
+@contextmanager
+def file_lock(fn, stale=60.):
+    """
+    Lock a file across processes with a lock file, which is created exclusively and removed
+    when unlocked. The worker processes of a run update the shared JSON files under the lock.
+
+    :param fn: (*str*) The file name to lock.
+    :param stale: (*float*) The lock file older than this seconds is left by a killed process
+        and removed. Default is 60.
+    """
+    lock_fn = fn + '.lock'
+    while True:
+        try:
+            fd = os.open(lock_fn, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            try:
+                if time.time() - os.path.getmtime(lock_fn) > stale:
+                    os.remove(lock_fn)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_fn)
+
+
+def load_json(fn, default=None):
+    """
+    Load a JSON file.
+
+    :param fn: (*str*) The file name.
+    :param default: The value if the file not exists or can not be loaded. Default is `None`.
+
+    :return: The loaded value.
+    """
+    if not os.path.isfile(fn):
+        return default
+    try:
+        with open(fn) as f:
+            return json.load(f)
+    except ValueError:
+        print('Alarm! JSON file can not be loaded: {}'.format(fn))
+        return default
+
+
+class Checkpoint(object):
+
+    def __init__(self, fn):
+        """
+        Checkpoint of the processing units (pollutant, merge, vertical and timeline) of a run.
+        The output file of a completed unit is recorded with its size and modified time, and the
+        checkpoint file is saved after each unit. A resumed run skips the units whose output files
+        are recorded and not changed. The checkpoint file is re-read and merged under a file lock
+        before saving, so the units completed by worker processes are not lost.
+
+        :param fn: (*str*) The checkpoint file name.
+        """
+        self.fn = fn
+        self.units = load_json(fn, {})
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return 'Checkpoint: {}; Units: {}'.format(self.fn, len(self.units))
+
+    __repr__ = __str__
+
+    def is_done(self, fn):
+        """
+        Whether the unit of an output file is completed.
+
+        :param fn: (*str*) The output file name.
+
+        :return: (*bool*) Completed or not.
+        """
+        with self._lock:
+            record = self.units.get(os.path.basename(fn))
+        if record is None or not os.path.isfile(fn):
+            return False
+        stat = os.stat(fn)
+        return record[0] == stat.st_size and record[1] == stat.st_mtime
+
+    def done(self, fn):
+        """
+        Record the unit of an output file as completed and save the checkpoint.
+
+        :param fn: (*str*) The output file name.
+        """
+        if not os.path.isfile(fn):
+            return
+        stat = os.stat(fn)
+        with self._lock:
+            with file_lock(self.fn):
+                self.units.update(load_json(self.fn, {}))
+                self.units[os.path.basename(fn)] = [stat.st_size, stat.st_mtime]
+                self.save()
+
+    def reset(self):
+        """
+        Clear the completed units for a new run.
+        """
+        with self._lock:
+            with file_lock(self.fn):
+                self.units = {}
+                self.save()
+
+    def save(self):
+        """
+        Save the checkpoint file. The file lock should be held by the caller.
+        """
+        temp_fn = get_temp_fn(self.fn)
+        with open(temp_fn, 'w') as f:
+            json.dump(self.units, f, indent=1, sort_keys=True)
+        commit_file(self.fn, temp_fn, count_io=False)
+
+
+def get_checkpoint(dir_out):
+    """
+    Get the checkpoint of an output directory. The checkpoint is shared in the process.
+
+    :param dir_out: (*str*) The output directory.
+
+    :return: (*Checkpoint*) The checkpoint.
+    """
+    fn = os.path.abspath(os.path.join(dir_out, 'checkpoint.json'))
+    with _checkpoints_lock:
+        checkpoint = _checkpoints.get(fn)
+        if checkpoint is None:
+            checkpoint = Checkpoint(fn)
+            _checkpoints[fn] = checkpoint
+        return checkpoint
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from ._checkpoint import get_temp_fn, commit_file, file_lock, load_json
+
+__all__ = ["Manifest", "SectorPlan", "get_manifest", "file_digest", "hash_inputs"]
+
+# Manifests by file name
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def hash_inputs(inputs):
+    """
+    Get the hash of the inputs.
+
+    :param inputs: (*dict*) The input values or hashes by input name.
+
+    :return: (*str*) The md5 hex digest.
+    """
+    items = ['{}={}'.format(key, inputs[key]) for key in sorted(inputs.keys())]
+    return hashlib.md5('\n'.join(items)).hexdigest()
+
+
+class Manifest(object):
+
+    def __init__(self, fn):
+        """
+        Manifest of the output files, which records the hashes of the inputs of each output file
+        to skip the stages whose inputs are not changed. The manifest is a JSON file with the
+        output records and the content hashes of the input files, and the content hash of a file
+        is reused until the size or modified time of the file is changed. The manifest file is
+        re-read and merged under a file lock before saving, so the records of worker processes
+        are not lost.
+
+        :param fn: (*str*) The manifest file name.
+        """
+        self.fn = fn
+        d = load_json(fn, {})
+        self.outputs = d.get('outputs', {})
+        self.files = d.get('files', {})
+        self._lock = threading.RLock()
+
+    def __str__(self):
+        return 'Manifest: {}; Outputs: {}'.format(self.fn, len(self.outputs))
+
+    __repr__ = __str__
+
+    def file_digest(self, fn):
+        """
+        Get the content hash of a file.
+
+        :param fn: (*str*) The file name.
+
+        :return: (*str*) The md5 hex digest. `missing` if the file not exists.
+        """
+        if fn is None or not os.path.isfile(fn):
+            return 'missing'
+        fn = os.path.abspath(fn)
+        stat = os.stat(fn)
+        with self._lock:
+            record = self.files.get(fn)
+            if record is not None and record[0] == stat.st_size and record[1] == stat.st_mtime:
+                return record[2]
+        digest = file_digest(fn)
+        with self._lock:
+            self.files[fn] = [stat.st_size, stat.st_mtime, digest]
+        return digest
+
+    def is_current(self, fn, digest):
+        """
+        Whether an output file is current, that the file exists and its recorded inputs hash is
+        same with the digest.
+
+        :param fn: (*str*) The output file name.
+        :param digest: (*str*) The inputs hash.
+
+        :return: (*bool*) Current or not.
+        """
+        with self._lock:
+            record = self.outputs.get(os.path.basename(fn))
+        return record is not None and record['hash'] == digest and os.path.isfile(fn)
+
+    def changed_inputs(self, fn, inputs):
+        """
+        Get the names of the changed inputs of an output file.
+
+        :param fn: (*str*) The output file name.
+        :param inputs: (*dict*) The input hashes by input name.
+
+        :return: (*list*) The changed input names. `None` if the output file was not recorded.
+        """
+        with self._lock:
+            record = self.outputs.get(os.path.basename(fn))
+        if record is None:
+            return None
+        old = record.get('inputs', {})
+        return [key for key in sorted(inputs.keys()) if old.get(key) != inputs[key]]
+
+    def record(self, fn, inputs):
+        """
+        Record the inputs of an output file and save the manifest.
+
+        :param fn: (*str*) The output file name.
+        :param inputs: (*dict*) The input hashes by input name.
+        """
+        with self._lock:
+            with file_lock(self.fn):
+                self._merge()
+                self.outputs[os.path.basename(fn)] = dict(hash=hash_inputs(inputs), inputs=inputs)
+                self._write()
+
+    def _merge(self):
+        """
+        Merge the records saved by other processes in the manifest file.
+        """
+        d = load_json(self.fn, {})
+        self.outputs.update(d.get('outputs', {}))
+        files = d.get('files', {})
+        files.update(self.files)
+        self.files = files
+
+    def save(self):
+        """
+        Save the manifest file, the records saved by other processes are merged.
+        """
+        with self._lock:
+            with file_lock(self.fn):
+                self._merge()
+                self._write()
+
+    def _write(self):
+        with self._lock:
+            temp_fn = get_temp_fn(self.fn)
+            with open(temp_fn, 'w') as f:
+                json.dump(dict(outputs=self.outputs, files=self.files), f, indent=1, sort_keys=True)
+            commit_file(self.fn, temp_fn, count_io=False)
+
+
+class SectorPlan(object):
+
+    def __init__(self, sector):
+        """
+        Rebuild plan of a sector. Each stage has an output file, the input hashes and whether
+        it need to be rebuilt.
+
+        :param sector: (*Sector*) The sector.
+        """
+        self.sector = sector
+        self.stages = OrderedDict()
+
+    def __str__(self):
+        r = 'Sector: {}'.format(self.sector.name)
+        for name, (fn, inputs, rebuild, reason) in self.stages.iteritems():
+            if rebuild:
+                r += '\n\tRebuild {}: {} ({})'.format(name, os.path.basename(fn), reason)
+            else:
+                r += '\n\tUp to date {}: {}'.format(name, os.path.basename(fn))
+        return r
+
+    __repr__ = __str__
+
+    def add(self, name, fn, inputs, rebuild, reason=''):
+        """
+        Add a stage.
+
+        :param name: (*str*) The stage name.
+        :param fn: (*str*) The output file name.
+        :param inputs: (*dict*) The input hashes by input name.
+        :param rebuild: (*bool*) Need to be rebuilt or not.
+        :param reason: (*str*) The reason to rebuild.
+        """
+        self.stages[name] = (fn, inputs, rebuild, reason)
+
+    def rebuild(self, name):
+        """
+        Whether a stage need to be rebuilt.
+
+        :param name: (*str*) The stage name.
+
+        :return: (*bool*) Need to be rebuilt or not. True if the stage is not in the plan.
+        """
+        stage = self.stages.get(name)
+        return stage is None or stage[2]
+
+    @property
+    def up_to_date(self):
+        """
+        Whether all stages are up to date.
+        """
+        return not any(stage[2] for stage in self.stages.values())
+
+    def record(self, manifest):
+        """
+        Record the rebuilt stages whose output files exist in the manifest. The stages completed
+        by an interrupted run are also recorded.
+
+        :param manifest: (*Manifest*) The manifest.
+        """
+        for fn, inputs, rebuild, reason in self.stages.values():
+            if (rebuild or reason == 'completed') and inputs is not None and os.path.isfile(fn):
+                manifest.record(fn, inputs)
+
+
+def file_digest(fn, block_size=1 << 20):
+    """
+    Get the content hash of a file.
+
+    :param fn: (*str*) The file name.
+    :param block_size: (*int*) The block size to read the file. Default is 1 MB.
+
+    :return: (*str*) The md5 hex digest.
+    """
+    md5 = hashlib.md5()
+    with open(fn, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def get_manifest(dir_out):
+    """
+    Get the manifest of an output directory. The manifest is shared in the process.
+
+    :param dir_out: (*str*) The output directory.
+
+    :return: (*Manifest*) The manifest.
+    """
+    fn = os.path.abspath(os.path.join(dir_out, 'manifest.json'))
+    with _manifests_lock:
+        manifest = _manifests.get(fn)
+        if manifest is None:
+            manifest = Manifest(fn)
+            _manifests[fn] = manifest
+        return manifest
@@ -1,4 +1,5 @@
 import os
+import threading
 from collections import OrderedDict
 
 from mipylib import dataset
@@ -6,16 +7,72 @@ from mipylib import numeric as np
 
 from emips import chem_spec
 from emips import ge_data_dir
+from emips import version
 from emips import temp_alloc
 from emips import vertical_alloc
-from emips.spatial_alloc import transform
-from emips.utils import Units, Weight, Area, Period
+from emips.spatial_alloc import transform, get_regridder
+from emips.utils import Units, Weight, Area, Period, TaskGraph
+from emips.utils import profiled, profile_run, add_io, array_bytes
+from ._accumulator import SectorAccumulator
+from ._manifest import SectorPlan, get_manifest, hash_inputs
+from ._checkpoint import get_checkpoint, get_temp_fn, commit_file
 
 __all__ = ["read_emission", "convert_units", "run_spatial", "run_temporal", "run_chemical",
            "run_chemical_grid_spec", "lump_VOC", "run_pollutant", "merge_sector",
-           "run_vertical_sector", "run_sector", "run_total"]
+           "run_vertical_sector", "run_timeline_sector", "run_sector", "run_total", "add_sector_tasks",
+           "get_cache_dir", "regrid", "get_pollutant_fn", "get_pollutant_inputs", "get_stage_fns",
+           "plan_sector", "plan_resume", "get_sector_plan", "get_code_version"]
 
+# The grid speciation reader keeps the opened file of current sector
+_grid_spec_lock = threading.Lock()
 
+# Source file of the processing stages
+_source_fn = os.path.abspath(__file__).replace('$py.class', '.py')
+if _source_fn.endswith('.pyc'):
+    _source_fn = _source_fn[:-1]
+
+# Source directories of the modules called by the processing stages, the content hash of their
+# source files is a part of the code version
+_package_dir = os.path.dirname(os.path.dirname(os.path.dirname(_source_fn)))
+_code_dirs = ['chem_spec', 'spatial_alloc', 'temp_alloc', 'vertical_alloc', 'utils',
+              os.path.join('run', 'base'), os.path.join('run', 'run_emission')]
+
+
+def get_cache_dir(run_config):
+    """
+    Get the directory of the cache files, such as regrid weights.
+
+    :param run_config: (*RunConfigure*) The run configure.
+
+    :return: (*str*) The cache directory.
+    """
+    if run_config.cache_dir:
+        return run_config.cache_dir
+    return os.path.join(run_config.run_output_dir, 'cache')
+
+
+def regrid(data, source_grid, run_config):
+    """
+    Spatial transform to model grid using precomputed regrid weights if `spatial_regrid_weights`
+    of the run configure is True, otherwise using `transform` function. The regrid method is
+    `spatial_regrid_method` of the run configure.
+
+    :param data: (*array*) Input data array.
+    :param source_grid: (*GridDesc*) The source grid description.
+    :param run_config: (*RunConfigure*) The run configure.
+
+    :return: (*array*) Data array in model grid.
+    """
+    model_grid = run_config.spatial_model_grid
+    method = run_config.spatial_regrid_method
+    if run_config.spatial_regrid_weights or method == 'conservative':
+        regridder = get_regridder(source_grid, model_grid, method, cache_dir=get_cache_dir(run_config))
+        return regridder.regrid(data)
+    else:
+        return transform(data, source_grid, model_grid, method)
+
+
+@profiled('read_emission')
 def read_emission(run_config, sector, pollutant):
     """
     Read emission data.
@@ -31,11 +88,19 @@ def read_emission(run_config, sector, pollutant):
     year = run_config.emission_year
     month = run_config.emission_month
     emission = run_config.emission_module
-    emis_data = emission.read_emis(sector, pollutant, year, month)
-    emis_grid = emission.get_emis_grid(sector)
+    if hasattr(emission, 'read_emis_bbox'):
+        # Only read the emission data intersecting with the model grid
+        emis_data, emis_grid = emission.read_emis_bbox(sector, pollutant, year, month,
+                                                       run_config.spatial_model_grid)
+    else:
+        emis_data = emission.read_emis(sector, pollutant, year, month)
+        emis_grid = emission.get_emis_grid(sector)
+    if emis_data is not None:
+        add_io(read=array_bytes(emis_data))
     return emis_data, emis_grid
 
 
+@profiled('convert_units')
 def convert_units(data, pollutant, emis_grid):
     """
     Convert emission data units to g/m2/s.
@@ -60,6 +125,7 @@ def convert_units(data, pollutant, emis_grid):
     return data
 
 
+@profiled('run_spatial')
 def run_spatial(data, run_config, emis_grid):
     """
     Spatial transform.
@@ -72,11 +138,15 @@ def run_spatial(data, run_config, emis_grid):
     """
     # Spatial transform
     print("Spatial allocation...")
-    model_grid = run_config.spatial_model_grid
-    data = transform(data, emis_grid, model_grid)
-    return data
+    dest = regrid(data, emis_grid, run_config)
+    if run_config.spatial_regrid_method == 'conservative':
+        regridder = get_regridder(emis_grid, run_config.spatial_model_grid, 'conservative',
+                                  cache_dir=get_cache_dir(run_config))
+        regridder.mass_balance(data, dest)
+    return dest
 
 
+@profiled('run_temporal')
 def run_temporal(data, run_config, sector):
     """
     Temporal allocation.
@@ -98,15 +168,14 @@ def run_temporal(data, run_config, sector):
     month_profile, week_profile, diurnal_profile, diurnal_profile_we = \
         temp_alloc.read_file(temp_ref_fn, temp_profile_fn, sector.scc)
 
-    print('To daily emission (g/m2/day)...')
-    weekday_data, weekend_data = temp_alloc.week_allocation(data, week_profile, year, month)
-    weekday_data = (weekday_data * 5 + weekend_data * 2) / 7
-    print('To hourly emission (g/m2/s)...')
-    hour_data = temp_alloc.diurnal_allocation(weekday_data, diurnal_profile) / 3600
+    print('To hourly emission of the mean week day (g/m2/s)...')
+    hour_data = temp_alloc.month2hour(data, week_profile, diurnal_profile, year, month, weekend=None,
+                                      ratio=1. / 3600)
     return hour_data
 
 
-def run_chemical(hour_data, run_config, sector, pollutant):
+@profiled('run_chemical')
+def run_chemical(hour_data, run_config, sector, pollutant, accumulator=None):
     """
     Chemical speciation and write output NC file.
 
@@ -114,6 +183,9 @@ def run_chemical(hour_data, run_config, sector, pollutant):
     :param run_config: (*RunConfigure*) The run configure.
     :param sector: (*Sector*) The sector.
     :param pollutant: (*Pollutant*) The pollutant.
+    :param accumulator: (*SectorAccumulator*) The sector accumulator. Default is `None`. If it
+        is set, the species data are added into it and the output NC file is only written when
+        `run_config.keep_intermediate` is True.
     """
     year = run_config.emission_year
     month = run_config.emission_month
@@ -123,7 +195,8 @@ def run_chemical(hour_data, run_config, sector, pollutant):
     print("Chemical speciation...")
     spec_ref_fn = os.path.join(ge_data_dir, run_config.chemical_ref_file)
     spec_profile_fn = os.path.join(ge_data_dir, run_config.chemical_prof_file)
-    pollutant_profiles = chem_spec.read_file(spec_ref_fn, spec_profile_fn, sector.scc)
+    pollutant_profiles = chem_spec.read_file(spec_ref_fn, spec_profile_fn, sector.scc,
+                                             cache_dir=get_cache_dir(run_config))
     poll_prof = chem_spec.get_pollutant_profile(pollutant_profiles, pollutant)
 
     # Write to NC file
@@ -150,19 +223,27 @@ def run_chemical(hour_data, run_config, sector, pollutant):
         else:
             dimvar.addattr('units', 'mole/m2/s')
         dimvars.append(dimvar)
-    ncfile = dataset.addfile(outfn, 'c')
-    ncfile.nc_define(dims, gattrs, dimvars)
-    for spec_prof, dimvar, spec in zip(poll_prof.species_profiles, dimvars, specs):
+    ncfile = None
+    if accumulator is None or run_config.keep_intermediate:
+        ncfile = dataset.addfile(get_temp_fn(outfn), 'c')
+        ncfile.nc_define(dims, gattrs, dimvars)
+    # Mass fraction and molar mass are combined into one factor of each species
+    factors = chem_spec.get_species_factors(poll_prof)
+    for factor, dimvar, spec in zip(factors, dimvars, specs):
         print(dimvar.name)
-        spec_data = hour_data * spec_prof.mass_fraction
-        if spec.molar_mass is not None:
-            print('To (mole/m2/s)')
-            spec_data = spec_data / spec.molar_mass
-        ncfile.write(dimvar.name, spec_data)
-    ncfile.close()
+        spec_data = hour_data * factor
+        if accumulator is not None:
+            units = 'g/m2/s' if spec.molar_mass is None else 'mole/m2/s'
+            accumulator.add(dimvar.name, spec_data, units)
+        if ncfile is not None:
+            ncfile.write(dimvar.name, spec_data)
+    if ncfile is not None:
+        ncfile.close()
+        commit_file(outfn)
 
 
-def run_chemical_grid_spec(hour_data, run_config, sector, pollutant):
+@profiled('run_chemical_grid_spec')
+def run_chemical_grid_spec(hour_data, run_config, sector, pollutant, in_memory=False):
     """
     Chemical speciation using grid speciation files and write output NC file.
 
@@ -170,6 +251,11 @@ def run_chemical_grid_spec(hour_data, run_config, sector, pollutant):
     :param run_config: (*RunConfigure*) The run configure.
     :param sector: (*Sector*) The sector.
     :param pollutant: (*Pollutant*) The pollutant.
+    :param in_memory: (*bool*) Return the species data rather than only writing them. The output
+        NC file is only written when `run_config.keep_intermediate` is True in this case.
+        Default is `False`.
+
+    :return: (*OrderedDict*) Species data arrays by species name if `in_memory` is True.
     """
     year = run_config.emission_year
     month = run_config.emission_month
@@ -190,46 +276,82 @@ def run_chemical_grid_spec(hour_data, run_config, sector, pollutant):
 
     # Create output netcdf file and define dimensions, global attributes and variables
     gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo')
-    dimvars = run_config.grid_spec_module.get_spec_vars(sector, dims)
-    ncfile = dataset.addfile(outfn, 'c')
-    ncfile.nc_define(dims, gattrs, dimvars)
+    with _grid_spec_lock:
+        dimvars = run_config.grid_spec_module.get_spec_vars(sector, dims)
+        spec_fn = run_config.grid_spec_module.get_spec_fn(sector)
+    ncfile = None
+    if not in_memory or run_config.keep_intermediate:
+        ncfile = dataset.addfile(get_temp_fn(outfn), 'c')
+        ncfile.nc_define(dims, gattrs, dimvars)
 
-    # Write variable values
+    # Ratio fields on model grid, only read and regridded once for a sector
+    spec_vars = dict((dimvar.name, dimvar) for dimvar in dimvars)
     ratio_grid = run_config.grid_spec_module.get_spec_grid()
+
+    def read_ratio(name):
+        print('Regrid ratio field: {}'.format(name))
+        with _grid_spec_lock:
+            rdata = run_config.grid_spec_module.read_spec(sector, spec_vars[name])
+        return regrid(rdata, ratio_grid, run_config)
+
+    cache = chem_spec.get_grid_spec_cache(get_cache_dir(run_config))
+    method = '{} weights={}'.format(run_config.spatial_regrid_method, run_config.spatial_regrid_weights)
+    ratios = cache.get(sector, [dimvar.name for dimvar in dimvars], model_grid, read_ratio, spec_fn,
+                       method)
+
+    # Write variable values
+    spec_dict = OrderedDict()
     for dimvar in dimvars:
         print(dimvar.name)
-        rdata = run_config.grid_spec_module.read_spec(sector, dimvar)
-        rdata = transform(rdata, ratio_grid, model_grid)
-        spec_data = hour_data * rdata
-        ncfile.write(dimvar.name, spec_data)
+        spec_data = hour_data * ratios[dimvar.name]
+        if in_memory:
+            spec_dict[dimvar.name] = spec_data
+        if ncfile is not None:
+            ncfile.write(dimvar.name, spec_data)
 
     # Close output netcdf file
-    ncfile.close()
+    if ncfile is not None:
+        ncfile.close()
+        commit_file(outfn)
 
+    if in_memory:
+        return spec_dict
 
-def lump_VOC(run_config, sector, pollutant):
+
+@profiled('lump_VOC')
+def lump_VOC(run_config, sector, pollutant, accumulator=None, retro_data=None, chunk=6):
     """
-    Lump VOC species according chemical mechanism.
+    Lump VOC species according chemical mechanism. The lumping coefficient matrix is applied to
+    the RETRO species by hour chunks, so only one chunk of the RETRO and lumped species data is
+    kept in memory.
 
     :param run_config: (*RunConfigure*) The run configure.
     :param sector: (*Sector*) The sector.
     :param pollutant: (*Pollutant*) The pollutant.
+    :param accumulator: (*SectorAccumulator*) The sector accumulator. Default is `None`. If it
+        is set, the lumped species data are added into it and the output NC file is only written
+        when `run_config.keep_intermediate` is True.
+    :param retro_data: (*dict*) RETRO species data arrays by species name. Default is `None` that
+        the RETRO species are read from the grid speciation output NC file.
+    :param chunk: (*int*) Number of hours lumped at a time. Default is 6.
     """
     year = run_config.emission_year
     month = run_config.emission_month
     model_grid = run_config.spatial_model_grid
     chem_mech = run_config.chemical_mechanism
 
-    # Set input file
-    infn = os.path.join(run_config.run_output_dir,
-                        '{}_emis_{}_{}_{}_hour.nc'.format(pollutant.name, sector.name, year, month))
-    print('Input file: {}'.format(infn))
-    # Open input file
-    inf = dataset.addfile(infn)
-    # Read a reference data
-    vname = inf.varnames[4]
-    rdata = inf[vname][:]
-    rdata[rdata != np.nan] = 0.
+    inf = None
+    if retro_data is None:
+        # Set input file
+        infn = os.path.join(run_config.run_output_dir,
+                            '{}_emis_{}_{}_{}_hour.nc'.format(pollutant.name, sector.name, year, month))
+        print('Input file: {}'.format(infn))
+        # Open input file
+        inf = dataset.addfile(infn)
+        add_io(read=os.path.getsize(infn))
+        retro_names = inf.varnames
+    else:
+        retro_names = list(retro_data.keys())
 
     # Set dimensions
     tdim = np.dimension(np.arange(24), 'hour')
@@ -241,53 +363,75 @@ def lump_VOC(run_config, sector, pollutant):
     outfn = os.path.join(run_config.run_output_dir,
                          '{}_emis_lump_{}_{}_{}_hour.nc'.format(pollutant.name, sector.name, year, month))
     print('Output file: {}'.format(outfn))
-    # Create output netcdf file
-    ncfile = dataset.addfile(outfn, 'c')
     # Set global attribute
     gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo')
+    # Lumping coefficient matrix (mechanism species x RETRO species), the coefficients include
+    # the conversion from (g/m2/s) to (mole/m2/s)
+    species, rnames, matrix = chem_mech.lump_RETRO_matrix(retro_names)
     # Set variables
     dimvars = []
-    for spec in chem_mech.nmvoc_species():
+    for spec in species:
         dimvar = dataset.DimVariable()
         dimvar.name = spec.name
         dimvar.dtype = np.dtype.float
         dimvar.dims = dims
         dimvar.addattr('units', 'mol/m2/s')
         dimvars.append(dimvar)
-    # Define dimensions, global attributes and variables
-    ncfile.nc_define(dims, gattrs, dimvars)
+    # Create output netcdf file and define dimensions, global attributes and variables
+    ncfile = None
+    if accumulator is None or run_config.keep_intermediate:
+        ncfile = dataset.addfile(get_temp_fn(outfn), 'c')
+        ncfile.nc_define(dims, gattrs, dimvars)
 
-    # Write variable values
-    for spec, dimvar in zip(chem_mech.nmvoc_species(), dimvars):
-        print('{} species: {}'.format(chem_mech.name, spec))
-        rspecs = chem_mech.lump_RETRO(spec)
-        print('RETRO species: {}'.format(rspecs))
-        data = None
-        for rspec, ratio in rspecs.iteritems():
-            if rspec.name in inf.varnames:
-                if data is None:
-                    data = inf[rspec.name][:] * ratio
-                else:
-                    data = data + inf[rspec.name][:] * ratio
-        if data is None:
-            print('No RETRO species!')
-            ncfile.write(dimvar.name, rdata)
+    # Lump all species by hour chunks, the RETRO chunk buffers are reused by the chunks
+    print('Lump {} species from {} RETRO species'.format(chem_mech.name, len(rnames)))
+    if len(rnames) > 0:
+        matrix = np.array(matrix)
+    nhour = tdim.length
+    ncell = ydim.length * xdim.length
+    buffers = {}
+    for h0 in range(0, nhour, chunk):
+        h1 = min(h0 + chunk, nhour)
+        n = (h1 - h0) * ncell
+        if len(rnames) > 0:
+            rstack = buffers.get(n)
+            if rstack is None:
+                rstack = np.zeros((len(rnames), n))
+                buffers[n] = rstack
+            for i, rname in enumerate(rnames):
+                rdata = inf[rname][h0:h1] if inf is not None else retro_data[rname][h0:h1]
+                rstack[i] = rdata.reshape(n)
+            ldata = np.dot(matrix, rstack)
         else:
-            print('Convert (g/m2/s) to (mole/m2/s)')
-            data = data / spec.molar_mass
-            ncfile.write(dimvar.name, data)
-
-    # Close output netcdf file
-    ncfile.close()
+            ldata = np.zeros((len(species), n))
+
+        # Write variable values of the chunk
+        for i, dimvar in enumerate(dimvars):
+            data = ldata[i].reshape(h1 - h0, ydim.length, xdim.length)
+            if accumulator is not None:
+                accumulator.add_chunk(dimvar.name, data, 'mol/m2/s', h0, nhour)
+            if ncfile is not None:
+                ncfile.write(dimvar.name, data, origin=[h0, 0, 0])
+        del ldata
+
+    # Close files
+    if ncfile is not None:
+        ncfile.close()
+        commit_file(outfn)
+    if inf is not None:
+        inf.close()
 
 
-def run_pollutant(run_config, sector, pollutant):
+@profiled('run_pollutant')
+def run_pollutant(run_config, sector, pollutant, accumulator=None):
     """
     Run emission processing for a pollutant.
 
     :param run_config: (*RunConfigure*) The run configure.
     :param sector: (*Sector*) The sector.
     :param pollutant: (*Pollutant*) The pollutant.
+    :param accumulator: (*SectorAccumulator*) The sector accumulator to keep the species data
+        in memory. Default is `None` that the species data are written to pollutant files.
     """
     # Read emission data
     data, emis_grid = read_emission(run_config, sector, pollutant)
@@ -303,26 +447,39 @@ def run_pollutant(run_config, sector, pollutant):
 
     # Chemical speciation
     if pollutant.is_VOC and run_config.voc_use_grid_spec:
-        run_chemical_grid_spec(hour_data, run_config, sector, pollutant)
-        lump_VOC(run_config, sector, pollutant)
+        if accumulator is None:
+            run_chemical_grid_spec(hour_data, run_config, sector, pollutant)
+            lump_VOC(run_config, sector, pollutant)
+        else:
+            retro_data = run_chemical_grid_spec(hour_data, run_config, sector, pollutant, in_memory=True)
+            lump_VOC(run_config, sector, pollutant, accumulator, retro_data)
     else:
-        run_chemical(hour_data, run_config, sector, pollutant)
+        run_chemical(hour_data, run_config, sector, pollutant, accumulator)
+    if accumulator is None:
+        get_checkpoint(run_config.run_output_dir).done(get_pollutant_fn(run_config, sector, pollutant))
     print("Done: {}_{}".format(sector.name, pollutant.name))
 
 
-def merge_sector(sector, run_config):
+@profiled('merge_sector')
+def merge_sector(sector, run_config, accumulator=None):
     """
-    Merge all pollutant emission files in one file for each sector.
+    Merge all pollutant emission files in one file for each sector. The species are merged one
+    by one and streamed by hour chunks (`merge_chunk` of the run configure), the chunk data of
+    the pollutant files are summed in place into a reused buffer, so only one chunk is kept in
+    memory. The pollutant files are opened once and shared by all species.
 
     :param sector: (*Sector*) The sector.
     :param run_config: (*RunConfigure*) The run configure.
+    :param accumulator: (*SectorAccumulator*) The sector accumulator. Default is `None`. If it
+        is set, the accumulated species data are written instead of merging pollutant files.
     """
     year = run_config.emission_year
     month = run_config.emission_month
     model_grid = run_config.spatial_model_grid
 
     # Set dimensions
-    tdim = np.dimension(np.arange(24), 'hour')
+    nhour = 24
+    tdim = np.dimension(np.arange(nhour), 'hour')
     ydim = np.dimension(model_grid.y_coord, 'lat', 'Y')
     xdim = np.dimension(model_grid.x_coord, 'lon', 'X')
     dims = [tdim, ydim, xdim]
@@ -334,53 +491,78 @@ def merge_sector(sector, run_config):
                          'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
     print('File_out: {}'.format(outfn))
 
-    # Pollutant loop
+    if accumulator is not None:
+        accumulator.write(get_temp_fn(outfn), dims)
+        commit_file(outfn)
+        get_checkpoint(run_config.run_output_dir).done(outfn)
+        return
+
+    # Pollutant loop, the opened files are pooled and shared by all species
     dimvars = []
-    dict_spec = {}
+    dict_spec = OrderedDict()
+    files = OrderedDict()
     for pollutant in run_config.emission_pollutants:
         # Read data in pollutant file
-        if pollutant.is_VOC and run_config.voc_use_grid_spec:
-            fn = os.path.join(run_config.run_output_dir,
-                              '{}_emis_lump_{}_{}_{}_hour.nc'.format(pollutant.name,
-                                                                     sector.name, year, month))
-        else:
-            fn = os.path.join(run_config.run_output_dir,
-                              '{}_emis_{}_{}_{}_hour.nc'.format(pollutant.name,
-                                                                sector.name, year, month))
+        fn = get_pollutant_fn(run_config, sector, pollutant)
         print('File_in: {}'.format(fn))
+        if fn in files:
+            continue
         f = dataset.addfile(fn)
+        add_io(read=os.path.getsize(fn))
+        files[fn] = f
 
         for var in f.variables:
             if var.ndim == 3:
                 if dict_spec.has_key(var.name):
-                    dict_spec[var.name].append(fn)
+                    dict_spec[var.name].append(f)
                 else:
                     dimvars.append(var)
-                    dict_spec[var.name] = [fn]
+                    dict_spec[var.name] = [f]
+
+    # Hour chunks, the chunk buffers are reused by all species
+    chunk = run_config.merge_chunk
+    if chunk <= 0 or chunk > nhour:
+        chunk = nhour
+    buffers = {}
+    chunks = []
+    for h0 in range(0, nhour, chunk):
+        h1 = min(h0 + chunk, nhour)
+        if not buffers.has_key(h1 - h0):
+            buffers[h1 - h0] = np.zeros((h1 - h0, model_grid.y_num, model_grid.x_num))
+        chunks.append((h0, h1))
 
     # Create output merged netcdf data file
     gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo')
-    ncfile = dataset.addfile(outfn, 'c', largefile=True)
+    ncfile = dataset.addfile(get_temp_fn(outfn), 'c', largefile=True)
     ncfile.nc_define(dims, gattrs, dimvars)
-    for sname, fns in dict_spec.iteritems():
-        spec_data = None
-        for fn in fns:
-            f = dataset.addfile(fn)
-            if spec_data is None:
-                spec_data = f[sname][:]
-            else:
-                spec_data = spec_data + f[sname][:]
-        ncfile.write(sname, spec_data)
-    f.close()
+    for sname, sfiles in dict_spec.iteritems():
+        for h0, h1 in chunks:
+            spec_data = buffers[h1 - h0]
+            spec_data[:, :, :] = sfiles[0][sname][h0:h1]
+            for f in sfiles[1:]:
+                spec_data += f[sname][h0:h1]
+            ncfile.write(sname, spec_data, origin=[h0, 0, 0])
+    for f in files.values():
+        f.close()
     ncfile.close()
+    commit_file(outfn)
+    get_checkpoint(run_config.run_output_dir).done(outfn)
 
 
-def run_vertical_sector(sector, run_config):
+@profiled('vertical')
+def run_vertical_sector(sector, run_config, accumulator=None):
     """
-    Vertical allocation to a sector.
+    Vertical allocation to a sector. The layer ratios of the vertical profile are computed once,
+    and each layer of the hourly data is multiplied by its ratio and written to the output file
+    one layer at a time. With a surface only profile the hourly data is written to the first
+    layer and one shared zero layer is written to the upper layers. If a stack table or a gridded
+    fraction file is set in the run configure, the per grid cell layer fractions of the sector
+    are used instead of the profile.
 
     :param sector: (*Sector*) The sector.
     :param run_config: (*RunConfigure*) The run configure.
+    :param accumulator: (*SectorAccumulator*) The sector accumulator. Default is `None`. If it
+        is set, the accumulated species data are used instead of reading the sector file.
     """
     year = run_config.emission_year
     month = run_config.emission_month
@@ -388,7 +570,22 @@ def run_vertical_sector(sector, run_config):
 
     # get vertical profiles
     vertical_pro = vertical_alloc.read_file(run_config.vertical_prof_file, sector.scc)
-    z = len(vertical_pro.weights)
+    ratios = vertical_pro.get_ratios()
+    z = len(ratios)
+
+    # get per grid cell layer fractions of the sector
+    vertical_field = None
+    if run_config.vertical_stack_file or run_config.vertical_grid_file:
+        stack_fn = run_config.vertical_stack_file
+        grid_fn = run_config.vertical_grid_file
+        vertical_field = vertical_alloc.get_vertical_field(
+            sector.name, model_grid,
+            stack_fn=os.path.join(ge_data_dir, stack_fn) if stack_fn else None,
+            grid_fn=os.path.join(ge_data_dir, grid_fn) if grid_fn else None,
+            layer_tops=run_config.vertical_layer_tops, default_ratios=ratios,
+            cache_dir=get_cache_dir(run_config) if run_config.vertical_cache else None)
+        if vertical_field is not None:
+            z = vertical_field.z
 
     print('Define dimension and global attributes...')
     tdim = np.dimension(np.arange(24), 'hour')
@@ -403,87 +600,638 @@ def run_vertical_sector(sector, run_config):
 
     fn = os.path.join(run_config.run_output_dir,
                       'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
-    print('File input: {}'.format(fn))
+    f = None
+    if accumulator is None:
+        print('File input: {}'.format(fn))
+        if os.path.exists(fn):
+            f = dataset.addfile(fn)
+            add_io(read=os.path.getsize(fn))
+    else:
+        print('Input from memory: {}'.format(sector.name))
     dimvars = []
-    if os.path.exists(fn):
-        f = dataset.addfile(fn)
-        for var in f.variables:
-            if var.ndim == 3:
-                dimvar = dataset.DimVariable()
-                dimvar.name = var.name
-                dimvar.dtype = np.dtype.float
-                dimvar.dims = dims
-                dimvar.addattr('description', "EMISSION_{}".format(var.name))
-                dimvar.addattr('units', var.attrvalue('units')[0])
-                dimvars.append(dimvar)
+    if f is not None or accumulator is not None:
+        if f is None:
+            spec_units = [(name, accumulator.units[name]) for name in accumulator.names]
+        else:
+            spec_units = [(var.name, var.attrvalue('units')[0]) for var in f.variables if var.ndim == 3]
+        for name, units in spec_units:
+            dimvar = dataset.DimVariable()
+            dimvar.name = name
+            dimvar.dtype = np.dtype.float
+            dimvar.dims = dims
+            dimvar.addattr('description', "EMISSION_{}".format(name))
+            dimvar.addattr('units', units)
+            dimvars.append(dimvar)
 
         out_fn = os.path.join(run_config.run_output_dir,
                               'emis_{}_{}_{}_hour_height.nc'.format(sector.name, year, month))
         print('Create output data file:{}'.format(out_fn))
-        ncfile = dataset.addfile(out_fn, 'c', largefile=True)
+        ncfile = dataset.addfile(get_temp_fn(out_fn), 'c', largefile=True)
         ncfile.nc_define(dims, gattrs, dimvars)
 
-        data = np.zeros((tdim.length, z, ydim.length, xdim.length))
-        dd = np.zeros((tdim.length, z, ydim.length, xdim.length))
+        # The surface only profile is not allocated
+        surface_only = vertical_field is None and round(ratios[0], 2) == 1.0
+        layer_shape = (tdim.length, 1, ydim.length, xdim.length)
+        zeros = np.zeros(layer_shape) if surface_only and z > 1 else None
 
-        # read, merge and output
-        if round(vertical_pro.get_ratios()[0], 2) != 1.0:
+        # read, allocate and output layer by layer
+        if not surface_only:
             print('Allocating: {}'.format(sector.name))
         else:
             print('Do not need to be allocated: {}'.format(sector.name))
         print('Write data to file...')
-        for var in f.varnames:
+        varnames = f.varnames if f is not None else accumulator.names
+        for var in varnames:
             if var == 'lat' or var == 'lon':
                 continue
+            print(var)
+            # The accumulated data is copied as it is shared with other stages
+            hour_data = f[var][:] if f is not None else accumulator[var].copy()
+            hour_data = hour_data.reshape(*layer_shape)
+            # Turn nan to zero
+            hour_data[hour_data == np.nan] = 0
+            if surface_only:
+                ncfile.write(var, hour_data, origin=[0, 0, 0, 0])
+                for lay in range(1, z):
+                    ncfile.write(var, zeros, origin=[0, lay, 0, 0])
+            elif vertical_field is not None:
+                for lay in range(z):
+                    ncfile.write(var, hour_data * vertical_field.get_layer(lay), origin=[0, lay, 0, 0])
             else:
-                print(var)
-                dd[:, 0, :, :] = f[var][:]
-                if round(vertical_pro.get_ratios()[0], 2) == 1.0:
-                    data[:, 0, :, :] = dd[:, 0, :, :]
-                else:
-                    for lay in np.arange(len(vertical_pro.get_ratios())):
-                        data[:, lay, :, :] = dd[:, 0, :, :] * vertical_pro.get_ratios()[lay]
-                # Turn nan to zero
-                data[data == np.nan] = 0
-            ncfile.write(var, data)
+                for lay in range(z):
+                    ncfile.write(var, hour_data * ratios[lay], origin=[0, lay, 0, 0])
         ncfile.close()
-        f.close()
+        commit_file(out_fn)
+        get_checkpoint(run_config.run_output_dir).done(out_fn)
+        if f is not None:
+            f.close()
     else:
         print('File not exist: {}'.format(fn))
 
 
-def run_sector(sector, run_config):
+@profiled('timeline')
+def run_timeline_sector(sector, run_config, accumulator=None):
+    """
+    Hourly emission of every day in the month to a sector. The hourly emission of the mean week
+    day in the sector emission file is summed to monthly emission, and allocated to each day by
+    the week profile and the weekday and weekend diurnal profiles. The output file is written one
+    day at a time, so only one day of hourly data is in memory.
+
+    :param sector: (*Sector*) The sector.
+    :param run_config: (*RunConfigure*) The run configure.
+    :param accumulator: (*SectorAccumulator*) The sector accumulator. Default is `None`. If it
+        is set, the accumulated species data are used instead of reading the sector file.
+    """
+    year = run_config.emission_year
+    month = run_config.emission_month
+    model_grid = run_config.spatial_model_grid
+
+    print('Hourly emission of every day: {}'.format(sector.name))
+    temp_ref_fn = os.path.join(ge_data_dir, run_config.temporal_ref_file)
+    temp_profile_fn = os.path.join(ge_data_dir, run_config.temporal_prof_file)
+    month_profile, week_profile, diurnal_profile, diurnal_profile_we = \
+        temp_alloc.read_file(temp_ref_fn, temp_profile_fn, sector.scc)
+    mean_day_ratio = temp_alloc.get_day_ratio(week_profile, year, month)
+    timeline_ratios = temp_alloc.get_timeline_ratios(week_profile, diurnal_profile, diurnal_profile_we,
+                                                     year, month)
+
+    # Monthly emission of the species
+    f = None
+    if accumulator is None:
+        fn = os.path.join(run_config.run_output_dir,
+                          'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+        print('File input: {}'.format(fn))
+        if not os.path.exists(fn):
+            print('File not exist: {}'.format(fn))
+            return
+        f = dataset.addfile(fn)
+        add_io(read=os.path.getsize(fn))
+        spec_units = [(var.name, var.attrvalue('units')[0]) for var in f.variables if var.ndim == 3]
+    else:
+        print('Input from memory: {}'.format(sector.name))
+        spec_units = [(name, accumulator.units[name]) for name in accumulator.names]
+    month_data = OrderedDict()
+    for name, units in spec_units:
+        hour_data = f[name][:] if accumulator is None else accumulator[name]
+        month_data[name] = hour_data.sum(axis=0) * (3600 / mean_day_ratio)
+    if f is not None:
+        f.close()
+
+    # Set dimensions, the time dimension is unlimited
+    ntime = len(timeline_ratios) * 24
+    tdim = np.dimension(np.arange(ntime), 'time', 'T')
+    tdim.setUnlimited(True)
+    ydim = np.dimension(model_grid.y_coord, 'lat', 'Y')
+    xdim = np.dimension(model_grid.x_coord, 'lon', 'X')
+    dims = [tdim, ydim, xdim]
+    gattrs = OrderedDict()
+    gattrs['Conventions'] = 'CF-1.6'
+    gattrs['Tools'] = 'Created using MeteoInfo'
+
+    # Coordinate variables, the time coordinate has CF time units
+    if model_grid.proj.isLonLat():
+        lat_attrs = [('units', 'degrees_north'), ('standard_name', 'latitude')]
+        lon_attrs = [('units', 'degrees_east'), ('standard_name', 'longitude')]
+    else:
+        lat_attrs = lon_attrs = []
+    coords = [('time', tdim, np.arange(ntime),
+               [('units', 'hours since {}-{:0>2d}-01 00:00:00'.format(year, month)),
+                ('standard_name', 'time'), ('calendar', 'standard'), ('axis', 'T')]),
+              ('lat', ydim, np.array(model_grid.y_coord), lat_attrs + [('axis', 'Y')]),
+              ('lon', xdim, np.array(model_grid.x_coord), lon_attrs + [('axis', 'X')])]
+    dimvars = []
+    for name, dim, values, attrs in coords:
+        dimvar = dataset.DimVariable()
+        dimvar.name = name
+        dimvar.dtype = np.dtype.float
+        dimvar.dims = [dim]
+        for key, value in attrs:
+            dimvar.addattr(key, value)
+        dimvars.append(dimvar)
+    for name, units in spec_units:
+        dimvar = dataset.DimVariable()
+        dimvar.name = name
+        dimvar.dtype = np.dtype.float
+        dimvar.dims = dims
+        dimvar.addattr('units', units)
+        dimvars.append(dimvar)
+
+    out_fn = os.path.join(run_config.run_output_dir,
+                          'emis_{}_{}_{}_timeline.nc'.format(sector.name, year, month))
+    print('Create output data file:{}'.format(out_fn))
+    ncfile = dataset.addfile(get_temp_fn(out_fn), 'c', largefile=True)
+    ncfile.nc_define(dims, gattrs, dimvars, write_dimvars=False)
+    for name, dim, values, attrs in coords:
+        ncfile.write(name, values)
+    for i, (t, ratios) in enumerate(timeline_ratios):
+        print(t.strftime('%Y-%m-%d'))
+        ratios = (ratios / 3600.).reshape(24, 1, 1)
+        for name, data in month_data.items():
+            ncfile.write(name, ratios * data, origin=[i * 24, 0, 0])
+    ncfile.close()
+    commit_file(out_fn)
+    get_checkpoint(run_config.run_output_dir).done(out_fn)
+
+
+def get_pollutant_fn(run_config, sector, pollutant):
+    """
+    Get the output file name of a pollutant which is merged to the sector file.
+
+    :param run_config: (*RunConfigure*) The run configure.
+    :param sector: (*Sector*) The sector.
+    :param pollutant: (*Pollutant*) The pollutant.
+
+    :return: (*str*) The pollutant file name.
+    """
+    year = run_config.emission_year
+    month = run_config.emission_month
+    if pollutant.is_VOC and run_config.voc_use_grid_spec:
+        fn = '{}_emis_lump_{}_{}_{}_hour.nc'.format(pollutant.name, sector.name, year, month)
+    else:
+        fn = '{}_emis_{}_{}_{}_hour.nc'.format(pollutant.name, sector.name, year, month)
+    return os.path.join(run_config.run_output_dir, fn)
+
+
+def get_code_files():
+    """
+    Get the source files of the modules called by the processing stages.
+
+    :return: (*list*) The source file names.
+    """
+    fns = [os.path.join(_package_dir, '__init__.py')]
+    for code_dir in _code_dirs:
+        for root, dirs, files in os.walk(os.path.join(_package_dir, code_dir)):
+            dirs.sort()
+            fns.extend(os.path.join(root, fn) for fn in sorted(files) if fn.endswith('.py'))
+    return fns
+
+
+def get_code_version(manifest):
+    """
+    Get the code version, the package version and the content hash of the source files of the
+    modules called by the processing stages, so a code change in any of the modules invalidates
+    the recorded outputs.
+
+    :param manifest: (*Manifest*) The manifest to get the content hashes of the files.
+
+    :return: (*str*) The code version.
+    """
+    digests = dict((os.path.relpath(fn, _package_dir), manifest.file_digest(fn))
+                   for fn in get_code_files())
+    return '{} {}'.format(version, hash_inputs(digests))
+
+
+def get_pollutant_inputs(run_config, sector, pollutant, manifest):
+    """
+    Get the input hashes of a pollutant: the emission file, the temporal and speciation profile
+    rows used, the model grid, the chemical mechanism and the code version.
+
+    :param run_config: (*RunConfigure*) The run configure.
+    :param sector: (*Sector*) The sector.
+    :param pollutant: (*Pollutant*) The pollutant.
+    :param manifest: (*Manifest*) The manifest to get the content hashes of the files.
+
+    :return: (*OrderedDict*) The input hashes by input name.
+    """
+    year = run_config.emission_year
+    month = run_config.emission_month
+    inputs = OrderedDict()
+    inputs['code'] = get_code_version(manifest)
+    inputs['period'] = '{}-{}'.format(year, month)
+    inputs['units'] = str(pollutant.units)
+
+    # Emission file, or the emission read script if the file name is unknown
+    emission = run_config.emission_module
+    if hasattr(emission, 'get_emis_fn'):
+        inputs['emission'] = manifest.file_digest(emission.get_emis_fn(sector, pollutant, year, month))
+    else:
+        inputs['emission'] = manifest.file_digest(run_config.emission_read_file)
+
+    inputs['grid'] = hash_inputs(dict(grid=run_config.spatial_model_grid.key(),
+                                      method=run_config.spatial_regrid_method,
+                                      weights=run_config.spatial_regrid_weights))
+    inputs['mechanism'] = run_config.chemical_mechanism.name
+
+    # Temporal profile rows of the sector
+    temp_ref_fn = os.path.join(ge_data_dir, run_config.temporal_ref_file)
+    temp_profile_fn = os.path.join(ge_data_dir, run_config.temporal_prof_file)
+    month_profile, week_profile, diurnal_profile, diurnal_profile_we = \
+        temp_alloc.read_file(temp_ref_fn, temp_profile_fn, sector.scc)
+    inputs['temporal'] = hash_inputs(dict(week=week_profile.weights.tolist(),
+                                          diurnal=diurnal_profile.weights.tolist()))
+
+    # Speciation profile rows of the pollutant, or the grid speciation file
+    if pollutant.is_VOC and run_config.voc_use_grid_spec:
+        with _grid_spec_lock:
+            spec_fn = run_config.grid_spec_module.get_spec_fn(sector)
+        inputs['speciation'] = manifest.file_digest(spec_fn)
+    else:
+        spec_ref_fn = os.path.join(ge_data_dir, run_config.chemical_ref_file)
+        spec_profile_fn = os.path.join(ge_data_dir, run_config.chemical_prof_file)
+        pollutant_profiles = chem_spec.read_file(spec_ref_fn, spec_profile_fn, sector.scc,
+                                                 cache_dir=get_cache_dir(run_config))
+        poll_prof = chem_spec.get_pollutant_profile(pollutant_profiles, pollutant)
+        inputs['speciation'] = hash_inputs(dict(profile=str(poll_prof)))
+
+    return inputs
+
+
+def _add_stage(plan, manifest, name, fn, inputs, depend=False):
+    """
+    Add a stage to the rebuild plan. The stage is rebuilt if the stage it depends on is rebuilt
+    or its output file is not current.
+    """
+    if manifest.is_current(fn, hash_inputs(inputs)) and not depend:
+        plan.add(name, fn, inputs, False)
+        return
+    changed = manifest.changed_inputs(fn, inputs)
+    if depend:
+        reason = 'input stage rebuilt'
+    elif changed is None:
+        reason = 'new'
+    elif len(changed) == 0:
+        reason = 'output missing'
+    else:
+        reason = 'changed: {}'.format(', '.join(changed))
+    plan.add(name, fn, inputs, True, reason)
+
+
+def get_stage_fns(sector, run_config):
+    """
+    Get the output file names of the stages of a sector.
+
+    :param sector: (*Sector*) The sector.
+    :param run_config: (*RunConfigure*) The run configure.
+
+    :return: (*OrderedDict*) The output file names by stage name (`merge`, `vertical`,
+        `timeline` and the pollutant names).
+    """
+    year = run_config.emission_year
+    month = run_config.emission_month
+    stage_fns = OrderedDict()
+    stage_fns['merge'] = os.path.join(run_config.run_output_dir,
+                                      'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+    if run_config.is_run_vertical:
+        stage_fns['vertical'] = os.path.join(run_config.run_output_dir,
+                                             'emis_{}_{}_{}_hour_height.nc'.format(sector.name, year, month))
+    if run_config.temporal_timeline:
+        stage_fns['timeline'] = os.path.join(run_config.run_output_dir,
+                                             'emis_{}_{}_{}_timeline.nc'.format(sector.name, year, month))
+    for pollutant in run_config.emission_pollutants:
+        stage_fns[pollutant.name] = get_pollutant_fn(run_config, sector, pollutant)
+    return stage_fns
+
+
+def plan_sector(sector, run_config, manifest=None):
+    """
+    Plan the stages of a sector which need to be rebuilt, according to the input hashes recorded
+    in the manifest of the output directory. A pollutant is only rebuilt when the merged sector
+    file need to be rebuilt and the pollutant file is not current. With `run_in_memory` of the run
+    configure all stages are rebuilt if any of them need to be rebuilt, as the pollutant data are
+    not kept in files.
+
+    :param sector: (*Sector*) The sector.
+    :param run_config: (*RunConfigure*) The run configure.
+    :param manifest: (*Manifest*) The manifest. Default is `None` that the manifest of the
+        output directory is used.
+
+    :return: (*SectorPlan*) The rebuild plan.
+    """
+    if manifest is None:
+        manifest = get_manifest(run_config.run_output_dir)
+    stage_fns = get_stage_fns(sector, run_config)
+
+    pollutant_inputs = OrderedDict()
+    for pollutant in run_config.emission_pollutants:
+        pollutant_inputs[pollutant.name] = get_pollutant_inputs(run_config, sector, pollutant, manifest)
+
+    # Merged sector file
+    plan = SectorPlan(sector)
+    merge_inputs = OrderedDict((name, hash_inputs(inputs)) for name, inputs in pollutant_inputs.items())
+    _add_stage(plan, manifest, 'merge', stage_fns['merge'], merge_inputs)
+    merge_rebuilt = plan.rebuild('merge')
+    merge_digest = hash_inputs(merge_inputs)
+
+    # Vertical allocation file
+    if run_config.is_run_vertical:
+        vertical_inputs = OrderedDict()
+        vertical_inputs['sector'] = merge_digest
+        vertical_inputs['profile'] = hash_inputs(dict(ratios=vertical_alloc.read_file(
+            run_config.vertical_prof_file, sector.scc).get_ratios().tolist()))
+        for key, fn in [('stack', run_config.vertical_stack_file), ('grid', run_config.vertical_grid_file)]:
+            if fn:
+                vertical_inputs[key] = manifest.file_digest(os.path.join(ge_data_dir, fn))
+        vertical_inputs['layer_tops'] = str(run_config.vertical_layer_tops)
+        _add_stage(plan, manifest, 'vertical', stage_fns['vertical'], vertical_inputs, merge_rebuilt)
+
+    # Hourly emission of every day
+    if run_config.temporal_timeline:
+        temp_ref_fn = os.path.join(ge_data_dir, run_config.temporal_ref_file)
+        temp_profile_fn = os.path.join(ge_data_dir, run_config.temporal_prof_file)
+        profiles = temp_alloc.read_file(temp_ref_fn, temp_profile_fn, sector.scc)
+        timeline_inputs = OrderedDict()
+        timeline_inputs['sector'] = merge_digest
+        timeline_inputs['temporal'] = hash_inputs(dict(profiles=[p.weights.tolist() for p in profiles[1:]]))
+        _add_stage(plan, manifest, 'timeline', stage_fns['timeline'], timeline_inputs, merge_rebuilt)
+
+    # Pollutant files, rebuild all stages with in memory pipeline
+    for pollutant in run_config.emission_pollutants:
+        fn = stage_fns[pollutant.name]
+        inputs = pollutant_inputs[pollutant.name]
+        if merge_rebuilt:
+            _add_stage(plan, manifest, pollutant.name, fn, inputs)
+        else:
+            plan.add(pollutant.name, fn, inputs, False)
+    if run_config.run_in_memory and not plan.up_to_date:
+        for name, (fn, inputs, rebuild, reason) in plan.stages.items():
+            if not rebuild:
+                plan.add(name, fn, inputs, True, 'in memory run')
+
+    return plan
+
+
+def plan_resume(sector, run_config, plan=None):
+    """
+    Plan the stages of a sector to resume an interrupted run. The stages completed in the
+    checkpoint of the output directory are skipped, and the pollutants are only run when the
+    merged sector file is not completed. With `run_in_memory` of the run configure all pollutants
+    are run in this case, as the pollutant data are not kept in files.
+
+    :param sector: (*Sector*) The sector.
+    :param run_config: (*RunConfigure*) The run configure.
+    :param plan: (*SectorPlan*) The rebuild plan to be resumed. Default is `None` that all stages
+        are to be run.
+
+    :return: (*SectorPlan*) The resume plan.
+    """
+    if plan is None:
+        plan = SectorPlan(sector)
+        for name, fn in get_stage_fns(sector, run_config).items():
+            plan.add(name, fn, None, True, 'new')
+
+    checkpoint = get_checkpoint(run_config.run_output_dir)
+    resume = SectorPlan(sector)
+    for name, (fn, inputs, rebuild, reason) in plan.stages.items():
+        if rebuild and checkpoint.is_done(fn):
+            resume.add(name, fn, inputs, False, 'completed')
+        else:
+            resume.add(name, fn, inputs, rebuild, reason)
+
+    merge_rebuilt = resume.rebuild('merge')
+    for pollutant in run_config.emission_pollutants:
+        fn, inputs, rebuild, reason = resume.stages[pollutant.name]
+        if not merge_rebuilt:
+            resume.add(pollutant.name, fn, inputs, False, reason)
+        elif run_config.run_in_memory and not rebuild:
+            resume.add(pollutant.name, fn, inputs, True, 'in memory run')
+    return resume
+
+
+def get_sector_plan(sector, run_config):
+    """
+    Get the plan of a sector according to `run_incremental` and `run_resume` of the run configure.
+
+    :param sector: (*Sector*) The sector.
+    :param run_config: (*RunConfigure*) The run configure.
+
+    :return: (*SectorPlan*) The plan. `None` if all stages are to be run.
+    """
+    plan = None
+    if run_config.run_incremental:
+        plan = plan_sector(sector, run_config)
+    if run_config.run_resume:
+        plan = plan_resume(sector, run_config, plan)
+    return plan
+
+
+def add_sector_tasks(graph, sector, run_config, prefix='', plan=None):
+    """
+    Add the processing tasks of a sector to a task graph. The pollutant tasks are independent,
+    the merge task depends on all pollutant tasks and the vertical task depends on the merge task.
+    With `run_incremental` or `run_resume` of the run configure only the stages need to be run
+    are added, see `get_sector_plan` function.
+
+    :param graph: (*TaskGraph*) The task graph.
+    :param sector: (*Sector*) The sector.
+    :param run_config: (*RunConfigure*) The run configure.
+    :param prefix: (*str*) Prefix of the task names, such as the period of a batch run. Default
+        is empty.
+    :param plan: (*SectorPlan*) The plan. Default is `None` that the plan is got by
+        `get_sector_plan` function.
+
+    :return: (*str*) Name of the last task of the sector. `None` if the sector is up to date.
+    """
+    if plan is None:
+        plan = get_sector_plan(sector, run_config)
+    if plan is not None and plan.up_to_date:
+        print('Up to date: {}'.format(sector.name))
+        return None
+
+    # The stages after a completed merge read the merged sector file
+    accumulator = None
+    if run_config.run_in_memory and (plan is None or plan.rebuild('merge')):
+        if graph.use_process and graph.workers > 1:
+            # The accumulator can not be shared by processes, so run the whole sector in one task
+            last_task = '{}sector_{}'.format(prefix, sector.name)
+            graph.add_task(last_task, run_sector, (sector, run_config, 1, plan))
+            return last_task
+        accumulator = SectorAccumulator(sector)
+
+    poll_tasks = []
+    for pollutant in run_config.emission_pollutants:
+        if plan is not None and not plan.rebuild(pollutant.name):
+            continue
+        name = '{}pollutant_{}_{}'.format(prefix, sector.name, pollutant.name)
+        graph.add_task(name, run_pollutant, (run_config, sector, pollutant, accumulator))
+        poll_tasks.append(name)
+
+    final_tasks = []
+    merge_task = None
+    if plan is None or plan.rebuild('merge'):
+        merge_task = '{}merge_{}'.format(prefix, sector.name)
+        graph.add_task(merge_task, merge_sector, (sector, run_config, accumulator), deps=poll_tasks)
+        final_tasks = [merge_task]
+    merge_deps = [] if merge_task is None else [merge_task]
+
+    if run_config.is_run_vertical and (plan is None or plan.rebuild('vertical')):
+        vertical_task = '{}vertical_{}'.format(prefix, sector.name)
+        graph.add_task(vertical_task, run_vertical_sector, (sector, run_config, accumulator),
+                       deps=merge_deps)
+        if merge_task in final_tasks:
+            final_tasks.remove(merge_task)
+        final_tasks.append(vertical_task)
+
+    if run_config.temporal_timeline and (plan is None or plan.rebuild('timeline')):
+        timeline_task = '{}timeline_{}'.format(prefix, sector.name)
+        graph.add_task(timeline_task, run_timeline_sector, (sector, run_config, accumulator),
+                       deps=merge_deps)
+        final_tasks.append(timeline_task)
+    last_task = final_tasks[-1]
+
+    if accumulator is not None:
+        release_task = '{}release_{}'.format(prefix, sector.name)
+        graph.add_task(release_task, accumulator.clear, deps=final_tasks)
+        last_task = release_task
+
+    if plan is not None and run_config.run_incremental:
+        record_task = '{}record_{}'.format(prefix, sector.name)
+        graph.add_task(record_task, plan.record, (get_manifest(run_config.run_output_dir),),
+                       deps=final_tasks)
+        last_task = record_task
+
+    return last_task
+
+
+@profiled('run_sector')
+def run_sector(sector, run_config, workers=None, plan=None):
     """
     Total emission processing to a sector.
 
     :param sector: (*Sector*) The sector.
     :param run_config: (*RunConfigure*) The run configure.
+    :param workers: (*int*) Number of workers to run the pollutants concurrently. Default is
+        `None` that `run_config.run_workers` is used.
+    :param plan: (*SectorPlan*) The plan. Default is `None` that the plan is got by
+        `get_sector_plan` function.
     """
+    if workers is None:
+        workers = run_config.run_workers
+    if workers > 1:
+        graph = TaskGraph(workers)
+        add_sector_tasks(graph, sector, run_config, plan=plan)
+        graph.run()
+        print("Done: {}".format(sector.name))
+        return
+
+    if plan is None:
+        plan = get_sector_plan(sector, run_config)
+    if plan is not None:
+        if plan.up_to_date:
+            print('Up to date: {}'.format(sector.name))
+            return
+        print(plan)
+
+    # The stages after a completed merge read the merged sector file
+    accumulator = None
+    if run_config.run_in_memory and (plan is None or plan.rebuild('merge')):
+        accumulator = SectorAccumulator(sector)
     for pollutant in run_config.emission_pollutants:
+        if plan is not None and not plan.rebuild(pollutant.name):
+            continue
         print("-------------------------------")
         print("Pollutant: {}".format(pollutant))
         print("-------------------------------")
-        run_pollutant(run_config, sector, pollutant)
+        run_pollutant(run_config, sector, pollutant, accumulator)
 
-    merge_sector(sector, run_config)
+    if plan is None or plan.rebuild('merge'):
+        merge_sector(sector, run_config, accumulator)
 
-    if run_config.is_run_vertical:
-        run_vertical_sector(sector, run_config)
+    if run_config.is_run_vertical and (plan is None or plan.rebuild('vertical')):
+        run_vertical_sector(sector, run_config, accumulator)
+
+    if run_config.temporal_timeline and (plan is None or plan.rebuild('timeline')):
+        run_timeline_sector(sector, run_config, accumulator)
+
+    if accumulator is not None:
+        accumulator.clear()
+
+    if plan is not None and run_config.run_incremental:
+        plan.record(get_manifest(run_config.run_output_dir))
 
     print("Done: {}".format(sector.name))
 
 
-def run_total(run_config):
+@profile_run('total')
+def run_total(run_config, workers=None, dry_run=False):
     """
-    Total emission processing to all sectors.
+    Total emission processing to all sectors. The completed stages are recorded in the checkpoint
+    of the output directory, which is cleared at the start of the run unless `run_resume` of the
+    run configure is True to continue an interrupted run.
 
     :param run_config: (*RunConfigure*) The run configure.
+    :param workers: (*int*) Number of workers to run the sector and pollutant tasks concurrently.
+        Default is `None` that `run_config.run_workers` is used.
+    :param dry_run: (*bool*) Only print and return the rebuild plans of the sectors according to
+        the manifest and the checkpoint of the output directory. Default is `False`.
+
+    :return: (*list*) The rebuild plans of the sectors if `dry_run` is True.
     """
+    if workers is None:
+        workers = run_config.run_workers
+
+    # Parse the temporal profile files once, the database is shared by all sectors
+    temp_alloc.get_temporal_profile_db(os.path.join(ge_data_dir, run_config.temporal_ref_file),
+                                       os.path.join(ge_data_dir, run_config.temporal_prof_file))
+
+    if dry_run:
+        plans = []
+        for sector in run_config.emission_sectors:
+            plan = plan_sector(sector, run_config)
+            if run_config.run_resume:
+                plan = plan_resume(sector, run_config, plan)
+            plans.append(plan)
+        for plan in plans:
+            print(plan)
+        n = len([plan for plan in plans if not plan.up_to_date])
+        print("Sectors to rebuild: {} of {}".format(n, len(plans)))
+        return plans
+
+    if not run_config.run_resume:
+        get_checkpoint(run_config.run_output_dir).reset()
+
+    if workers > 1:
+        print("Run with {} workers".format(workers))
+        graph = TaskGraph(workers)
+        for sector in run_config.emission_sectors:
+            add_sector_tasks(graph, sector, run_config)
+        graph.run()
+        print("Done total!")
+        return
+
     for sector in run_config.emission_sectors:
         print("############################")
         print("Sector: {}".format(sector))
         print("############################")
-        run_sector(sector, run_config)
+        run_sector(sector, run_config, 1)
 
     print("Done total!")
-
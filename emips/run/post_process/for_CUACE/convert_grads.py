@@ -1,7 +1,8 @@
 import os
 from mipylib import dataset
 from mipylib import numeric as np
-from emips.utils import SectorEnum
+from emips.utils import SectorEnum, TaskGraph, profiled, add_io
+from grads_writer import GrADSWriter
 
 # Set emission low, poi, pow
 emis_cuace = {}
@@ -14,80 +15,107 @@ emis_cuace['air'] = [SectorEnum.AIR]
 # Set time dimension of output file.
 tn = 25  # 0 - 24 hour
 
-def run(year, months, dir_in, dir_out, xn, yn, all_species):
+def run(year, months, dir_in, dir_out, xn, yn, all_species, workers=1, chunk=6):
     """
-    Convert netcdf model-ready emission file to GrADS data 
-    format for CUACE model.
-    
+    Convert netcdf model-ready emission file to GrADS data
+    format for CUACE model. The months and emission types are
+    converted in parallel.
+
     :param year: (*int*) Year.
     :param months: (*list*) List of months.
     :param dir_in: (*string*) The directory where netcdf data is stored.
     :param dir_out: (*string*) The directory where GrADS data is writed.
     :param xn: (*int*) x-dimension of output files.
     :param yn: (*int*) y-dimension of output files.
+    :param workers: (*int*) Number of workers. Default is 1.
+    :param chunk: (*int*) Number of hours read at a time. Default is 6.
     """
+    if not os.path.exists(dir_out):
+        os.makedirs(dir_out)
+    print('------------------Filepath------------------')
+    print('dir_data: {}\ndir_out: {}'.format(dir_in, dir_out))
 
+    graph = TaskGraph(workers)
     for month in months:
-        print('**************')
-        print('Month: {}'.format(month))
-        print('**************')
-
-        # Set directory for input and output files
-        # dir_in = os.path.join(dir_in, str(year), '{}{:>02d}'.format(year, month))
-        # dir_out = os.path.join(dir_out, str(year), '{}{:>02d}'.format(year, month))
-        if not os.path.exists(dir_out):
-            os.makedirs(dir_out)
-        print('------------------Filepath------------------')
-        print('dir_data: {}\ndir_out: {}'.format(dir_in, dir_out))
-        # Loop
         for emis_type, sectors in emis_cuace.iteritems():
-            print(emis_type, sectors)
-
-            # set output binary dta file
-            outfn = os.path.join(dir_out, 'emis_{}_{}_{}.grd'.format(year, month, emis_type))
-            outer = dataset.bincreate(outfn)
-
-            # Loop time number
-            for t in range(tn):
-                print('Time number: {}'.format(t))
-                if t == tn - 1:
-                    t = 0
-                # Loop species
-                for species in all_species:
-                    data = None
-                    # Loop sectors
-                    for sector in sectors:
-                        fn = os.path.join(dir_in, 'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
-                        if os.path.exists(fn):
-                            f_in = dataset.addfile(fn)
-                            if species.name in f_in.varnames:
-                                dd = f_in[species.name][t]
-                                if dd.sum() == 0:
-                                    continue
-                                if dd.contains_nan():
-                                    dd[dd == np.nan] = 0
-                                if data is None:
-                                    data = dd
-                                else:
-                                    data = data + dd
-                            f_in.close()
-                        else:
-                             print('Alarm! File not exists: {}'.format(fn))
-                             continue
-                    if data is None:
-                        print('Is None: {}'.format(species))
-                        data = np.zeros((yn, xn))
-                    # Check the dimensions of the input and output files
-                    if data.shape[0] != yn or data.shape[1] != xn:
-                        print('The dimensions of input data and output data do not match!!!')
-                        os.system("pause")
-
-                    dataset.binwrite(outer, data.astype('float'), byteorder='little_endian', sequential=True)
-            outer.close()
+            graph.add_task('{}_{}'.format(month, emis_type), convert,
+                           args=(year, month, emis_type, sectors, dir_in, dir_out, xn, yn, all_species, chunk))
+    graph.run()
     print('#########################')
     print('Data convert completed!!!')
     print('#########################')
 
+@profiled('convert_grads')
+def convert(year, month, emis_type, sectors, dir_in, dir_out, xn, yn, all_species, chunk=6):
+    """
+    Convert netcdf model-ready emission files of the sectors to one GrADS
+    data file. The sector files are opened once and read by hour chunks,
+    and the records are streamed to the output file.
+
+    :param year: (*int*) Year.
+    :param month: (*int*) Month.
+    :param emis_type: (*string*) Emission type [low | poi | pow | air].
+    :param sectors: (*list*) Sectors of the emission type.
+    :param dir_in: (*string*) The directory where netcdf data is stored.
+    :param dir_out: (*string*) The directory where GrADS data is writed.
+    :param xn: (*int*) x-dimension of output files.
+    :param yn: (*int*) y-dimension of output files.
+    :param all_species: (*list*) Species of the chemical mechanism.
+    :param chunk: (*int*) Number of hours read at a time. Default is 6.
+    """
+    print('Month: {}; Type: {}; Sectors: {}'.format(month, emis_type, sectors))
+
+    # Open sector files
+    files = []
+    for sector in sectors:
+        fn = os.path.join(dir_in, 'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+        if os.path.exists(fn):
+            files.append(dataset.addfile(fn))
+            add_io(read=os.path.getsize(fn))
+        else:
+            print('Alarm! File not exists: {}'.format(fn))
+
+    # set output binary dta file
+    outfn = os.path.join(dir_out, 'emis_{}_{}_{}.grd'.format(year, month, emis_type))
+    writer = GrADSWriter(outfn, byteorder='little_endian')
+
+    # Loop hour chunks, the last time is same with the first hour
+    nhour = tn - 1
+    first_hour = []
+    for h0 in range(0, nhour, chunk):
+        h1 = min(h0 + chunk, nhour)
+        print('Time number: {} - {}'.format(h0, h1 - 1))
+        # Sum sectors of each species
+        chunk_data = []
+        for species in all_species:
+            data = None
+            for f_in in files:
+                if species.name in f_in.varnames:
+                    dd = f_in[species.name][h0:h1]
+                    if dd.contains_nan():
+                        dd[dd == np.nan] = 0
+                    if data is None:
+                        data = dd
+                    else:
+                        data += dd
+            if data is None:
+                data = np.zeros((h1 - h0, yn, xn))
+            # Check the dimensions of the input and output files
+            if data.shape[1] != yn or data.shape[2] != xn:
+                writer.close()
+                raise ValueError('The dimensions of input data and output data do not match!!!')
+            chunk_data.append(data)
+        if h0 == 0:
+            first_hour = [data[0] for data in chunk_data]
+        for t in range(h1 - h0):
+            for data in chunk_data:
+                writer.write(data[t])
+    for data in first_hour:
+        writer.write(data)
+    writer.close()
+    for f_in in files:
+        f_in.close()
+
 if __name__ == '__main__':
     import time
     import os
@@ -8,7 +8,9 @@ import convert_grads
 import write_ctl
 import time
 import os
+from emips.utils import profile_run
 
+@profile_run('post_process')
 def run(run_config):
     """
     To CUACE model ready emission data files.
@@ -35,7 +37,7 @@ def run(run_config):
 
     # Run all scripts
     print('Convert to grads...')
-    convert_grads.run(year, months, dir_in, dir_out, xn, yn, all_species)
+    convert_grads.run(year, months, dir_in, dir_out, xn, yn, all_species, workers=run_config.run_workers)
 
     print('Write .ctl files...')
     write_ctl.run(year, months, dir_out, xn, yn, xmin, ymin, xdelta, ydelta)
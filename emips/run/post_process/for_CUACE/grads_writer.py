@@ -0,0 +1,65 @@
+from java.io import RandomAccessFile
+from java.nio import ByteBuffer, ByteOrder
+from ucar.ma2 import DataType
+
+
+class GrADSWriter(object):
+
+    def __init__(self, fn, sequential=True, byteorder='little_endian'):
+        """
+        Streaming GrADS binary data file writer. The records are written as 4 bytes float
+        values one by one, and the record buffer is reused. The data are put into a direct byte
+        buffer and written by the file channel without converting to Python values.
+
+        :param fn: (*string*) The binary data file name.
+        :param sequential: (*bool*) Write sequential records with the record length before and
+            after each record (`options sequential` of the GrADS description file). Default is
+            True.
+        :param byteorder: (*string*) Byte order [little_endian | big_endian]. Default is
+            `little_endian`.
+        """
+        self.fn = fn
+        self.sequential = sequential
+        self.little_endian = byteorder == 'little_endian'
+        self.nrecord = 0
+        self._buffer = None
+        self._file = RandomAccessFile(fn, 'rw')
+        self._file.setLength(0)
+        self._channel = self._file.getChannel()
+        self._order = ByteOrder.LITTLE_ENDIAN if self.little_endian else ByteOrder.BIG_ENDIAN
+
+    def __str__(self):
+        return 'GrADSWriter: {}; Records: {}'.format(self.fn, self.nrecord)
+
+    __repr__ = __str__
+
+    def write(self, data):
+        """
+        Write a record.
+
+        :param data: (*array*) The record data, such as one species of one hour.
+        """
+        values = data._array.get1DJavaArray(DataType.FLOAT)
+        nbytes = len(values) * 4
+        size = nbytes + 8 if self.sequential else nbytes
+        if self._buffer is None or self._buffer.capacity() != size:
+            self._buffer = ByteBuffer.allocateDirect(size).order(self._order)
+        buf = self._buffer
+        buf.clear()
+        if self.sequential:
+            buf.putInt(nbytes)
+        buf.asFloatBuffer().put(values)
+        buf.position(buf.position() + nbytes)
+        if self.sequential:
+            buf.putInt(nbytes)
+        buf.flip()
+        while buf.hasRemaining():
+            self._channel.write(buf)
+        self.nrecord += 1
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self._channel.close()
+        self._file.close()
@@ -2,9 +2,11 @@ import calendar
 import os
 from mipylib import miutil
 import datetime
+from emips.utils import profiled
 
 #Set types of pollutants
 types = ['low','poi','pow','air']
+@profiled('write_ctl')
 def run(year, months, dir_out, xn, yn, xmin, ymin, xdelta, ydelta):
     """
     Write the description file of the output binary data files.
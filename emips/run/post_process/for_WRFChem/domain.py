@@ -0,0 +1,169 @@
+from emips.spatial_alloc import GridDesc
+from collections import OrderedDict
+from mipylib import dataset, geolib
+import mipylib.numeric as np
+import os
+import re
+
+#Global attributes copied from the domain file
+domain_attrs = ['DX', 'DY', 'CEN_LAT', 'CEN_LON', 'TRUELAT1', 'TRUELAT2', 'MOAD_CEN_LAT', 'STAND_LON',
+                'POLE_LAT', 'POLE_LON', 'GMT', 'MAP_PROJ', 'MAP_PROJ_CHAR', 'MMINLU', 'NUM_LAND_CAT',
+                'ISWATER', 'ISLAKE', 'ISICE', 'ISURBAN', 'ISOILWATER']
+
+#Names of WRF map projections
+map_proj_names = {1: 'Lambert Conformal', 2: 'Polar Stereographic', 3: 'Mercator',
+                  6: 'Cylindrical Equidistant'}
+
+#Earth radius of WRF
+earth_radius = 6370000
+
+
+class Domain(object):
+
+    def __init__(self, name, grid, attributes):
+        """
+        WRF model domain.
+
+        :param name: (*string*) Domain name, such as `d01`.
+        :param grid: (*GridDesc*) The grid of mass points.
+        :param attributes: (*OrderedDict*) Global attributes of the domain file.
+        """
+        self.name = name
+        self.grid = grid
+        self.attributes = attributes
+
+    def __str__(self):
+        r = 'Domain: {}'.format(self.name)
+        r += '\n{}'.format(self.grid)
+        return r
+
+    __repr__ = __str__
+
+    def get_global_attributes(self, year, month, mechanism_name, z):
+        """
+        Get global attributes of the wrfchemi files.
+
+        :param year: (*int*) Year.
+        :param month: (*int*) Month.
+        :param mechanism_name: (*string*) The name of the chemical mechanism.
+        :param z: (*int*) The zdim of the output data.
+
+        :return: (*OrderedDict*) Global attributes.
+        """
+        nx = self.grid.x_num
+        ny = self.grid.y_num
+        gattrs = OrderedDict()
+        gattrs['TITLE'] = 'Created using MeteoInfo, mechanism: {}'.format(mechanism_name.upper())
+        gattrs['START_DATE'] = "{}-{:0>2d}-01_00:00:00".format(year, month)
+        gattrs['WEST-EAST_GRID_DIMENSION'] = nx + 1
+        gattrs['SOUTH-NORTH_GRID_DIMENSION'] = ny + 1
+        gattrs['BOTTOM-TOP_GRID_DIMENSION'] = z + 1
+        gattrs['DX'] = self.attributes['DX']
+        gattrs['DY'] = self.attributes['DY']
+        gattrs['WEST-EAST_PATCH_START_UNSTAG'] = 1
+        gattrs['WEST-EAST_PATCH_END_UNSTAG'] = nx
+        gattrs['WEST-EAST_PATCH_START_STAG'] = 1
+        gattrs['WEST-EAST_PATCH_END_STAG'] = nx + 1
+        gattrs['SOUTH-NORTH_PATCH_START_UNSTAG'] = 1
+        gattrs['SOUTH-NORTH_PATCH_END_UNSTAG'] = ny
+        gattrs['SOUTH-NORTH_PATCH_START_STAG'] = 1
+        gattrs['SOUTH-NORTH_PATCH_END_STAG'] = ny + 1
+        gattrs['BOTTOM-TOP_PATCH_START_UNSTAG'] = 1
+        gattrs['BOTTOM-TOP_PATCH_END_UNSTAG'] = z
+        gattrs['BOTTOM-TOP_PATCH_START_STAG'] = 1
+        gattrs['BOTTOM-TOP_PATCH_END_STAG'] = z + 1
+        for key, value in self.attributes.iteritems():
+            if key not in gattrs:
+                gattrs[key] = value
+        return gattrs
+
+
+def _attr_value(f, key):
+    v = f.attrvalue(key)
+    if v is None or isinstance(v, basestring):
+        return v
+    return v[0]
+
+
+def get_projection(map_proj, truelat1, truelat2, stand_lon, moad_cen_lat, pole_lat=90.):
+    """
+    Get projection of WRF map projection parameters.
+
+    :param map_proj: (*int*) WRF map projection [1: Lambert | 2: Polar | 3: Mercator | 6: Lat-lon].
+    :param truelat1: (*float*) True latitude 1.
+    :param truelat2: (*float*) True latitude 2.
+    :param stand_lon: (*float*) Standard longitude.
+    :param moad_cen_lat: (*float*) Center latitude of the most outside domain.
+    :param pole_lat: (*float*) Pole latitude of the lat-lon projection. Rotated pole (not 90) is
+        not supported.
+
+    :return: (*ProjectionInfo*) The projection.
+    """
+    if map_proj == 1:
+        return geolib.projinfo(proj='lcc', lon_0=stand_lon, lat_0=moad_cen_lat, lat_1=truelat1,
+                               lat_2=truelat2, a=earth_radius, b=earth_radius)
+    elif map_proj == 2:
+        lat_0 = 90. if truelat1 >= 0 else -90.
+        return geolib.projinfo(proj='stere', lon_0=stand_lon, lat_0=lat_0, lat_ts=truelat1,
+                               a=earth_radius, b=earth_radius)
+    elif map_proj == 3:
+        return geolib.projinfo(proj='merc', lon_0=stand_lon, lat_ts=truelat1, a=earth_radius,
+                               b=earth_radius)
+    elif map_proj == 6:
+        if abs(pole_lat - 90.) > 1e-6:
+            raise ValueError('Not supported WRF rotated lat-lon projection, POLE_LAT: {}'.format(pole_lat))
+        return geolib.projinfo()
+    else:
+        raise ValueError('Not supported WRF map projection: {}'.format(map_proj))
+
+
+def read_domain(fn, name=None):
+    """
+    Read WRF domain from a wrfinput or geo_em file. The projection is built from the map
+    projection attributes, and the grid of mass points is centered at the domain center.
+
+    :param fn: (*string*) The wrfinput_d0N or geo_em.d0N.nc file.
+    :param name: (*string*) Domain name. Default is `None` that the name is got from the file
+        name (`d01`, `d02`, ...).
+
+    :return: (*Domain*) The domain.
+    """
+    if name is None:
+        m = re.search(r'd\d\d', os.path.basename(fn))
+        name = m.group(0) if m else 'd01'
+
+    f = dataset.addfile(fn)
+    attributes = OrderedDict()
+    for key in domain_attrs:
+        v = _attr_value(f, key)
+        if v is not None:
+            attributes[key] = v
+    nx = int(_attr_value(f, 'WEST-EAST_GRID_DIMENSION')) - 1
+    ny = int(_attr_value(f, 'SOUTH-NORTH_GRID_DIMENSION')) - 1
+    map_proj = int(attributes['MAP_PROJ'])
+    if map_proj == 6:
+        # DX and DY are in meters, the grid spacing is got from the coordinate variables
+        lon_name = 'XLONG' if 'XLONG' in f.varnames else 'XLONG_M'
+        lat_name = 'XLAT' if 'XLAT' in f.varnames else 'XLAT_M'
+        lon = f[lon_name][0, 0, :]
+        lat = f[lat_name][0, :, 0]
+    f.close()
+
+    if 'MAP_PROJ_CHAR' not in attributes and map_proj in map_proj_names:
+        attributes['MAP_PROJ_CHAR'] = map_proj_names[map_proj]
+    cen_lon = float(attributes['CEN_LON'])
+    cen_lat = float(attributes['CEN_LAT'])
+    proj = get_projection(map_proj, float(attributes['TRUELAT1']), float(attributes.get('TRUELAT2', 0)),
+                          float(attributes['STAND_LON']), float(attributes.get('MOAD_CEN_LAT', cen_lat)),
+                          float(attributes.get('POLE_LAT', 90.)))
+    if map_proj == 6:
+        grid = GridDesc(proj, x_orig=float(lon[0]), x_cell=float(lon[1] - lon[0]), x_num=nx,
+                        y_orig=float(lat[0]), y_cell=float(lat[1] - lat[0]), y_num=ny)
+    else:
+        dx = float(attributes['DX'])
+        dy = float(attributes['DY'])
+        x, y = geolib.project(np.array([cen_lon]), np.array([cen_lat]), geolib.projinfo(), proj)
+        grid = GridDesc(proj, x_orig=float(x[0]) - (nx - 1) * 0.5 * dx, x_cell=dx, x_num=nx,
+                        y_orig=float(y[0]) - (ny - 1) * 0.5 * dy, y_cell=dy, y_num=ny)
+    print('Domain {}: {} x {}'.format(name, nx, ny))
+    return Domain(name, grid, attributes)
@@ -8,18 +8,26 @@ from mipylib import geolib
 from emips.spatial_alloc import GridDesc
 from emips import ge_data_dir
 from emips.utils import SectorEnum
-from emips.chem_spec import get_model_species_wrf
+from emips.chem_spec import get_model_species_WRFChem
 from emips import vertical_alloc
+from emips.run import get_cache_dir
+from emips.utils import TaskGraph
+from emips.utils import profile_run
 from collections import OrderedDict
 import height
 import merge
 import transform
 #Generate one(proj.py) or two(proj_2_file.py) emission files
 import proj_2_file as proj
+#Process all steps species by species without intermediate files
+import single_pass
+#Read target grid and global attributes from WRF domain files
+import domain
 
 import os
 import time
 
+@profile_run('post_process')
 def run(run_config):
     """
     To CUACE model ready emission data files.
@@ -45,6 +53,11 @@ def run(run_config):
     # Set model grid
     model_grid = run_config.spatial_model_grid
 
+    # Set WRF domain files (wrfinput_d0N or geo_em.d0N.nc) to get the target grids and global
+    # attributes of the domains, which are processed in parallel. The target grid and global
+    # attributes below are used for d01 if it is empty.
+    domain_files = []
+
     # Set target grid
     target_proj = geolib.projinfo(proj='lcc', lon_0=103.5, lat_0=36.500008, lat_1=30.0, lat_2=60.0, a=6370000, b=6370000)
     target_grid = GridDesc(target_proj, x_orig=-2497499.597352108, x_cell=15000.0, x_num=334,
@@ -57,6 +70,12 @@ def run(run_config):
     vertical_pro = vertical_alloc.read_file(run_config.vertical_prof_file, run_config.emission_sectors[0].scc)
     zdim = len(vertical_pro.weights)
 
+    # Set directory of the reprojection weights, which are computed once for the target grid
+    cache_dir = get_cache_dir(run_config)
+
+    # Process species one by one without the intermediate files
+    run_single_pass = True
+
     # Set sectors that need to be processed
     # sectors = [SectorEnum.INDUSTRY, SectorEnum.AGRICULTURE, SectorEnum.ENERGY,
     #         SectorEnum.RESIDENTIAL, SectorEnum.TRANSPORT]
@@ -107,20 +126,46 @@ def run(run_config):
     #################################################################################################
     ###------CB05,emiss_opt=15; RADM2,emiss_opt=3; SAPRC99,emiss_opt=13; MOZART,emiss_opt=10------###
     #################################################################################################
-    out_species, out_species_aer = get_model_species_wrf(mechanism_name)
-
-    # Run all scripts
-    print('Allocate according to height...')
-    height.run(year, month, dir_in, dir_out, model_grid, sectors, zdim, z_file)
-
-    print('Merge data from different sectors...')
-    merge.run(year, month, dir_in, dir_out, model_grid, sectors, zdim)
-
-    print('Distribution of particulate matter and change unit...')
-    transform.run(year, month, dir_in, dir_out, model_grid, out_species, out_species_aer, zdim)
-
-    print('Conversion projection...')
-    proj.run(year, month, dir_in, dir_out, model_grid, target_grid, out_species, out_species_aer, gattrs, mechanism_name, zdim)
+    out_species, out_species_aer = get_model_species_WRFChem(mechanism_name)
+
+    # Set domains: (name, target grid, global attributes)
+    if domain_files:
+        domains = []
+        for fn in domain_files:
+            wrf_domain = domain.read_domain(fn)
+            domains.append((wrf_domain.name, wrf_domain.grid,
+                            wrf_domain.get_global_attributes(year, month, mechanism_name, zdim)))
+    else:
+        domains = [('d01', target_grid, gattrs)]
+
+    # Run all scripts in one pass (two emission files) or step by step. The sector files or
+    # the transformed file are shared by the domains.
+    graph = TaskGraph(run_config.run_workers)
+    if run_single_pass:
+        print('Height allocation, merge, distribution, unit and projection conversion in one pass...')
+        for name, domain_grid, domain_gattrs in domains:
+            graph.add_task('single_pass_{}'.format(name), single_pass.run,
+                           args=(year, month, dir_in, dir_out, model_grid, domain_grid, sectors, out_species,
+                                 out_species_aer, domain_gattrs, mechanism_name, zdim, z_file, cache_dir),
+                           kwargs=dict(domain=name))
+    else:
+        print('Allocate according to height...')
+        height.run(year, month, dir_in, dir_out, model_grid, sectors, zdim, z_file)
+
+        print('Merge data from different sectors...')
+        merge.run(year, month, dir_in, dir_out, model_grid, sectors, zdim)
+
+        print('Distribution of particulate matter and change unit...')
+        transform.run(year, month, dir_in, dir_out, model_grid, out_species, out_species_aer, zdim,
+                      mechanism_name)
+
+        print('Conversion projection...')
+        for name, domain_grid, domain_gattrs in domains:
+            graph.add_task('proj_{}'.format(name), proj.run,
+                           args=(year, month, dir_in, dir_out, model_grid, domain_grid, out_species,
+                                 out_species_aer, domain_gattrs, mechanism_name, zdim, cache_dir),
+                           kwargs=dict(domain=name))
+    graph.run()
 
     print('-------------------')
     print('---All finished!---')
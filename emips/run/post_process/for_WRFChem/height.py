@@ -3,11 +3,12 @@ from collections import OrderedDict
 from mipylib import dataset
 import mipylib.numeric as np
 import os
-from emips.utils import emis_util
+from emips.utils import emis_util, profiled, add_io
 from emips import vertical_alloc
 
 out_species_unit = ['PEC', 'POA', 'PMFINE', 'PNO3', 'PSO4', 'PMC']
 
+@profiled('height')
 def run(year, month, dir_in, dir_out, model_grid, sectors, z, z_file):
     """
     Allocate data to different heights.
@@ -37,6 +38,7 @@ def run(year, month, dir_in, dir_out, model_grid, sectors, z, z_file):
         dimvars = []
         if os.path.exists(fn):
             f = dataset.addfile(fn)
+            add_io(read=os.path.getsize(fn))
             for var in f.varnames:
                 if var == 'lat' or var == 'lon':
                     continue
@@ -83,6 +85,7 @@ def run(year, month, dir_in, dir_out, model_grid, sectors, z, z_file):
                     data[data == np.nan] = 0
                 ncfile.write(var, data)
             ncfile.close()
+            add_io(written=os.path.getsize(out_fn))
             f.close()
         else:
             print('File not exist: {}'.format(fn))
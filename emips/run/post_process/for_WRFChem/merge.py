@@ -3,9 +3,11 @@ from collections import OrderedDict
 from mipylib import dataset
 import mipylib.numeric as np
 import os
+from emips.utils import profiled, add_io
 
 out_species_aer = ['PEC', 'POA', 'PMFINE', 'PNO3', 'PSO4', 'PMC']
 
+@profiled('merge')
 def run(year, month, dir_in, dir_out, model_grid, sectors, z):
     """
     Combine all sectors into one file
@@ -34,6 +36,7 @@ def run(year, month, dir_in, dir_out, model_grid, sectors, z):
         if os.path.exists(fn):
             print(fn)
             f = dataset.addfile(fn)
+            add_io(read=os.path.getsize(fn))
             for var in f.variables:
                 if var.ndim == 4:
                     if dict_spec.has_key(var.name):
@@ -88,5 +91,6 @@ def run(year, month, dir_in, dir_out, model_grid, sectors, z):
             f.close()
         ncfile.write(sname, spec_data)
     ncfile.close()
+    add_io(written=os.path.getsize(out_fn))
     print('Merge data finished!')
     
\ No newline at end of file
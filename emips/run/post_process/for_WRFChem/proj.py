@@ -1,9 +1,13 @@
-from emips.spatial_alloc import GridDesc, transform
+from emips.spatial_alloc import GridDesc, get_regridder
 from collections import OrderedDict
 from mipylib import dataset
 import mipylib.numeric as np
+import os
+from emips.utils import profiled, add_io
 
-def run(year, month, dir_inter, model_grid, target_grid, out_species, out_species_aer, global_attributes, mechanism_name, z):
+@profiled('proj')
+def run(year, month, dir_inter, model_grid, target_grid, out_species, out_species_aer, global_attributes, mechanism_name, z,
+        cache_dir=None, domain='d01'):
     """
     Write Times variable, add global attributes, convert data's projection.
 	io_style_emissions = 2
@@ -18,11 +22,14 @@ def run(year, month, dir_inter, model_grid, target_grid, out_species, out_specie
     :param global_attributes: (*OrderedDict*) The global attributes of the output file.
     :param mechanism_name: (*string*) The name of the chemical mechanism.
     :param z: (*int*) The zdim of the output data.
+    :param cache_dir: (*string*) The directory to save and load the reprojection weights. Default is `None`.
+    :param domain: (*string*) The domain name of the output files. Default is `d01`.
     """
     print('Add input file...')
     fn_in = dir_inter + '\emis_{}_{}_hour_transform.nc'.format(year, month)
     print(fn_in)
     f_in = dataset.addfile(fn_in)
+    add_io(read=os.path.getsize(fn_in))
     #set dimension 
     tdim = np.dimension(np.arange(24), 'Time')
     ydim = np.dimension(target_grid.y_coord, 'south_north', 'Y')
@@ -32,7 +39,7 @@ def run(year, month, dir_inter, model_grid, target_grid, out_species, out_specie
     dims = [tdim, zdim, ydim, xdim]
     all_dims = [tdim, sdim, xdim, ydim, zdim]
 
-    fn_out = dir_inter + '\wrfchemi_d01_{}_{:0>2d}_{}'.format(year, month, mechanism_name)
+    fn_out = dir_inter + '\wrfchemi_{}_{}_{:0>2d}_{}'.format(domain, year, month, mechanism_name)
     
     #set variables
     dimvars = []
@@ -78,6 +85,9 @@ def run(year, month, dir_inter, model_grid, target_grid, out_species, out_specie
     s_out = np.array(s_out, dtype=np.dtype.char)
     ncfile.write('Times', s_out)
     
+    #Reprojection weights, computed once for the domain
+    regridder = get_regridder(model_grid, target_grid, 'reproject', cache_dir)
+
     print('Write variable data except times...')
     for out_specie in out_species:
         data = np.zeros((tdim.length, zdim.length, ydim.length, xdim.length))
@@ -85,11 +95,12 @@ def run(year, month, dir_inter, model_grid, target_grid, out_species, out_specie
             print(out_specie)
             dd = f_in[out_specie][:]
             #Conversion proj
-            dd = transform(dd, model_grid, target_grid)
+            dd = regridder(dd)
             #Set default values
             dd[dd==np.nan] = 0
             data[:, :, :, :] = dd
             ncfile.write(out_specie, data)
     f_in.close()
     ncfile.close()
+    add_io(written=os.path.getsize(fn_out))
     print('Convert projection finished!')
@@ -1,10 +1,13 @@
-from emips.spatial_alloc import GridDesc, transform
+from emips.spatial_alloc import GridDesc, get_regridder
 from collections import OrderedDict
 from mipylib import dataset
 import mipylib.numeric as np
 import os
+from emips.utils import profiled, add_io
 
-def run(year, month, dir_in, dir_out, model_grid, target_grid, out_species, out_species_aer, global_attributes, mechanism_name, z):
+@profiled('proj')
+def run(year, month, dir_in, dir_out, model_grid, target_grid, out_species, out_species_aer, global_attributes, mechanism_name, z,
+        cache_dir=None, domain='d01'):
     """
     Write Times variable, add global attributes, convert data's projection.
 	io_style_emissions = 1
@@ -19,11 +22,14 @@ def run(year, month, dir_in, dir_out, model_grid, target_grid, out_species, out_
     :param global_attributes: (*OrderedDict*) The global attributes of the output file.
     :param mechanism_name: (*string*) The name of the chemical mechanism.
     :param z: (*int*) The zdim of the output data.
+    :param cache_dir: (*string*) The directory to save and load the reprojection weights. Default is `None`.
+    :param domain: (*string*) The domain name of the output files. Default is `d01`.
     """
     print('Add input file...')
     fn_in = dir_in + '\emis_{}_{}_hour_transform.nc'.format(year, month)
     print(fn_in)
     f_in = dataset.addfile(fn_in)
+    add_io(read=os.path.getsize(fn_in))
     #set dimension 
     tdim = np.dimension(np.arange(12), 'Time')
     ydim = np.dimension(target_grid.y_coord, 'south_north', 'Y')
@@ -61,8 +67,11 @@ def run(year, month, dir_in, dir_out, model_grid, target_grid, out_species, out_
         dimvar.addattr('coordinates', "XLONG XLAT XTIME")
         #dimvar.addattr('_ChunkSizes', [1, 3, 137, 167])
         dimvars.append(dimvar)
-    for num in [0, 12]:   
-        fn_out = os.path.join(dir_out, 'wrfchemi_{:0>2d}z_d01_{}'.format(num, mechanism_name))
+    #Create output files and write Times variable
+    ncfiles = []
+    fn_outs = []
+    for num in [0, 12]:
+        fn_out = os.path.join(dir_out, 'wrfchemi_{:0>2d}z_{}_{}'.format(num, domain, mechanism_name))
 
         print('Create output data file...')
         print(fn_out)
@@ -78,33 +87,29 @@ def run(year, month, dir_in, dir_out, model_grid, target_grid, out_species, out_
             s_out.append(s)
         s_out = np.array(s_out, dtype=np.dtype.char)
         ncfile.write('Times', s_out)
-        
-        print('Write variable data except times...')
-        for out_specie in out_species:
-            data = np.zeros((tdim.length, zdim.length, ydim.length, xdim.length))
-            if out_specie in f_in.varnames:
-                print(out_specie)
-                dd = f_in[out_specie][num:num+12]
-                #Conversion
-                dd = transform(dd, model_grid, target_grid)
-                #Set the fourth dimension 
-                #dd = dd.reshape(12, 1, ydim.length, xdim.length)
-                #Set default values
-                dd[dd==np.nan] = 0
-            else:
-                print('{} no data!'.format(out_specie))
-                '''
-                dd = f_in['E_ISO'][num:num+12]
-                dd[:, :, :, :] = 0
-                dd = transform(dd, model_grid, target_grid)
-                #Set the fourth dimension 
-                #dd = dd.reshape(12, 1, ydim.length, xdim.length)
-                #Set default values
-                dd[dd==np.nan] = 0
-                '''
-            data[:, :, :, :] = dd
-            ncfile.write(out_specie, data)
+        ncfiles.append((num, ncfile))
+        fn_outs.append(fn_out)
+
+    #Reprojection weights, computed once for the domain
+    regridder = get_regridder(model_grid, target_grid, 'reproject', cache_dir)
+
+    print('Write variable data except times...')
+    for out_specie in out_species:
+        if out_specie in f_in.varnames:
+            print(out_specie)
+            dd = f_in[out_specie][:]
+            #Conversion of all hours and layers
+            dd = regridder(dd)
+            #Set default values
+            dd[dd==np.nan] = 0
+        else:
+            print('{} no data!'.format(out_specie))
+            dd = np.zeros((24, zdim.length, ydim.length, xdim.length))
+        for num, ncfile in ncfiles:
+            ncfile.write(out_specie, dd[num:num+12])
+    for num, ncfile in ncfiles:
         ncfile.close()
+    add_io(written=sum([os.path.getsize(fn_out) for fn_out in fn_outs]))
     f_in.close()
     print('Convert projection finished and split into two files finished!')
     
\ No newline at end of file
@@ -0,0 +1,169 @@
+from emips.spatial_alloc import get_regridder
+from emips.utils import emis_util, profiled, add_io
+from emips import vertical_alloc
+from collections import OrderedDict
+from mipylib import dataset
+import mipylib.numeric as np
+import os
+from transform import get_species_table
+
+
+@profiled('single_pass')
+def run(year, month, dir_in, dir_out, model_grid, target_grid, sectors, out_species, out_species_aer,
+        global_attributes, mechanism_name, z, z_file, cache_dir=None, domain='d01'):
+    """
+    Height allocation, merge sectors, distribution of particulate matter, unit conversion and
+    projection conversion in one pass. The species are processed one by one from the sector
+    emission files to the two output files (io_style_emissions = 1) without the intermediate
+    files. The sectors with same vertical profile are merged before the projection conversion,
+    and each layer is written to the output files separately.
+
+    :param year: (*int*) Year.
+    :param month: (*int*) Month.
+    :param dir_in: (*string*) The directory where the sector emission files are stored.
+    :param dir_out: (*string*) The directory of the output files.
+    :param model_grid: (*GridDesc*) Model data grid describe.
+    :param target_grid: (*GridDesc*) Target data grid describe.
+    :param sectors: (*list*) Sectors that need to be processed.
+    :param out_species: (*list*) The name of the output species(gases and aerosol).
+    :param out_species_aer: (*list*) The name of the output species(aerosol).
+    :param global_attributes: (*OrderedDict*) The global attributes of the output file.
+    :param mechanism_name: (*string*) The name of the chemical mechanism.
+    :param z: (*int*) The zdim of the output data.
+    :param z_file: (*string*) The path of the vertical allocate file.
+    :param cache_dir: (*string*) The directory to save and load the reprojection weights. Default is `None`.
+    :param domain: (*string*) The domain name of the output files. Default is `d01`.
+    """
+    # Open sector files and get layer ratios of the sectors
+    print('Add sector files...')
+    sector_files = []
+    varnames = set()
+    for sector in sectors:
+        fn = os.path.join(dir_in, 'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+        if not os.path.exists(fn):
+            print('File not exist: {}'.format(fn))
+            continue
+        print(fn)
+        f = dataset.addfile(fn)
+        add_io(read=os.path.getsize(fn))
+        vertical_pro = vertical_alloc.read_file(z_file, emis_util.get_scc(sector))
+        ratios = vertical_pro.get_ratios().tolist()
+        if round(ratios[0], 2) == 1.0:
+            # Do not need to be allocated
+            ratios = [1.] + [0.] * (z - 1)
+        ratios = tuple(ratios[:z]) + (0.,) * (z - len(ratios))
+        sector_files.append((f, ratios))
+        varnames.update(f.varnames)
+
+    # Output species by source species
+    sources = get_species_table(out_species, varnames, mechanism_name)
+
+    # Set dimensions
+    tdim = np.dimension(np.arange(12), 'Time')
+    ydim = np.dimension(target_grid.y_coord, 'south_north', 'Y')
+    xdim = np.dimension(target_grid.x_coord, 'west_east', 'X')
+    zdim = np.dimension(np.arange(z), 'emissions_zdim')
+    sdim = np.dimension(np.arange(19), 'DateStrLen')
+    dims = [tdim, zdim, ydim, xdim]
+    all_dims = [tdim, sdim, xdim, ydim, zdim]
+
+    # Set variables
+    dimvars = []
+    dimvar = dataset.DimVariable()
+    dimvar.name = 'Times'
+    dimvar.dtype = np.dtype.char
+    dimvar.dims = [tdim, sdim]
+    dimvars.append(dimvar)
+    for out_specie in out_species:
+        dimvar = dataset.DimVariable()
+        dimvar.name = out_specie
+        dimvar.dtype = np.dtype.float
+        dimvar.dims = dims
+        dimvar.addattr('FieldType', 104)
+        dimvar.addattr('MemoryOrder', "XYZ")
+        dimvar.addattr('description', "EMISSION_{}".format(out_specie[2:]))
+        if out_specie in out_species_aer:
+            #g/m2/s to ug/m^3 m/s
+            dimvar.addattr('units', 'ug/m3 m/s')
+        else:
+            #mole/m2/s to mol/km^2/hr
+            dimvar.addattr('units', 'mol km^-2 hr^-1')
+        dimvar.addattr('stagger', "")
+        dimvar.addattr('coordinates', "XLONG XLAT XTIME")
+        dimvars.append(dimvar)
+
+    # Create output files and write Times variable
+    ncfiles = []
+    fn_outs = []
+    for num in [0, 12]:
+        fn_out = os.path.join(dir_out, 'wrfchemi_{:0>2d}z_{}_{}'.format(num, domain, mechanism_name))
+        print('Create output data file: {}'.format(fn_out))
+        ncfile = dataset.addfile(fn_out, 'c', largefile=True)
+        ncfile.nc_define(all_dims, global_attributes, dimvars, write_dimvars=False)
+        s_out = []
+        for i in range(num, num + 12):
+            s_out.append('{}-{:0>2d}-01_{:0>2d}:00:00'.format(year, month, i))
+        ncfile.write('Times', np.array(s_out, dtype=np.dtype.char))
+        ncfiles.append((num, ncfile))
+        fn_outs.append(fn_out)
+
+    # Reprojection weights, computed once for the domain
+    regridder = get_regridder(model_grid, target_grid, 'reproject', cache_dir)
+
+    # Process species one by one
+    print('Write variable data...')
+    layer_shape = (tdim.length, 1, ydim.length, xdim.length)
+    zeros = np.zeros(layer_shape)
+    for source, outs in sources.iteritems():
+        if source is None:
+            for out_specie, factor in outs:
+                print('{} no data!'.format(out_specie))
+                for num, ncfile in ncfiles:
+                    for lay in range(z):
+                        ncfile.write(out_specie, zeros, origin=[0, lay, 0, 0])
+            continue
+
+        print(source)
+        # Merge sectors with same vertical profile
+        profiles = OrderedDict()
+        for f, ratios in sector_files:
+            if source not in f.varnames:
+                continue
+            data = f[source][:]
+            data[data == np.nan] = 0
+            if ratios in profiles:
+                profiles[ratios] += data
+            else:
+                profiles[ratios] = data
+
+        # Projection conversion of the merged data
+        target_data = []
+        for ratios, data in profiles.iteritems():
+            data = regridder(data)
+            data[data == np.nan] = 0
+            target_data.append((ratios, data))
+
+        # Allocate to layers, distribute, change unit and write
+        for lay in range(z):
+            layer_data = None
+            for ratios, data in target_data:
+                if ratios[lay] == 0:
+                    continue
+                if layer_data is None:
+                    layer_data = data * ratios[lay]
+                else:
+                    layer_data += data * ratios[lay]
+            for out_specie, factor in outs:
+                for num, ncfile in ncfiles:
+                    if layer_data is None:
+                        ncfile.write(out_specie, zeros, origin=[0, lay, 0, 0])
+                    else:
+                        dd = layer_data[num:num + 12] * factor
+                        ncfile.write(out_specie, dd.reshape(*layer_shape), origin=[0, lay, 0, 0])
+
+    for num, ncfile in ncfiles:
+        ncfile.close()
+    add_io(written=sum([os.path.getsize(fn_out) for fn_out in fn_outs]))
+    for f, ratios in sector_files:
+        f.close()
+    print('Single pass post process finished!')
@@ -3,8 +3,67 @@ from collections import OrderedDict
 from mipylib import dataset
 import mipylib.numeric as np
 import os
+from emips.utils import profiled, add_io
+from emips.chem_spec import get_wrfchem_mechanism_name
 
-def run(year, month, dir_in, dir_out, model_grid, out_species, out_species_aer, z):
+# Unit conversion factors: mole/m2/s to mol/km^2/hr for gases, g/m2/s to ug/m^3 m/s for aerosols
+gas_factor = 3600 * 1e6
+aerosol_factor = 1e6
+
+# Aerosol split of I (Aitken) and J (accumulation) modes: source species -> [(species, ratio)]
+aerosol_split = [('PMFINE', [('PM25I', 0.2), ('PM25J', 0.8)]),
+                 ('PEC', [('ECI', 0.2), ('ECJ', 0.8)]),
+                 ('POA', [('ORGI', 0.2), ('ORGJ', 0.8)]),
+                 ('PSO4', [('SO4I', 0.2), ('SO4J', 0.8)]),
+                 ('PNO3', [('NO3I', 0.2), ('NO3J', 0.8)])]
+
+# Aerosol tables of the chemical mechanisms
+aerosol_tables = {'radm2': OrderedDict(aerosol_split + [('PMC', [('PM_10', 1.)])]),
+                  'mozart': OrderedDict(aerosol_split + [('PMC', [('PM_10', 1.)])]),
+                  'saprc99': OrderedDict(aerosol_split + [('PMC', [('PM10', 1.)])]),
+                  'cb05': OrderedDict(aerosol_split + [('PMC', [('PM10', 1.)])])}
+
+
+def get_species_table(out_species, varnames, mechanism_name=None):
+    """
+    Get the mapping table from source species to output species. The gas species in the input
+    data are converted with the gas unit factor, and the aerosol species are split from the
+    source species by the aerosol table of the chemical mechanism. The factors include the
+    split ratios and the unit conversion.
+
+    :param out_species: (*list*) The name of the output species(gases and aerosol).
+    :param varnames: (*list*) The species names of the input data.
+    :param mechanism_name: (*string*) The name of the chemical mechanism, such as `CB05_wrfchem`.
+        Default is `None`, for `None` or other mechanisms both `PM10` and `PM_10` are split from
+        `PMC`.
+
+    :return: (*OrderedDict*) Output species and factor list by source species. The output
+        species without data are keyed by `None`.
+    """
+    aerosol_table = None if mechanism_name is None else aerosol_tables.get(
+        get_wrfchem_mechanism_name(mechanism_name))
+    if aerosol_table is None:
+        aerosol_table = OrderedDict(aerosol_split + [('PMC', [('PM_10', 1.), ('PM10', 1.)])])
+    aerosol_sources = {}
+    for source, species in aerosol_table.iteritems():
+        for sname, ratio in species:
+            aerosol_sources[sname] = (source, ratio)
+
+    table = OrderedDict()
+    for name in out_species:
+        sname = name[2:]
+        if sname in varnames:
+            table.setdefault(sname, []).append((name, gas_factor))
+        elif sname in aerosol_sources and aerosol_sources[sname][0] in varnames:
+            source, ratio = aerosol_sources[sname]
+            table.setdefault(source, []).append((name, aerosol_factor * ratio))
+        else:
+            table.setdefault(None, []).append((name, 0))
+    return table
+
+
+@profiled('transform')
+def run(year, month, dir_in, dir_out, model_grid, out_species, out_species_aer, z, mechanism_name=None):
     """
     Distribution of particulate matter and change unit.
 
@@ -15,10 +74,12 @@ def run(year, month, dir_in, dir_out, model_grid, out_species, out_species_aer,
     :param out_species: (*list*) The name of the output species(gases and aerosol).
     :param out_species_aer: (*list*) The name of the output species(aerosol).
     :param z: (*int*) The zdim of the output data.
+    :param mechanism_name: (*string*) The name of the chemical mechanism. Default is `None`.
     """
     print('Add input file...')
     fn_in = dir_in + '\emis_{}_{}_hour.nc'.format(year, month)
     f_in = dataset.addfile(fn_in)
+    add_io(read=os.path.getsize(fn_in))
     
     #Set dimension
     print('Define dimensions and global attributes...')
@@ -59,66 +120,18 @@ def run(year, month, dir_in, dir_out, model_grid, out_species, out_species_aer,
     
     #add data to ncfile
     print('Process data and write to file...')
-    for name in out_species:
-        data = np.zeros((tdim.length, z, ydim.length, xdim.length))
-        sname = name[2:]
-        print(sname)
-        if sname in f_in.varnames:
-            data = f_in[sname][:, :, :]
-            data = data * 3600 * 1e6
-            ncfile.write(name, data)
-        elif sname == 'PM25I':
-            data = f_in['PMFINE'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.2)
-        elif sname == 'PM25J':
-            data = f_in['PMFINE'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.8)
-        ##radm2, mozart
-        elif sname == 'PM_10' :
-            data = f_in['PMC'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data)          
-        #saprc99, cb05
-        elif sname == 'PM10' :
-            data = f_in['PMC'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data)
-        elif sname == 'ECI':
-            data = f_in['PEC'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.2)
-        elif sname == 'ECJ':
-            data = f_in['PEC'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.8)
-        elif sname == 'ORGI':
-            data = f_in['POA'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.2)
-        elif sname == 'ORGJ':
-            data = f_in['POA'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.8)
-        elif sname == 'SO4I':
-            data = f_in['PSO4'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.2)
-        elif sname == 'SO4J':
-            data = f_in['PSO4'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.8)
-        elif sname == 'NO3I':
-            data = f_in['PNO3'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.2)
-        elif sname == 'NO3J':
-            data = f_in['PNO3'][:, :, :]
-            data = data * 1e6
-            ncfile.write(name, data*0.8)
+    # Each source species is read once and all derived species are written
+    table = get_species_table(out_species, f_in.varnames, mechanism_name)
+    for source, species in table.iteritems():
+        if source is None:
+            data = np.zeros((tdim.length, z, ydim.length, xdim.length))
         else:
-            ncfile.write(name, data)
+            print(source)
+            data = f_in[source][:, :, :]
+        for name, factor in species:
+            print(name[2:])
+            ncfile.write(name, data if source is None else data * factor)
     f_in.close()
     ncfile.close()      
+    add_io(written=os.path.getsize(fn_out))
     print('Distribution of particulate matter and change unit finised!')
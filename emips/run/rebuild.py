@@ -0,0 +1,30 @@
+"""
+# Purpose: Incremental rebuild of the emission processing. The stages whose inputs are not
+#          changed since the last run are skipped, see "manifest.json" in the output directory.
+#          With --resume an interrupted run is continued from the first incomplete stage.
+# Usage: rebuild.py run_config.xml [--dry-run] [--resume] [--workers N]
+"""
+
+import argparse
+
+from emips.gui.configure import RunConfigure
+from emips.run import run_total
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Incremental rebuild of EMIPS emission processing.')
+    parser.add_argument('config', help='The run configure file.')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the stages to be rebuilt.')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of workers.')
+    args = parser.parse_args(args)
+
+    run_config = RunConfigure(args.config)
+    run_config.run_incremental = True
+    if args.resume:
+        run_config.run_resume = True
+    run_total(run_config, workers=args.workers, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -112,7 +112,64 @@ class MyEmissionReader(EmissionReader):
             print('Alarm! Emission data file not exists: {}'.format(fn))
             return None
 
-    def get_emis_grid(self, sector=SectorEnum.INDUSTRY):
+    def read_emis_window(self, sector, pollutant, year, month, window):
+        fn = get_emis_fn(sector, pollutant, year, month)
+        if os.path.exists(fn):
+            print('Emission data file: {}'.format(fn))
+            f = addfile(fn)
+            varnames = self.get_varnames(sector)
+            if len(varnames) == 0:
+                return None
+
+            # Map the window of the lonpivot and grid_expand grid to the rows and columns of
+            # the data file
+            file_grid = self.get_file_grid(sector)
+            ny = file_grid.y_num
+            nx = file_grid.x_num
+            lon = file_grid.get_x_value(0)
+            shift = int(round((lon - file_grid.x_orig) / file_grid.x_cell))
+            x_start, x_end, y_start, y_end = window
+            rows = [min(max(j - 1, 0), ny - 1) for j in range(y_start, y_end)]
+            cols = [(min(max(i - 1, 0), nx - 1) + shift) % nx for i in range(x_start, x_end)]
+            # The columns wrap at most once
+            runs = [[cols[0]]]
+            for c in cols[1:]:
+                if c < runs[-1][-1]:
+                    runs.append([c])
+                else:
+                    runs[-1].append(c)
+
+            r0 = rows[0]
+            r1 = rows[-1] + 1
+            rdata = np.zeros((len(rows), len(cols)))
+            idx = 0
+            for run in runs:
+                c0 = run[0]
+                c1 = run[-1] + 1
+                data = None
+                for vname in varnames:
+                    if sector == SectorEnum.AIR:
+                        dd = f[vname][month - 1, :, r0:r1, c0:c1]
+                        dd = dd.sum(axis=0)
+                    else:
+                        dd = f[vname][month - 1, r0:r1, c0:c1]
+                    if data is None:
+                        data = dd
+                    else:
+                        data = data + dd
+                data = data.take([r - r0 for r in rows], axis=0)
+                data = data.take([c - c0 for c in run], axis=1)
+                rdata[:, idx:idx + len(run)] = data
+                idx += len(run)
+            return rdata
+        else:
+            print('Alarm! Emission data file not exists: {}'.format(fn))
+            return None
+
+    def get_file_grid(self, sector=SectorEnum.INDUSTRY):
+        """
+        Get the grid of the data file before lonpivot and grid_expand.
+        """
         if sector == SectorEnum.AIR:
             emis_grid = GridDesc(geolib.projinfo(), x_orig=-179.75, x_cell=0.5, x_num=720,
                                  y_orig=-89.75, y_cell=0.5, y_num=360)
@@ -125,6 +182,10 @@ class MyEmissionReader(EmissionReader):
         else:
             emis_grid = GridDesc(geolib.projinfo(), x_orig=-179.95, x_cell=0.1, x_num=3600,
                                  y_orig=-89.95, y_cell=0.1, y_num=1800)
+        return emis_grid
+
+    def get_emis_grid(self, sector=SectorEnum.INDUSTRY):
+        emis_grid = self.get_file_grid(sector)
         # lonpivot
         pivot = 0
         lon = emis_grid.get_x_value(pivot)
@@ -150,6 +211,11 @@ def read_emis(sector, pollutant, year, month):
     return _emis_reader.read_emis(sector, pollutant, year, month)
 
 
+def read_emis_bbox(sector, pollutant, year, month, grid):
+    print("sector: {}".format(sector))
+    return _emis_reader.read_emis_bbox(sector, pollutant, year, month, grid)
+
+
 def get_emis_grid(sector):
     return _emis_reader.get_emis_grid(sector)
 
@@ -39,6 +39,22 @@ class MyEmissionReader(EmissionReader):
             print('Alarm! Emission data file not exists: {}'.format(fn))
             return None
 
+    def read_emis_window(self, sector, pollutant, year, month, window):
+        fn = get_emis_fn(sector, pollutant, year, month)
+        if os.path.exists(fn):
+            print('Emission data file: {}'.format(fn))
+            f = addfile(fn)
+            pollutant_name = pollutant.name.lower()
+            if pollutant == PollutantEnum.PM2_5:
+                pollutant_name = 'pm2.5'
+            vname = 'emi_{}'.format(pollutant_name)
+            x_start, x_end, y_start, y_end = window
+            data = f[vname][y_start:y_end, x_start:x_end]
+            return data
+        else:
+            print('Alarm! Emission data file not exists: {}'.format(fn))
+            return None
+
     def get_emis_grid(self, sector=SectorEnum.INDUSTRY):
         return GridDesc(geolib.projinfo(), x_orig=0.05, x_cell=0.1, x_num=3600,
                         y_orig=-89.95, y_cell=0.1, y_num=1800)
@@ -56,6 +72,11 @@ def read_emis(sector, pollutant, year, month):
     return _emis_reader.read_emis(sector, pollutant, year, month)
 
 
+def read_emis_bbox(sector, pollutant, year, month, grid):
+    print("sector: {}".format(sector))
+    return _emis_reader.read_emis_bbox(sector, pollutant, year, month, grid)
+
+
 def get_emis_grid(sector):
     return _emis_reader.get_emis_grid()
 
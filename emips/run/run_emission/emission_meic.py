@@ -49,6 +49,11 @@ def read_emis(sector, pollutant, year, month):
     return _emis_reader.read_emis(sector, pollutant, year, month)
 
 
+def read_emis_bbox(sector, pollutant, year, month, grid):
+    print("sector: {}".format(sector))
+    return _emis_reader.read_emis_bbox(sector, pollutant, year, month, grid)
+
+
 def get_emis_grid(sector):
     return _emis_reader.get_emis_grid()
 
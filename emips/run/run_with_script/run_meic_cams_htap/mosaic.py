@@ -0,0 +1,268 @@
+import os
+import shutil
+import threading
+from mipylib.dataset import DimVariable, addfile
+import mipylib.numeric as np
+from emips.utils import TaskGraph
+
+# Priority maps by (grid key, map name)
+_priority_maps = {}
+_priority_maps_lock = threading.Lock()
+
+
+class PriorityMap(object):
+
+    def __init__(self, index):
+        """
+        Static source priority map of the mosaic.
+        Index 0: MEIC data, 1: CAMS/HTAP data, 2: MEIC data plus CAMS/HTAP data.
+
+        :param index: (*array*) Source index of each grid cell with (ny, nx) shape.
+        """
+        self.index = index
+        self.meic_weight = np.where(index != 1, 1., 0.)
+        self.fill_weight = np.where(index != 0, 1., 0.)
+        self.meic_window = self._window(self.meic_weight)
+        self.fill_window = self._window(self.fill_weight)
+
+    def __str__(self):
+        r = 'PriorityMap: MEIC window: {}; CAMS/HTAP window: {}'.format(self.meic_window, self.fill_window)
+        return r
+
+    __repr__ = __str__
+
+    @staticmethod
+    def _window(weight):
+        """
+        Index window (y_start, y_end, x_start, x_end) of the nonzero weights. `None` if all
+        weights are zero.
+        """
+        rows = [i for i, v in enumerate(weight.sum(axis=1).tolist()) if v > 0]
+        cols = [i for i, v in enumerate(weight.sum(axis=0).tolist()) if v > 0]
+        if len(rows) == 0:
+            return None
+        return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+    def blend(self, varname, f_meic, fill_files, shape):
+        """
+        Blend a variable of the source files in one pass. Only the windows with nonzero
+        weights are read from the source files. The MEIC cells with `nan` data are filled by
+        CAMS/HTAP data of the cells and hours.
+
+        :param varname: (*string*) Variable name.
+        :param f_meic: (*DimDataFile*) MEIC data file.
+        :param fill_files: (*list*) CAMS/HTAP data files, the first file with the variable is used.
+        :param shape: (*tuple*) Output data shape.
+
+        :return: (*array*) The blended data.
+        """
+        data = np.zeros(shape)
+        f_fill = None
+        for f in fill_files:
+            if varname in f.varnames:
+                f_fill = f
+                break
+        if varname not in f_meic.varnames:
+            # Only CAMS/HTAP data in all cells
+            if f_fill is not None:
+                data = f_fill[varname][:]
+            return data
+
+        # The MEIC cells with nan data and not filled by the static map
+        fill_nan = None
+        for f, weight, window in [(f_meic, self.meic_weight, self.meic_window),
+                                  (f_fill, self.fill_weight, self.fill_window)]:
+            if f is None or window is None:
+                continue
+            y0, y1, x0, x1 = window
+            dd = f[varname][:, y0:y1, x0:x1]
+            if dd.contains_nan():
+                if f is f_meic:
+                    fill_nan = np.where(dd == np.nan, 1., 0.) * (1. - self.fill_weight[y0:y1, x0:x1])
+                dd[dd == np.nan] = 0
+            data[:, y0:y1, x0:x1] += dd * weight[y0:y1, x0:x1]
+
+        if fill_nan is not None and f_fill is not None:
+            y0, y1, x0, x1 = self.meic_window
+            dd = f_fill[varname][:, y0:y1, x0:x1]
+            if dd.contains_nan():
+                dd[dd == np.nan] = 0
+            data[:, y0:y1, x0:x1] += dd * fill_nan
+        return data
+
+
+def get_priority_map(model_grid, fn_meic, name='default', extra_mask=None):
+    """
+    Get source priority map of a grid. The MEIC data are used in the cells where MEIC data are
+    valid, and CAMS/HTAP data are used in other cells. The map is computed once from the `nan`
+    cells of any hour and any variable of a reference MEIC data file, and cached by the grid,
+    the map name and the reference file.
+
+    :param model_grid: (*GridDesc*) Model data grid describe.
+    :param fn_meic: (*string*) The reference MEIC data file.
+    :param name: (*string*) Map name. Default is `default`.
+    :param extra_mask: (*function*) Function to get the (ny, nx) mask of the cells where CAMS/HTAP
+        data are added to MEIC data, such as Taiwan area where MEIC data are zero. The function
+        takes the first hour MEIC data as the template. Default is `None`.
+
+    :return: (*PriorityMap*) The priority map.
+    """
+    key = (model_grid.key(), name, os.path.abspath(fn_meic))
+    with _priority_maps_lock:
+        priority_map = _priority_maps.get(key)
+        if priority_map is not None:
+            return priority_map
+
+        print('Priority map reference file: {}'.format(fn_meic))
+        f = addfile(fn_meic)
+        template = None
+        nan_count = None
+        for var in f.variables:
+            if var.ndim == 3:
+                dd = f[var.name][:]
+                if template is None:
+                    template = dd[0]
+                    nan_count = np.zeros(template.shape)
+                nan_count = nan_count + np.where(dd == np.nan, 1., 0.).sum(axis=0)
+        f.close()
+        if template is None:
+            raise ValueError('No 3D variable in the reference MEIC data file: {}'.format(fn_meic))
+        index = np.where(nan_count > 0, 1, 0)
+        if extra_mask is not None:
+            mask = extra_mask(template)
+            index = np.where(mask != 0, np.where(index == 0, 2, index), index)
+        priority_map = PriorityMap(index)
+        print(priority_map)
+        _priority_maps[key] = priority_map
+        return priority_map
+
+
+def merge_sector(fn_meic, fn_cams, fn_htap, fn_out, model_grid, map_name='default', extra_mask=None,
+                 fn_ref=None):
+    """
+    Merge MEIC, CAMS and HTAP emission data of a sector.
+
+    :param fn_meic: (*string*) MEIC data file.
+    :param fn_cams: (*string*) CAMS data file.
+    :param fn_htap: (*string*) HTAP data file.
+    :param fn_out: (*string*) Output data file.
+    :param model_grid: (*GridDesc*) Model data grid describe.
+    :param map_name: (*string*) Priority map name. Default is `default`.
+    :param extra_mask: (*function*) Function to get the (ny, nx) mask of the cells where CAMS/HTAP
+        data are added to MEIC data. Default is `None`.
+    :param fn_ref: (*string*) The reference MEIC data file of the priority map. Default is `None`
+        that the MEIC data file is used.
+    """
+    if os.path.exists(fn_meic) and (not os.path.exists(fn_cams)):
+        shutil.copyfile(fn_meic, fn_out)
+        print('Data from MEIC: {}'.format(fn_out))
+        return
+    elif os.path.exists(fn_cams) and (not os.path.exists(fn_meic)):
+        shutil.copyfile(fn_cams, fn_out)
+        print('Data from CAMS: {}'.format(fn_out))
+        return
+
+    priority_map = get_priority_map(model_grid, fn_ref or fn_meic, map_name, extra_mask)
+
+    #Set dimensions
+    tdim = np.dimension(np.arange(24), 'hour')
+    ydim = np.dimension(model_grid.y_coord, 'lat', 'Y')
+    xdim = np.dimension(model_grid.x_coord, 'lon', 'X')
+    dims = [tdim, ydim, xdim]
+
+    f_meic = addfile(fn_meic)
+    f_cams = addfile(fn_cams)
+    f_htap = addfile(fn_htap) if os.path.exists(fn_htap) else None
+    fill_files = [f_cams] if f_htap is None else [f_cams, f_htap]
+    #Get all variable
+    dimvars = []
+    varnames = []
+    for f in [f_meic, f_htap]:
+        if f is None:
+            continue
+        for var in f.variables:
+            if var.ndim == 3 and (not var.name in varnames):
+                varnames.append(var.name)
+                dimvar = DimVariable()
+                dimvar.name = var.name
+                dimvar.dtype = var.dtype
+                dimvar.dims = dims
+                dimvar.attributes = var.attributes
+                dimvars.append(dimvar)
+    #Create output netcdf file
+    print('Merge: {}'.format(fn_out))
+    gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo')
+    ncfile = addfile(fn_out, 'c', largefile=True)
+    ncfile.nc_define(dims, gattrs, dimvars)
+
+    #Write variable values
+    shape = (tdim.length, ydim.length, xdim.length)
+    for varname in varnames:
+        ncfile.write(varname, priority_map.blend(varname, f_meic, fill_files, shape))
+
+    #Close file
+    for f in [f_meic, f_cams, f_htap]:
+        if f is not None:
+            f.close()
+    ncfile.close()
+
+
+def run(dire, year, months, model_grid, mechanism_name, sectors, map_name='default', extra_mask=None,
+        workers=1, fn_ref=None):
+    """
+    Merge EMIPS output emission data of MEIC CAMS and HTAP data. The sectors and months are
+    merged in parallel with one priority map.
+
+    :param dire: (*string*) The data directory.
+    :param year: (*int*) Year.
+    :param months: (*list*) Months.
+    :param model_grid: (*GridDesc*) Model data grid describe.
+    :param mechanism_name: (*string*) mechanism's name.
+    :param sectors: (*list*) Sectors.
+    :param map_name: (*string*) Priority map name. Default is `default`.
+    :param extra_mask: (*function*) Function to get the (ny, nx) mask of the cells where CAMS/HTAP
+        data are added to MEIC data. Default is `None`.
+    :param workers: (*int*) Number of workers. Default is 1.
+    :param fn_ref: (*string*) The reference MEIC data file of the priority map. Default is `None`
+        that the MEIC data file of the first month and the first sector is used.
+    """
+    #Set directories
+    dir_meic1 = os.path.join(dire, mechanism_name, r'MEIC', str(year))
+    dir_cams1 = os.path.join(dire, mechanism_name, r'CAMS', str(year))
+    dir_htap1 = os.path.join(dire, mechanism_name, r'HTAP\2010')
+    dir_out1 = os.path.join(dire, mechanism_name, r'merge', str(year))
+
+    #Reference MEIC data file of the priority map, chosen before the tasks are scheduled
+    if fn_ref is None:
+        for month in months:
+            for sector in sectors:
+                fn = os.path.join(dir_meic1, '{}{:>02d}'.format(year, month),
+                                  'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+                if os.path.exists(fn):
+                    fn_ref = fn
+                    break
+            if fn_ref is not None:
+                break
+
+    graph = TaskGraph(workers)
+    for month in months:
+        dir_meic = os.path.join(dir_meic1, '{}{:>02d}'.format(year, month))
+        dir_cams = os.path.join(dir_cams1, '{}{:>02d}'.format(year, month))
+        dir_htap = os.path.join(dir_htap1, '{}{:>02d}'.format(2010, month))
+        dir_out = os.path.join(dir_out1, '{}{:>02d}'.format(year, month))
+        if not os.path.exists(dir_out):
+            os.makedirs(dir_out)
+        print('------------------Filepath------------------')
+        print('dir_meic: {}\ndir_cams: {}\ndir_htap: {}\ndir_out: {}'.format(dir_meic, dir_cams, dir_htap, dir_out))
+        for sector in sectors:
+            #MEIC data file
+            fn_meic = os.path.join(dir_meic, 'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+            #CAMS data file
+            fn_cams = os.path.join(dir_cams, 'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+            #HTAP data file
+            fn_htap = os.path.join(dir_htap, 'emis_{}_{}_{}_hour.nc'.format(sector.name, 2010, month))
+            #Output data file
+            fn_out = os.path.join(dir_out, 'emis_{}_{}_{}_hour.nc'.format(sector.name, year, month))
+            graph.add_task('{}_{}'.format(month, sector.name), merge_sector,
+                           args=(fn_meic, fn_cams, fn_htap, fn_out, model_grid, map_name, extra_mask, fn_ref))
+    graph.run()
@@ -43,7 +43,9 @@ total_run_cams.run(dire, year, months, model_grid, mechanism_name, mechanism())
 
 #merge output data
 import merge_meic_cams_htap_tw as merge
-merge.run(dire, year, months, model_grid, mechanism_name)
+#Number of workers to merge the months and sectors in parallel
+workers = 1
+merge.run(dire, year, months, model_grid, mechanism_name, workers=workers)
 
 print('-------------------------------')
 print('-----All process completed!----')
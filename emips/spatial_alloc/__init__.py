@@ -1,4 +1,5 @@
 from .grid_desc import GridDesc
 from .spatial_allocation import transform
+from .regrid import Regridder, get_regridder
 
-__all__ = ['GridDesc', 'transform']
+__all__ = ['GridDesc', 'transform', 'Regridder', 'get_regridder']
@@ -1,6 +1,13 @@
-from mipylib.geolib import projinfo, gridarea
+import math
+import threading
+
+from mipylib.geolib import projinfo, gridarea, project
 import mipylib.numeric as np
 
+# Grid areas by grid key, shared by all grid descriptions with the same key
+_grid_areas = {}
+_grid_areas_lock = threading.Lock()
+
 
 class GridDesc(object):
 
@@ -54,6 +61,25 @@ class GridDesc(object):
 
     __repr__ = __str__
 
+    def key(self):
+        """
+        Get the key of the grid, which is same for the grids with same projection and coordinates.
+        :return: (*tuple*) The key.
+        """
+        return (self.proj.toProj4String().strip(), round(self.__x_orig, 9), round(self.__x_cell, 9),
+                self.__x_num, round(self.__y_orig, 9), round(self.__y_cell, 9), self.__y_num)
+
+    def __eq__(self, other):
+        if not isinstance(other, GridDesc):
+            return False
+        return self.key() == other.key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.key())
+
     @property
     def x_coord(self):
         return self.__x_coord
@@ -126,9 +152,85 @@ class GridDesc(object):
 
     def grid_areas(self):
         """
-        Calculate grid areas
+        Calculate grid areas. The areas are calculated once for a grid key and shared, so the
+        returned array should not be modified.
         :return: (*array*) Grid areas
         """
-        a = gridarea(self.__x_orig, self.__x_cell, self.__x_num, self.__y_orig, self.__y_cell,
-                     self.__y_num, islonlat=self.proj.isLonLat(), allcell=False)
+        key = self.key()
+        with _grid_areas_lock:
+            a = _grid_areas.get(key)
+            if a is None:
+                a = gridarea(self.__x_orig, self.__x_cell, self.__x_num, self.__y_orig, self.__y_cell,
+                             self.__y_num, islonlat=self.proj.isLonLat(), allcell=False)
+                _grid_areas[key] = a
         return a
+
+    def bbox(self, proj=None):
+        """
+        Get the bounding box of the grid cell edges.
+
+        :param proj: (*ProjectionInfo*) The projection of the bounding box. Default is `None`
+            that the projection of the grid is used.
+
+        :return: (*tuple*) xmin, xmax, ymin, ymax.
+        """
+        x_edges = [self.__x_orig + (i - 0.5) * self.__x_cell for i in range(self.__x_num + 1)]
+        y_edges = [self.__y_orig + (i - 0.5) * self.__y_cell for i in range(self.__y_num + 1)]
+        if proj is None or proj == self.proj:
+            return min(x_edges), max(x_edges), min(y_edges), max(y_edges)
+
+        # Project the points along the grid boundary
+        x = x_edges + x_edges + [x_edges[0]] * len(y_edges) + [x_edges[-1]] * len(y_edges)
+        y = [y_edges[0]] * len(x_edges) + [y_edges[-1]] * len(x_edges) + y_edges + y_edges
+        x, y = project(np.array(x), np.array(y), self.proj, proj)
+        return x.min(), x.max(), y.min(), y.max()
+
+    def window(self, grid, halo=2):
+        """
+        Get the index window of this grid which intersects with another grid.
+
+        :param grid: (*GridDesc*) The other grid, such as the model grid.
+        :param halo: (*int*) The number of extra cells around the intersection. Default is 2.
+
+        :return: (*tuple*) x_start, x_end, y_start, y_end indices (end exclusive). `None` if
+            the grids are not intersected.
+        """
+        xmin, xmax, ymin, ymax = grid.bbox(self.proj)
+        west = self.__x_orig - 0.5 * self.__x_cell
+        south = self.__y_orig - 0.5 * self.__y_cell
+        x_start = 0
+        x_end = self.__x_num
+        full_x = False
+        if self.proj.isLonLat():
+            # Shift the longitudes to the longitude range of this grid
+            while xmin < west:
+                xmin += 360
+                xmax += 360
+            while xmin >= west + 360:
+                xmin -= 360
+                xmax -= 360
+            # Crossing the longitude range seam
+            full_x = xmax > west + self.__x_num * self.__x_cell
+        if not full_x:
+            x_start = max(int(math.floor((xmin - west) / self.__x_cell)) - halo, 0)
+            x_end = min(int(math.ceil((xmax - west) / self.__x_cell)) + halo, self.__x_num)
+        y_start = max(int(math.floor((ymin - south) / self.__y_cell)) - halo, 0)
+        y_end = min(int(math.ceil((ymax - south) / self.__y_cell)) + halo, self.__y_num)
+        if x_start >= x_end or y_start >= y_end:
+            return None
+        return x_start, x_end, y_start, y_end
+
+    def subgrid(self, x_start, x_end, y_start, y_end):
+        """
+        Get sub grid by index window.
+
+        :param x_start: (*int*) Start x index.
+        :param x_end: (*int*) End x index (exclusive).
+        :param y_start: (*int*) Start y index.
+        :param y_end: (*int*) End y index (exclusive).
+
+        :return: (*GridDesc*) The sub grid.
+        """
+        return GridDesc(self.proj, x_orig=self.__x_orig + x_start * self.__x_cell, x_cell=self.__x_cell,
+                        x_num=x_end - x_start, y_orig=self.__y_orig + y_start * self.__y_cell,
+                        y_cell=self.__y_cell, y_num=y_end - y_start)
@@ -0,0 +1,580 @@
+import bisect
+import hashlib
+import math
+import os
+import threading
+
+from mipylib import dataset
+from mipylib import geolib
+import mipylib.numeric as np
+
+__all__ = ['Regridder', 'get_regridder']
+
+# Regridders by (source grid, destination grid, method)
+_regridders = {}
+_regridders_lock = threading.Lock()
+_regridder_locks = {}
+
+# Version of the regrid weights file, the cached files of other versions are not used
+WEIGHTS_VERSION = 3
+
+# Earth radius (m) to calculate cell areas of longitude/latitude grid
+EARTH_RADIUS = 6371000.
+
+
+def _attr_str(f, key):
+    v = f.attrvalue(key)
+    if isinstance(v, basestring):
+        return v
+    return str(v[0])
+
+
+def _auto_method(source_grid, dest_grid, method):
+    if method == 'conservative':
+        return method
+    if source_grid.proj != dest_grid.proj:
+        return 'reproject'
+    if method == 'auto':
+        method = 'interp' if source_grid.x_cell >= dest_grid.x_cell else 'inside'
+    return method
+
+
+def _linear_1d(orig, cell, num, v):
+    """
+    Get the left index and weight of the right point for linear interpolation.
+    """
+    p = (v - orig) / cell
+    eps = 1e-6
+    if p < -eps or p > num - 1 + eps:
+        return None
+    p = min(max(p, 0.), num - 1.)
+    i0 = min(int(math.floor(p)), num - 2)
+    return i0, p - i0
+
+
+def _inside_1d(coord, orig, cell, num):
+    """
+    Group the coordinate indices by the destination cells they are located in.
+    """
+    groups = [[] for i in range(num)]
+    for i, v in enumerate(coord):
+        j = int(math.floor((float(v) - orig) / cell + 0.5))
+        if 0 <= j < num:
+            groups[j].append(i)
+    return groups
+
+
+def _cell_edges(orig, cell, num):
+    return [orig + (i - 0.5) * cell for i in range(num + 1)]
+
+
+def _metric_x(v, lonlat):
+    """
+    X coordinate in equal area space. Longitude is converted to radians.
+    """
+    return math.radians(v) if lonlat else v
+
+
+def _metric_y(v, lonlat):
+    """
+    Y coordinate in equal area space. Latitude is converted to sine of latitude, so the area of
+    longitude/latitude cells is proportional to the area in this space.
+    """
+    return math.sin(math.radians(min(max(v, -90.), 90.))) if lonlat else v
+
+
+def _metric_edges(grid):
+    lonlat = grid.proj.isLonLat()
+    xe = [_metric_x(v, lonlat) for v in _cell_edges(grid.x_orig, grid.x_cell, grid.x_num)]
+    ye = [_metric_y(v, lonlat) for v in _cell_edges(grid.y_orig, grid.y_cell, grid.y_num)]
+    return xe, ye
+
+
+def _cell_areas(grid):
+    """
+    Cell areas of a grid. The areas are in m2 for longitude/latitude grid, otherwise in the
+    square of projection units.
+    """
+    xe, ye = _metric_edges(grid)
+    ratio = EARTH_RADIUS ** 2 if grid.proj.isLonLat() else 1.
+    dx = np.array([abs(xe[i + 1] - xe[i]) for i in range(grid.x_num)])
+    dy = np.array([abs(ye[i + 1] - ye[i]) * ratio for i in range(grid.y_num)])
+    return dy.reshape(grid.y_num, 1) * dx.reshape(1, grid.x_num)
+
+
+def _overlap_1d(src_edges, dest_edges):
+    """
+    Get the overlapped (source index, length) list of each destination interval. The edges
+    are ascending.
+    """
+    n = len(src_edges) - 1
+    res = []
+    for j in range(len(dest_edges) - 1):
+        a = dest_edges[j]
+        b = dest_edges[j + 1]
+        row = []
+        i = max(bisect.bisect_right(src_edges, a) - 1, 0)
+        while i < n and src_edges[i] < b:
+            o = min(b, src_edges[i + 1]) - max(a, src_edges[i])
+            if o > 0:
+                row.append((i, o))
+            i += 1
+        res.append(row)
+    return res
+
+
+def _polygon_area(poly):
+    a = 0.
+    n = len(poly)
+    for i in range(n):
+        x0, y0 = poly[i]
+        x1, y1 = poly[(i + 1) % n]
+        a += x0 * y1 - x1 * y0
+    return abs(a) / 2.
+
+
+def _clip_polygon(poly, xmin, xmax, ymin, ymax):
+    """
+    Clip a polygon by a rectangle (Sutherland-Hodgman).
+    """
+    for axis, value, keep_greater in ((0, xmin, True), (0, xmax, False), (1, ymin, True),
+                                      (1, ymax, False)):
+        if len(poly) == 0:
+            break
+        inside = (lambda p: p[axis] >= value) if keep_greater else (lambda p: p[axis] <= value)
+        out = []
+        prev = poly[-1]
+        for cur in poly:
+            if inside(cur):
+                if not inside(prev):
+                    out.append(_intersect(prev, cur, axis, value))
+                out.append(cur)
+            elif inside(prev):
+                out.append(_intersect(prev, cur, axis, value))
+            prev = cur
+        poly = out
+    return poly
+
+
+def _intersect(p0, p1, axis, value):
+    t = (value - p0[axis]) / (p1[axis] - p0[axis])
+    return p0[0] + t * (p1[0] - p0[0]), p0[1] + t * (p1[1] - p0[1])
+
+
+class Regridder(object):
+
+    def __init__(self, source_grid, dest_grid, method='auto', indices=None, weights=None, coverage=None):
+        """
+        Regridder with precomputed sparse weights from source grid to destination grid.
+
+        The weights are stored as a sparse matrix in ELLPACK form: each destination cell has
+        `k` (source index, weight) pairs, so regridding is one sparse matrix product which can be
+        applied to 2D arrays and stacked 3D/4D arrays. The destination cells without source data
+        have a `nan` weight.
+
+        :param source_grid: (*GridDesc*) Source grid.
+        :param dest_grid: (*GridDesc*) Destination grid.
+        :param method: (*str*) Grid data assign method [auto | interp | inside | reproject |
+            conservative]. Default is `auto` that same as `transform` function.
+        :param indices: (*array*) Precomputed source indices with shape of (k, dest cell number).
+            Default is `None` that the weights are computed.
+        :param weights: (*array*) Precomputed weights with shape of (k, dest cell number).
+        :param coverage: (*array*) Precomputed coverage fractions of the source cells for
+            `conservative` method, with shape of source grid. Default is `None`.
+        """
+        self.source_grid = source_grid
+        self.dest_grid = dest_grid
+        self.method = _auto_method(source_grid, dest_grid, method)
+        self._coverage = coverage
+        self._source_areas = None
+        self._dest_areas = None
+        if indices is None:
+            self.indices, self.weights = self._compute_weights()
+        else:
+            self.indices = indices
+            self.weights = weights
+
+    def __str__(self):
+        r = 'Regridder: {}'.format(self.method)
+        r += '\nSource grid: {} x {}'.format(self.source_grid.y_num, self.source_grid.x_num)
+        r += '\nDestination grid: {} x {}'.format(self.dest_grid.y_num, self.dest_grid.x_num)
+        r += '\nWeights per cell: {}'.format(self.nweight)
+        return r
+
+    __repr__ = __str__
+
+    @property
+    def nweight(self):
+        """
+        Number of weights per destination cell.
+        """
+        return self.indices.shape[0]
+
+    def _compute_weights(self):
+        print('Compute regrid weights ({})...'.format(self.method))
+        if self.method == 'interp':
+            rows = self._interp_rows()
+        elif self.method == 'inside':
+            rows = self._inside_rows()
+        elif self.method == 'reproject':
+            rows = self._reproject_rows()
+        elif self.method == 'conservative':
+            if self.source_grid.proj == self.dest_grid.proj:
+                rows = self._conservative_rows()
+            else:
+                rows = self._conservative_proj_rows()
+        else:
+            raise ValueError('Not supported regrid method: {}'.format(self.method))
+        return self._to_ellpack(rows)
+
+    @staticmethod
+    def _to_ellpack(rows):
+        """
+        Convert the (source index, weight) lists of destination cells to padded index and
+        weight arrays. The padded slots of a destination cell use its first source index with
+        zero weight, so a `nan` source value only affects the cells it is regridded to.
+        """
+        k = max(1, max(len(row) for row in rows))
+        indices = [[0] * len(rows) for i in range(k)]
+        weights = [[0.] * len(rows) for i in range(k)]
+        for j, row in enumerate(rows):
+            if len(row) == 0:
+                weights[0][j] = np.nan
+                continue
+            for i in range(k):
+                indices[i][j] = row[0][0]
+            for i, (idx, w) in enumerate(row):
+                indices[i][j] = idx
+                weights[i][j] = w
+        return np.array(indices).astype('int'), np.array(weights)
+
+    def _interp_rows(self):
+        sg = self.source_grid
+        dg = self.dest_grid
+        xs = [_linear_1d(sg.x_orig, sg.x_cell, sg.x_num, float(x)) for x in dg.x_coord]
+        ys = [_linear_1d(sg.y_orig, sg.y_cell, sg.y_num, float(y)) for y in dg.y_coord]
+        rows = []
+        for yi in ys:
+            for xi in xs:
+                if xi is None or yi is None:
+                    rows.append([])
+                else:
+                    rows.append(self._bilinear(xi, yi))
+        return rows
+
+    def _bilinear(self, xi, yi):
+        nx = self.source_grid.x_num
+        i0, fx = xi
+        j0, fy = yi
+        row = []
+        for j, wy in ((j0, 1. - fy), (j0 + 1, fy)):
+            for i, wx in ((i0, 1. - fx), (i0 + 1, fx)):
+                w = wx * wy
+                if w > 0:
+                    row.append((j * nx + i, w))
+        if len(row) == 0:
+            row.append((j0 * nx + i0, 1.))
+        return row
+
+    def _inside_rows(self):
+        sg = self.source_grid
+        dg = self.dest_grid
+        gx = _inside_1d(sg.x_coord, dg.x_orig, dg.x_cell, dg.x_num)
+        gy = _inside_1d(sg.y_coord, dg.y_orig, dg.y_cell, dg.y_num)
+        nx = sg.x_num
+        rows = []
+        for ys in gy:
+            for xs in gx:
+                n = len(xs) * len(ys)
+                rows.append([(j * nx + i, 1. / n) for j in ys for i in xs])
+        return rows
+
+    def _reproject_rows(self):
+        sg = self.source_grid
+        dg = self.dest_grid
+        x, y = np.meshgrid(dg.x_coord, dg.y_coord)
+        x, y = geolib.project(x, y, dg.proj, sg.proj)
+        rows = []
+        for xv, yv in zip(x.flatten(), y.flatten()):
+            xi = _linear_1d(sg.x_orig, sg.x_cell, sg.x_num, float(xv))
+            yi = _linear_1d(sg.y_orig, sg.y_cell, sg.y_num, float(yv))
+            if xi is None or yi is None:
+                rows.append([])
+            else:
+                rows.append(self._bilinear(xi, yi))
+        return rows
+
+    def _conservative_rows(self):
+        """
+        Area overlap weights of the grids with same projection. The overlaps are separable
+        in x and y directions.
+        """
+        sxe, sye = _metric_edges(self.source_grid)
+        dxe, dye = _metric_edges(self.dest_grid)
+        ox = _overlap_1d(sxe, dxe)
+        oy = _overlap_1d(sye, dye)
+        nx = self.source_grid.x_num
+        # The coverage fractions are also separable
+        cx = [0.] * nx
+        for rowx in ox:
+            for ix, wx in rowx:
+                cx[ix] += wx / abs(sxe[ix + 1] - sxe[ix])
+        cy = [0.] * self.source_grid.y_num
+        for rowy in oy:
+            for iy, wy in rowy:
+                cy[iy] += wy / abs(sye[iy + 1] - sye[iy])
+        self._coverage = np.array(cy).reshape(len(cy), 1) * np.array(cx).reshape(1, nx)
+        rows = []
+        for jy, rowy in enumerate(oy):
+            hy = dye[jy + 1] - dye[jy]
+            for jx, rowx in enumerate(ox):
+                area = (dxe[jx + 1] - dxe[jx]) * hy
+                rows.append([(iy * nx + ix, wx * wy / area) for iy, wy in rowy for ix, wx in rowx])
+        return rows
+
+    def _conservative_proj_rows(self):
+        """
+        Area overlap weights of the grids with different projections. The destination cells are
+        projected to source projection as quadrilaterals and clipped by the source cells.
+        """
+        sg = self.source_grid
+        dg = self.dest_grid
+        lonlat = sg.proj.isLonLat()
+        sxe, sye = _metric_edges(sg)
+        x, y = np.meshgrid(_cell_edges(dg.x_orig, dg.x_cell, dg.x_num),
+                           _cell_edges(dg.y_orig, dg.y_cell, dg.y_num))
+        x, y = geolib.project(x, y, dg.proj, sg.proj)
+        west = min(sxe[0], sxe[-1])
+        period = 2 * math.pi
+        xs = []
+        for v in x.flatten():
+            v = _metric_x(float(v), lonlat)
+            if lonlat:
+                while v < west:
+                    v += period
+                while v >= west + period:
+                    v -= period
+            xs.append(v)
+        ys = [_metric_y(float(v), lonlat) for v in y.flatten()]
+
+        nx = sg.x_num
+        ncx = dg.x_num + 1
+        coverage = [0.] * (nx * sg.y_num)
+        rows = []
+        for jy in range(dg.y_num):
+            for jx in range(dg.x_num):
+                corners = (jy * ncx + jx, jy * ncx + jx + 1, (jy + 1) * ncx + jx + 1, (jy + 1) * ncx + jx)
+                quad = [(xs[c], ys[c]) for c in corners]
+                area = _polygon_area(quad)
+                row = []
+                if area > 0:
+                    qx = [p[0] for p in quad]
+                    qy = [p[1] for p in quad]
+                    ix0 = max(bisect.bisect_right(sxe, min(qx)) - 1, 0)
+                    ix1 = min(bisect.bisect_left(sxe, max(qx)), nx)
+                    iy0 = max(bisect.bisect_right(sye, min(qy)) - 1, 0)
+                    iy1 = min(bisect.bisect_left(sye, max(qy)), sg.y_num)
+                    for iy in range(iy0, iy1):
+                        for ix in range(ix0, ix1):
+                            part = _clip_polygon(quad, sxe[ix], sxe[ix + 1], sye[iy], sye[iy + 1])
+                            if len(part) >= 3:
+                                a = _polygon_area(part)
+                                if a > 0:
+                                    row.append((iy * nx + ix, a / area))
+                                    coverage[iy * nx + ix] += a / abs((sxe[ix + 1] - sxe[ix]) *
+                                                                      (sye[iy + 1] - sye[iy]))
+                rows.append(row)
+        self._coverage = np.array(coverage).reshape(sg.y_num, nx)
+        return rows
+
+    @property
+    def source_areas(self):
+        """
+        Cell areas of the source grid, computed once.
+        """
+        if self._source_areas is None:
+            self._source_areas = _cell_areas(self.source_grid)
+        return self._source_areas
+
+    @property
+    def dest_areas(self):
+        """
+        Cell areas of the destination grid, computed once.
+        """
+        if self._dest_areas is None:
+            self._dest_areas = _cell_areas(self.dest_grid)
+        return self._dest_areas
+
+    def source_coverage(self):
+        """
+        Get the fraction of each source cell covered by the destination grid. Only available
+        for `conservative` method. The coverage fractions are accumulated with the overlaps
+        when the weights are computed and saved with the weights.
+
+        :return: (*array*) Coverage fractions with shape of source grid.
+        """
+        if self.method != 'conservative':
+            raise ValueError('Source coverage is only available for conservative method')
+        if self._coverage is None:
+            # Regridder of precomputed weights without coverage
+            self._compute_weights()
+        return self._coverage
+
+    def mass_balance(self, source, dest=None, verbose=True):
+        """
+        Mass balance diagnostics of regridding emission flux data (mass per area).
+
+        :param source: (*array*) Source data array. The leading dimensions are summed.
+        :param dest: (*array*) Regridded destination data array. Default is `None` that the
+            source data is regridded.
+        :param verbose: (*bool*) Print the diagnostics or not. Default is `True`.
+
+        :return: (*dict*) Total mass of source grid, source mass in destination domain, total
+            mass of destination grid and relative error.
+        """
+        if dest is None:
+            dest = self.regrid(source)
+        src = source.copy()
+        src[src == np.nan] = 0
+        dd = dest.copy()
+        dd[dd == np.nan] = 0
+        src_area = self.source_areas
+        source_total = (src * src_area).sum()
+        source_domain = (src * (src_area * self.source_coverage())).sum()
+        dest_total = (dd * self.dest_areas).sum()
+        error = (dest_total - source_domain) / source_domain if source_domain != 0 else 0.
+        r = dict(source_total=source_total, source_domain=source_domain, dest_total=dest_total,
+                 relative_error=error)
+        if verbose:
+            print('Mass balance: source total={:.6g}; source in domain={:.6g}; destination total={:.6g}; '
+                  'relative error={:.3e}'.format(source_total, source_domain, dest_total, error))
+        return r
+
+    def regrid(self, source):
+        """
+        Regrid data from source grid to destination grid.
+
+        :param source: (*array*) Source data array. The last two dimensions are y and x of the
+            source grid.
+
+        :return: (*array*) Destination data array.
+        """
+        shape = list(source.shape)
+        lead = shape[:-2]
+        n = 1
+        for s in lead:
+            n *= s
+        src = source.reshape(n, shape[-2] * shape[-1])
+        dest = None
+        for k in range(self.nweight):
+            dd = np.take(src, self.indices[k], axis=1) * self.weights[k]
+            if dest is None:
+                dest = dd
+            else:
+                dest += dd
+        return dest.reshape(*(lead + [self.dest_grid.y_num, self.dest_grid.x_num]))
+
+    __call__ = regrid
+
+    def save(self, fn):
+        """
+        Save the weights to a netCDF file. The source coverage fractions of `conservative`
+        method are also saved.
+
+        :param fn: (*str*) The file name.
+        """
+        kdim = np.dimension(np.arange(self.nweight), 'weight')
+        cdim = np.dimension(np.arange(self.dest_grid.x_num * self.dest_grid.y_num), 'cell')
+        dims = [kdim, cdim]
+        variables = [('indices', np.dtype.int, dims), ('weights', np.dtype.float, dims)]
+        if self._coverage is not None:
+            ydim = np.dimension(np.arange(self.source_grid.y_num), 'source_y')
+            xdim = np.dimension(np.arange(self.source_grid.x_num), 'source_x')
+            dims = dims + [ydim, xdim]
+            variables.append(('coverage', np.dtype.float, [ydim, xdim]))
+        gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo',
+                      method=self.method, source_grid=str(self.source_grid.key()),
+                      dest_grid=str(self.dest_grid.key()))
+        dimvars = []
+        for name, dtype, vdims in variables:
+            dimvar = dataset.DimVariable()
+            dimvar.name = name
+            dimvar.dtype = dtype
+            dimvar.dims = vdims
+            dimvars.append(dimvar)
+        ncfile = dataset.addfile(fn, 'c')
+        ncfile.nc_define(dims, gattrs, dimvars)
+        ncfile.write('indices', self.indices)
+        ncfile.write('weights', self.weights)
+        if self._coverage is not None:
+            ncfile.write('coverage', self._coverage)
+        ncfile.close()
+
+    @classmethod
+    def load(cls, fn, source_grid, dest_grid):
+        """
+        Load the weights from a netCDF file.
+
+        :param fn: (*str*) The file name.
+        :param source_grid: (*GridDesc*) Source grid.
+        :param dest_grid: (*GridDesc*) Destination grid.
+
+        :return: (*Regridder*) The regridder.
+        """
+        f = dataset.addfile(fn)
+        if _attr_str(f, 'source_grid') != str(source_grid.key()) or \
+                _attr_str(f, 'dest_grid') != str(dest_grid.key()):
+            f.close()
+            raise ValueError('The regrid weights file does not match the grids: {}'.format(fn))
+        method = _attr_str(f, 'method')
+        indices = f['indices'][:].astype('int')
+        weights = f['weights'][:]
+        coverage = f['coverage'][:] if 'coverage' in f.varnames else None
+        f.close()
+        return cls(source_grid, dest_grid, method, indices, weights, coverage)
+
+
+def get_regridder(source_grid, dest_grid, method='auto', cache_dir=None):
+    """
+    Get a regridder. The regridders are cached in memory and optionally in a directory, so the
+    weights are only computed once for a pair of grids.
+
+    :param source_grid: (*GridDesc*) Source grid.
+    :param dest_grid: (*GridDesc*) Destination grid.
+    :param method: (*str*) Grid data assign method [auto | interp | inside | reproject |
+        conservative].
+    :param cache_dir: (*str*) The directory to save and load the weights files. Default is `None`.
+
+    :return: (*Regridder*) The regridder.
+    """
+    method = _auto_method(source_grid, dest_grid, method)
+    key = (source_grid.key(), dest_grid.key(), method)
+    with _regridders_lock:
+        regridder = _regridders.get(key)
+        if regridder is not None:
+            return regridder
+        key_lock = _regridder_locks.setdefault(key, threading.Lock())
+
+    # The weights of different grids can be computed at the same time
+    with key_lock:
+        regridder = _regridders.get(key)
+        if regridder is not None:
+            return regridder
+
+        fn = None
+        if cache_dir is not None:
+            fn = os.path.join(cache_dir, 'regrid_{}_v{}_{}.nc'.format(method, WEIGHTS_VERSION,
+                                                                     hashlib.md5(str(key)).hexdigest()))
+            if os.path.isfile(fn):
+                print('Load regrid weights: {}'.format(fn))
+                regridder = Regridder.load(fn, source_grid, dest_grid)
+        if regridder is None:
+            regridder = Regridder(source_grid, dest_grid, method)
+            if fn is not None:
+                if not os.path.exists(cache_dir):
+                    os.makedirs(cache_dir)
+                print('Save regrid weights: {}'.format(fn))
+                regridder.save(fn)
+        with _regridders_lock:
+            _regridders[key] = regridder
+    return regridder
@@ -11,12 +11,17 @@ def transform(source, source_grid, dest_grid, method='auto'):
     :param source: (*array*) Source data array.
     :param source_grid: (*GridDesc*) Source grid.
     :param dest_grid: (*GridDesc*) Destination grid.
-    :param method: (*str*) Grid data assign method [auto | interp | inside]. Default is `auto`, interpolation
-        method is used when destination grid resolution is higher than source grid, otherwise inside mean method
-        is used.
+    :param method: (*str*) Grid data assign method [auto | interp | inside | conservative]. Default is `auto`,
+        interpolation method is used when destination grid resolution is higher than source grid, otherwise inside
+        mean method is used. `conservative` method assigns the data by the overlapped areas of source and
+        destination cells, so the total emission is conserved.
 
     :return: (*array*) Destination data array.
     """
+    if method == 'conservative':
+        from .regrid import get_regridder
+        return get_regridder(source_grid, dest_grid, method).regrid(source)
+
     if source_grid.proj == dest_grid.proj:
         if method == 'auto':
             method = 'interp' if source_grid.x_cell >= dest_grid.x_cell else 'inside'
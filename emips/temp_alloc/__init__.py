@@ -1,7 +1,9 @@
 from .month_profile import MonthProfile
 from .week_profile import WeekProfile
 from .diurnal_profile import DiurnalProfile
+from .temporal_profile_db import *
 from .temporal_allocation import *
 
 __all__ = ['MonthProfile', 'WeekProfile', 'DiurnalProfile']
+__all__ += temporal_profile_db.__all__
 __all__ += temporal_allocation.__all__
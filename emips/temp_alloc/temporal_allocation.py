@@ -1,156 +1,62 @@
 from .month_profile import MonthProfile
 from .week_profile import WeekProfile
 from .diurnal_profile import DiurnalProfile
-import re
+from .temporal_profile_db import get_temporal_profile_db
 import calendar
 import datetime
 import mipylib.numeric as np
 
 __all__ = ['read_file', 'read_file_prof', 'month_allocation', 'week_allocation', 'diurnal_allocation',
-           'month2hour', 'get_month_days', 'get_weekend_days', 'get_week_days']
+           'month2hour', 'month2timeline', 'get_day_ratio', 'get_timeline_ratios', 'get_month_days',
+           'get_weekend_days', 'get_week_days']
 
 
 def read_file(ref_fn, profile_fn, scc):
     """
-    Read temporal profiles from reference and profile files
+    Read temporal profiles from reference and profile files. The files are parsed once and
+    cached, see `get_temporal_profile_db`.
     :param ref_fn: The reference file
     :param profile_fn: The profile file
     :param scc: Source classific code
     :return: Species profile
     """
-    # Read reference file
-    n = len(scc)
-    month_id = "462"
-    week_id = "8"
-    diurnal_id = "33"
-    ref_f = open(ref_fn)
-    for line in ref_f:
-        line = line.strip()
-        if len(line) < n:
-            continue
-        data = line.split()
-        if data[0] == scc:
-            month_id = data[1]
-            week_id = data[2]
-            diurnal_id = data[3]
-            break
-    ref_f.flush()
-    ref_f.close()
-
-    # Read profile file
-    month_profile = MonthProfile()
-    week_profile = WeekProfile()
-    diurnal_profile = DiurnalProfile()
-    diurnal_profile_weekend = DiurnalProfile()
-    profile_f = open(profile_fn)
-    line = profile_f.readline()
-    while line:
-        line = line.strip()
-        if line == "/MONTHLY/":
-            while True:
-                line = profile_f.readline()
-                if line.strip() == "/END/":
-                    break
-                if line[:5].strip() == month_id:
-                    data = re.findall(r'.{4}', line[5:])
-                    data = data[:12]
-                    month_profile.weights = np.array(data).astype('int')
-                    break
-        if line == "/WEEKLY/":
-            while True:
-                line = profile_f.readline()
-                if line.strip() == "/END/":
-                    break
-                if line[:5].strip() == week_id:
-                    data = re.findall(r'.{4}', line[5:])
-                    data = data[:7]
-                    week_profile.weights = np.array(data).astype('int')
-                    break
-        if line == "/DIURNAL WEEKDAY/":
-            while True:
-                line = profile_f.readline()
-                if line.strip() == "/END/":
-                    break
-                if line[:5].strip() == diurnal_id:
-                    data = re.findall(r'.{4}', line[5:])
-                    data = data[:24]
-                    diurnal_profile.weights = np.array(data).astype('int')
-                    break
-        if line == "/DIURNAL WEEKEND/":
-            while True:
-                line = profile_f.readline()
-                if line.strip() == "/END/":
-                    break
-                if line[:5].strip() == diurnal_id:
-                    data = re.findall(r'.{4}', line[5:])
-                    data = data[:24]
-                    diurnal_profile_weekend.weights = np.array(data).astype('int')
-                    break
-        line = profile_f.readline()
-    profile_f.flush()
-    profile_f.close()
-    return month_profile, week_profile, diurnal_profile, diurnal_profile_weekend
+    db = get_temporal_profile_db(ref_fn, profile_fn)
+    return db.get_profiles(scc)
 
 
 def read_file_prof(profile_fn, scc, ti=0, east=True):
     """
-    Read temporal profiles from profile files
+    Read temporal profiles from profile files. The file is parsed once and cached, see
+    `get_temporal_profile_db`.
     :param profile_fn: The profile file
     :param scc: Source classific code
     :return: Species profile
     :param ti: Time zone
     :param east: Determine whether it is in the Eastern time zone, default is True
     """
-    month_profile = MonthProfile()
-    week_profile = WeekProfile()
-    diurnal_profile = DiurnalProfile()
-    profile_f = open(profile_fn)
-    line = profile_f.readline()
-    while line:
-        line = line.strip()
-        if line == "/MONTHLY/":
-            while True:
-                line = profile_f.readline().split()
-                if line == "/END/":
-                    break
-                if line[0] == scc:
-                    line = [float(x) for x in line]
-                    month_profile.weights = np.array(line[1:]).astype('float')
-                    break
-        if line == "/WEEKLY/":
-            while True:
-                line = profile_f.readline().split()
-                if line == "/END/":
-                    break
-                if line[0] == scc:
-                    line = [float(x) for x in line]
-                    week_profile.weights = np.array(line[1:]).astype('float')
-                    break
-        if line == "/HOURLY/":
-            while True:
-                line = profile_f.readline().split()
-                if line == "/END/":
-                    break
-                if line[0] == scc:
-                    line = [float(x) for x in line]
-                    if ti == 0:
-                        diurnal_profile.weights = np.array(line[1:]).astype('float')
-                    else:
-                        diurnal = np.array(line[1:]).astype('float')
-                        if east is True:
-                            cut1 = diurnal[0:ti]
-                            cut2 = diurnal[ti:]
-                        else:
-                            cut1 = diurnal[0:len(diurnal) - ti]
-                            cut2 = diurnal[len(diurnal) - ti:]
-                        diurnal_profile.weights = cut2.join(cut1, 0)
-                    break
-        line = profile_f.readline()
-    profile_f.flush()
-    profile_f.close()
+    db = get_temporal_profile_db(None, profile_fn)
+    month_profile, week_profile, diurnal_profile, diurnal_profile_weekend = db.get_profiles(scc)
+    diurnal = diurnal_profile.weights
+    if ti != 0 and diurnal is not None:
+        if east is True:
+            cut1 = diurnal[0:ti]
+            cut2 = diurnal[ti:]
+        else:
+            cut1 = diurnal[0:len(diurnal) - ti]
+            cut2 = diurnal[len(diurnal) - ti:]
+        diurnal_profile.weights = cut2.join(cut1, 0)
     return month_profile, week_profile, diurnal_profile
 
 
+def _broadcast(weights, data):
+    """
+    Multiply the data by each weight with broadcasting. The weights dimension is inserted before
+    data dimensions.
+    """
+    shape = [len(weights)] + [1] * data.ndim
+    return weights.reshape(*shape) * data
+
+
 def month_allocation(data, month_profile):
     """
     Monthly allocation.
@@ -159,13 +65,8 @@ def month_allocation(data, month_profile):
     :param month_profile: Monthly profile.
     :return: Monthly emission data array - 3D.
     """
-    ny, nx = data.shape
-    m_data = np.zeros((12, ny, nx))
     weights = month_profile.get_ratios()
-    for i in range(12):
-        m_data[i] = data * weights[i]
-
-    return m_data
+    return _broadcast(weights, data)
 
 
 def get_weekend_days(year, month):
@@ -228,13 +129,7 @@ def week_allocation(data, week_profile, year, month, weekend_or_not=True):
     else:
         week_days = get_week_days(year, month)
         total_weight = (week_profile.weights * week_days).sum()
-        wdata = data / total_weight
-        ny, nx = data.shape
-        d_data = np.zeros((7, ny, nx))
-        for i in range(7):
-            d_data[i] = wdata * week_profile.weights[i]
-
-        return d_data
+        return _broadcast(week_profile.weights / float(total_weight), data)
 
 
 def diurnal_allocation(data, diurnal_profile):
@@ -245,33 +140,105 @@ def diurnal_allocation(data, diurnal_profile):
     :param diurnal_profile: Diurnal profile.
     :return: Hourly emission data array - 3D.
     """
-    ny, nx = data.shape
-    h_data = np.zeros((24, ny, nx))
     weights = diurnal_profile.get_ratios()
-    for i in range(24):
-        h_data[i] = data * weights[i]
+    return _broadcast(weights, data)
 
-    return h_data
 
+def get_day_ratio(week_profile, year, month, weekend=None):
+    """
+    Get the ratio of a day emission to the monthly emission by weekday and weekend weights.
 
-def month2hour(data, week_profile, diurnal_profile, year, month, weekend=False):
+    :param week_profile: (*WeekProfile*) Weekly profile.
+    :param year: (*int*) The year.
+    :param month: (*int*) The month.
+    :param weekend: (*bool*) Is weekend or not. `None` means the mean day of a week (5 weekdays
+        and 2 weekend days).
+    :return: (*float*) The day ratio.
+    """
+    mdays = calendar.monthrange(year, month)[1]
+    weekend_days = get_weekend_days(year, month)
+    weekday_days = mdays - weekend_days
+    weekday_weight = week_profile.weekday_weight
+    weekend_weight = week_profile.weekend_weight
+    total_weight = weekday_weight * weekday_days + weekend_weight * weekend_days
+    if weekend is None:
+        day_weight = (weekday_weight * 5 + weekend_weight * 2) / 7.
+    elif weekend:
+        day_weight = weekend_weight
+    else:
+        day_weight = weekday_weight
+    return day_weight / total_weight
+
+
+def month2hour(data, week_profile, diurnal_profile, year, month, weekend=False, ratio=1.):
     """
-    Allocated monthly emission data to hourly emission data
+    Allocated monthly emission data to hourly emission data. The week and diurnal ratios are
+    combined first, so the hourly data is calculated in one pass.
 
     :param data: Monthly emission data array - 2D.
     :param week_profile: Weekly profile.
     :param diurnal_profile: Diurnal profile.
     :param year: The year.
     :param month: The month.
-    :param weekend: Is weekend or not.
+    :param weekend: Is weekend or not. `None` means the mean day of a week (5 weekdays and 2
+        weekend days).
+    :param ratio: Extra ratio multiplied to the data, such as units conversion ratio. Default
+        is 1.
     :return: Hourly emission data array - 3D.
     """
-    w_data = month_allocation(data, week_profile, year, month)
-    if weekend:
-        d_data = diurnal_allocation(w_data[6], diurnal_profile)
+    day_ratio = get_day_ratio(week_profile, year, month, weekend)
+    weights = diurnal_profile.get_ratios() * (day_ratio * ratio)
+    return _broadcast(weights, data)
+
+
+def get_timeline_ratios(week_profile, diurnal_profile, diurnal_profile_weekend, year, month):
+    """
+    Get hourly ratios of each day in a month to the monthly emission. The daily weights are
+    from the week profile by the day of week, and the weekend days use the weekend diurnal
+    profile.
+
+    :param week_profile: (*WeekProfile*) Weekly profile.
+    :param diurnal_profile: (*DiurnalProfile*) Weekday diurnal profile.
+    :param diurnal_profile_weekend: (*DiurnalProfile*) Weekend diurnal profile. The weekday
+        diurnal profile is used if it is `None` or without weights.
+    :param year: (*int*) The year.
+    :param month: (*int*) The month.
+    :return: (*list*) (date, hourly ratios array) of each day.
+    """
+    week_days = get_week_days(year, month)
+    total_weight = float((week_profile.weights * week_days).sum())
+    weekday_ratios = diurnal_profile.get_ratios()
+    if diurnal_profile_weekend is None or diurnal_profile_weekend.weights is None:
+        weekend_ratios = weekday_ratios
     else:
-        d_data = diurnal_allocation(w_data[0], diurnal_profile)
-    return d_data
+        weekend_ratios = diurnal_profile_weekend.get_ratios()
+    r = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        t = datetime.datetime(year, month, day)
+        i = t.weekday()
+        hour_ratios = weekend_ratios if i in [5, 6] else weekday_ratios
+        r.append((t, hour_ratios * (week_profile.weights[i] / total_weight)))
+    return r
+
+
+def month2timeline(data, week_profile, diurnal_profile, diurnal_profile_weekend, year, month, ratio=1.):
+    """
+    Allocated monthly emission data to hourly emission data of each day in the month. The data
+    is generated day by day, so only one day of hourly data is in memory.
+
+    :param data: Monthly emission data array - 2D.
+    :param week_profile: Weekly profile.
+    :param diurnal_profile: Weekday diurnal profile.
+    :param diurnal_profile_weekend: Weekend diurnal profile.
+    :param year: The year.
+    :param month: The month.
+    :param ratio: Extra ratio multiplied to the data, such as units conversion ratio. Default
+        is 1.
+    :return: Generator of (date, hourly emission data array - 3D) of each day.
+    """
+    for t, weights in get_timeline_ratios(week_profile, diurnal_profile, diurnal_profile_weekend,
+                                          year, month):
+        yield t, _broadcast(weights * ratio, data)
 
 
 def get_month_days(year, month):
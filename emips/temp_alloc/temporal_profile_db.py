@@ -0,0 +1,179 @@
+import os
+import re
+import threading
+
+import mipylib.numeric as np
+from .month_profile import MonthProfile
+from .week_profile import WeekProfile
+from .diurnal_profile import DiurnalProfile
+
+__all__ = ['TemporalProfileDB', 'get_temporal_profile_db']
+
+# Profile blocks: (block name, profile file section names, number of weights)
+_blocks = [('month', ['/MONTHLY/'], 12),
+           ('week', ['/WEEKLY/'], 7),
+           ('diurnal', ['/DIURNAL WEEKDAY/', '/HOURLY/'], 24),
+           ('diurnal_weekend', ['/DIURNAL WEEKEND/'], 24)]
+
+# Default profile ids of SCC not in reference file
+_default_ids = ('462', '8', '33')
+
+# Temporal profile databases by (reference file, modified time, profile file, modified time)
+_dbs = {}
+_dbs_lock = threading.Lock()
+
+
+def _to_number(v):
+    try:
+        return int(v)
+    except ValueError:
+        return float(v)
+
+
+class TemporalProfileDB(object):
+
+    def __init__(self, ref_fn=None, profile_fn=None):
+        """
+        Temporal profile database. The monthly, weekly, diurnal weekday and diurnal weekend
+        profiles are parsed once into dense weight arrays indexed by profile id, and the SCC
+        references are kept in a dict.
+
+        Two file formats are supported. With a reference file, the profile file is SMOKE style
+        (`amptref` and `amptpro` files) with fixed width weights. Without a reference file, the
+        profile file is keyed by SCC directly with `/MONTHLY/`, `/WEEKLY/` and `/HOURLY/` sections
+        (same with `read_file_prof` function).
+
+        :param ref_fn: (*str*) The reference file. Default is `None`.
+        :param profile_fn: (*str*) The profile file.
+        """
+        self.ref_fn = ref_fn
+        self.profile_fn = profile_fn
+        self.references = {}
+        self.index = dict((block[0], {}) for block in _blocks)
+        self.weights = {}
+        if ref_fn is not None:
+            self._read_ref(ref_fn)
+        if profile_fn is not None:
+            self._read_profile(profile_fn, fixed_width=ref_fn is not None)
+
+    def __str__(self):
+        r = 'TemporalProfileDB: {}; {}'.format(self.ref_fn, self.profile_fn)
+        for name, section_names, nw in _blocks:
+            r += '\n\t{}: {} profiles'.format(name, len(self.index[name]))
+        return r
+
+    __repr__ = __str__
+
+    def _read_ref(self, ref_fn):
+        ref_f = open(ref_fn)
+        for line in ref_f:
+            data = line.split()
+            if len(data) < 4:
+                continue
+            # Keep the first reference of a SCC
+            if data[0] not in self.references:
+                self.references[data[0]] = (data[1], data[2], data[3])
+        ref_f.close()
+
+    def _read_profile(self, profile_fn, fixed_width=True):
+        sections = {}
+        for name, section_names, nw in _blocks:
+            for section_name in section_names:
+                sections[section_name] = (name, nw)
+        rows = dict((block[0], []) for block in _blocks)
+        block = None
+        profile_f = open(profile_fn)
+        for line in profile_f:
+            s = line.strip()
+            if block is None:
+                block = sections.get(s)
+                continue
+            if s == '/END/':
+                block = None
+                continue
+            name, nw = block
+            if fixed_width:
+                profile_id = line[:5].strip()
+                data = [_to_number(v) for v in re.findall(r'.{4}', line[5:])[:nw]]
+            else:
+                data = s.split()
+                if len(data) == 0:
+                    continue
+                profile_id = data[0]
+                data = [float(v) for v in data[1:nw + 1]]
+            if not profile_id or profile_id in self.index[name]:
+                continue
+            data.extend([0] * (nw - len(data)))
+            self.index[name][profile_id] = len(rows[name])
+            rows[name].append(data)
+        profile_f.close()
+
+        for name, section_names, nw in _blocks:
+            if rows[name]:
+                self.weights[name] = np.array(rows[name])
+            else:
+                self.weights[name] = np.zeros((0, nw))
+
+    def get_ids(self, scc):
+        """
+        Get month, week and diurnal profile ids of a SCC.
+
+        :param scc: (*str*) Source classification code.
+
+        :return: (*tuple*) Month, week and diurnal profile ids.
+        """
+        if self.ref_fn is None:
+            return scc, scc, scc
+        return self.references.get(scc, _default_ids)
+
+    def get_weights(self, name, profile_id):
+        """
+        Get profile weights.
+
+        :param name: (*str*) Profile block name [month | week | diurnal | diurnal_weekend].
+        :param profile_id: (*str*) Profile id.
+
+        :return: (*array*) Weights. `None` if the profile id not exists.
+        """
+        i = self.index[name].get(profile_id)
+        if i is None:
+            return None
+        return self.weights[name][i].copy()
+
+    def get_profiles(self, scc):
+        """
+        Get temporal profiles of a SCC.
+
+        :param scc: (*str*) Source classification code.
+
+        :return: (*tuple*) Month, week, diurnal weekday and diurnal weekend profiles.
+        """
+        month_id, week_id, diurnal_id = self.get_ids(scc)
+        month_profile = MonthProfile(weights=self.get_weights('month', month_id))
+        week_profile = WeekProfile(weights=self.get_weights('week', week_id))
+        diurnal_profile = DiurnalProfile(weights=self.get_weights('diurnal', diurnal_id))
+        diurnal_profile_weekend = DiurnalProfile(weights=self.get_weights('diurnal_weekend', diurnal_id))
+        return month_profile, week_profile, diurnal_profile, diurnal_profile_weekend
+
+
+def get_temporal_profile_db(ref_fn, profile_fn):
+    """
+    Get temporal profile database. The database is cached in memory by the file paths and
+    modified times, so the files are parsed only once in a process and shared by all sectors.
+
+    :param ref_fn: (*str*) The reference file. `None` for the profile file keyed by SCC.
+    :param profile_fn: (*str*) The profile file.
+
+    :return: (*TemporalProfileDB*) Temporal profile database.
+    """
+    profile_fn = os.path.abspath(profile_fn)
+    key = (profile_fn, os.path.getmtime(profile_fn))
+    if ref_fn is not None:
+        ref_fn = os.path.abspath(ref_fn)
+        key = (ref_fn, os.path.getmtime(ref_fn)) + key
+    with _dbs_lock:
+        db = _dbs.get(key)
+        if db is None:
+            db = TemporalProfileDB(ref_fn, profile_fn)
+            _dbs[key] = db
+        return db
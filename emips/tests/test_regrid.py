@@ -0,0 +1,47 @@
+"""
+# Purpose: Tests of the sparse regrid weights. Run with the Jython of MeteoInfo:
+#          python -m unittest emips.tests.test_regrid
+"""
+
+import unittest
+
+import mipylib.numeric as np
+from mipylib import geolib
+
+from emips.spatial_alloc import GridDesc, Regridder
+
+
+class RegridderTest(unittest.TestCase):
+
+    def setUp(self):
+        proj = geolib.projinfo()
+        self.source_grid = GridDesc(proj, x_orig=0., x_cell=1., x_num=3, y_orig=0., y_cell=1., y_num=1)
+        self.dest_grid = GridDesc(proj, x_orig=0., x_cell=1., x_num=4, y_orig=0., y_cell=1., y_num=1)
+
+    def test_padded_slots_ignore_nan(self):
+        # Rows with 1, 2, 1 and 0 weights, the source cell 0 is nan
+        rows = [[(0, 1.)], [(1, 0.5), (2, 0.5)], [(2, 1.)], []]
+        indices, weights = Regridder._to_ellpack(rows)
+        regridder = Regridder(self.source_grid, self.dest_grid, 'inside', indices, weights)
+        source = np.array([[np.nan, 1., 3.]])
+        dest = regridder.regrid(source)
+        self.assertTrue(np.isnan(dest[0, 0]))
+        self.assertAlmostEqual(dest[0, 1], 2.)
+        self.assertAlmostEqual(dest[0, 2], 3.)
+        self.assertTrue(np.isnan(dest[0, 3]))
+
+    def test_stacked_source(self):
+        rows = [[(1, 1.)], [(0, 0.5), (2, 0.5)], [(2, 1.)], [(1, 1.)]]
+        indices, weights = Regridder._to_ellpack(rows)
+        regridder = Regridder(self.source_grid, self.dest_grid, 'inside', indices, weights)
+        source = np.array([[[np.nan, 1., 3.]], [[1., 2., 4.]]])
+        dest = regridder.regrid(source)
+        self.assertEqual(list(dest.shape), [2, 1, 4])
+        self.assertAlmostEqual(dest[0, 0, 0], 1.)
+        self.assertTrue(np.isnan(dest[0, 0, 1]))
+        self.assertAlmostEqual(dest[1, 0, 1], 2.5)
+        self.assertAlmostEqual(dest[1, 0, 3], 2.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+# Purpose: Tests of the WRF-Chem species lookup by the chemical mechanism names. Run with the
+#          Jython of MeteoInfo: python -m unittest emips.tests.test_wrfchem_species
+"""
+
+import os
+import sys
+import unittest
+
+from emips.chem_spec import ChemMechEnum, get_wrfchem_mechanism_name, get_model_species_WRFChem
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'run', 'post_process', 'for_WRFChem'))
+from transform import get_species_table, aerosol_tables
+
+# WRF-Chem mechanisms and the PMC output species
+mechanisms = [(ChemMechEnum.CB05_wrfchem, 'E_PM10'),
+              (ChemMechEnum.SAPRC99_wrfchem, 'E_PM10'),
+              (ChemMechEnum.RADM2_wrfchem, 'E_PM_10'),
+              (ChemMechEnum.MOZART_wrfchem, 'E_PM_10')]
+
+
+class WRFChemSpeciesTest(unittest.TestCase):
+
+    def test_mechanism_name(self):
+        self.assertEqual(get_wrfchem_mechanism_name('CB05_wrfchem'), 'cb05')
+        self.assertEqual(get_wrfchem_mechanism_name('radm2'), 'radm2')
+        for mechanism, pm10 in mechanisms:
+            self.assertTrue(get_wrfchem_mechanism_name(mechanism.name) in aerosol_tables)
+
+    def test_model_species(self):
+        for mechanism, pm10 in mechanisms:
+            out_species, out_species_aer = get_model_species_WRFChem(mechanism.name)
+            self.assertTrue(pm10 in out_species)
+            self.assertTrue(pm10 in out_species_aer)
+        self.assertRaises(ValueError, get_model_species_WRFChem, 'CMAQ')
+
+    def test_species_table(self):
+        varnames = ['SO2', 'PMC', 'PMFINE']
+        for mechanism, pm10 in mechanisms:
+            out_species, out_species_aer = get_model_species_WRFChem(mechanism.name)
+            table = get_species_table(out_species, varnames, mechanism.name)
+            self.assertEqual([name for name, factor in table['PMC']], [pm10])
+            self.assertEqual(len(table['PMFINE']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 from .sector import *
 from .units import *
 from .emis_util import *
+from .task_graph import *
+from .profiler import *
 
 __all__ = sector.__all__
 __all__ += units.__all__
 __all__ += emis_util.__all__
+__all__ += task_graph.__all__
+__all__ += profiler.__all__
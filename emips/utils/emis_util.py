@@ -105,3 +105,45 @@ class EmissionReader(object):
         :return: (*GridDesc*) Emission grid description.
         """
         pass
+
+    def read_emis_window(self, sector, pollutant, year, month, window):
+        """
+        Read emission grid data in an index window of the emission grid. This default
+        implementation reads the whole data and slices it, the readers should override it to
+        read only the window from the data file.
+
+        :param sector: (*Sector*) The sector.
+        :param pollutant: (*Pollutant*) The pollutant.
+        :param year: (*int*) The year.
+        :param month: (*int*) The month.
+        :param window: (*tuple*) x_start, x_end, y_start, y_end indices of the emission grid.
+
+        :return: (*array*) Emission data array of the window.
+        """
+        data = self.read_emis(sector, pollutant, year, month)
+        if data is None:
+            return None
+        x_start, x_end, y_start, y_end = window
+        return data[y_start:y_end, x_start:x_end]
+
+    def read_emis_bbox(self, sector, pollutant, year, month, grid, halo=2):
+        """
+        Read emission grid data only in the bounding box of a grid, such as the model grid.
+
+        :param sector: (*Sector*) The sector.
+        :param pollutant: (*Pollutant*) The pollutant.
+        :param year: (*int*) The year.
+        :param month: (*int*) The month.
+        :param grid: (*GridDesc*) The grid to get the bounding box.
+        :param halo: (*int*) The number of extra emission grid cells around the bounding box.
+            Default is 2.
+
+        :return: (*tuple*) Emission data array and emission grid description of the bounding box.
+        """
+        emis_grid = self.get_emis_grid(sector)
+        window = emis_grid.window(grid, halo)
+        if window is None:
+            print('Alarm! Emission grid does not intersect with the grid, read whole data.')
+            return self.read_emis(sector, pollutant, year, month), emis_grid
+        data = self.read_emis_window(sector, pollutant, year, month, window)
+        return data, emis_grid.subgrid(*window)
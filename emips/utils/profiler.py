@@ -0,0 +1,436 @@
+import csv
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .task_graph import is_jython
+
+__all__ = ['Profiler', 'StageRecord', 'get_profiler', 'profile', 'profiled', 'profile_run', 'add_io',
+           'array_bytes']
+
+# Active profiler, `None` if profiling is not enabled
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def _cpu_time():
+    """
+    CPU time in seconds of current thread under Jython, or of the process under CPython.
+    """
+    if is_jython():
+        from java.lang.management import ManagementFactory
+        return ManagementFactory.getThreadMXBean().getCurrentThreadCpuTime() * 1e-9
+    t = os.times()
+    return t[0] + t[1]
+
+
+def _used_memory():
+    """
+    Used memory in bytes, the used heap of the JVM under Jython or the peak resident memory
+    of the process under CPython.
+    """
+    if is_jython():
+        from java.lang import Runtime
+        runtime = Runtime.getRuntime()
+        return runtime.totalMemory() - runtime.freeMemory()
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def _name(v):
+    if v is None:
+        return ''
+    return getattr(v, 'name', str(v))
+
+
+def array_bytes(a):
+    """
+    Get the data size in bytes of an array.
+
+    :param a: (*array*) The array.
+
+    :return: (*int*) The data size in bytes.
+    """
+    nbytes = getattr(a, 'nbytes', None)
+    if nbytes is None:
+        nbytes = a.size * getattr(a.dtype, 'itemsize', 8)
+    return int(nbytes)
+
+
+class StageRecord(object):
+
+    def __init__(self, name, sector='', pollutant='', period='', parent=None):
+        """
+        Record of a profiled stage.
+
+        :param name: (*str*) The stage name.
+        :param sector: (*str*) The sector name.
+        :param pollutant: (*str*) The pollutant name.
+        :param period: (*str*) The period, such as `2017-1`.
+        :param parent: (*StageRecord*) The parent stage in the same thread.
+        """
+        self.name = name
+        self.sector = sector
+        self.pollutant = pollutant
+        self.period = period
+        self.parent = parent
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.wall = 0.
+        self.cpu = _cpu_time()
+        self.child_wall = 0.
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_memory = _used_memory()
+
+    def __str__(self):
+        return 'Stage: {}; Sector: {}; Pollutant: {}; Wall: {:.3f}s'.format(self.name, self.sector,
+                                                                            self.pollutant, self.wall)
+
+    __repr__ = __str__
+
+    @property
+    def stack(self):
+        """
+        Stage names from the root stage to this stage.
+        """
+        names = []
+        record = self
+        while record is not None:
+            names.insert(0, record.name)
+            record = record.parent
+        return names
+
+    def sample_memory(self):
+        """
+        Sample the used memory and update the peak memory.
+        """
+        self.peak_memory = max(self.peak_memory, _used_memory())
+
+    def finish(self):
+        """
+        Finish the stage. The data of the stage are added to its parent stage.
+        """
+        self.wall = time.time() - self.start
+        self.cpu = _cpu_time() - self.cpu
+        self.sample_memory()
+        if self.parent is not None:
+            self.parent.child_wall += self.wall
+            self.parent.bytes_read += self.bytes_read
+            self.parent.bytes_written += self.bytes_written
+            self.parent.peak_memory = max(self.parent.peak_memory, self.peak_memory)
+
+    def to_dict(self):
+        """
+        To a dict.
+        """
+        d = OrderedDict()
+        d['stage'] = self.name
+        d['sector'] = self.sector
+        d['pollutant'] = self.pollutant
+        d['period'] = self.period
+        d['stack'] = ';'.join(self.stack)
+        d['thread'] = self.thread
+        d['start'] = self.start
+        d['wall'] = self.wall
+        d['self_wall'] = max(self.wall - self.child_wall, 0.)
+        d['cpu'] = self.cpu
+        d['bytes_read'] = self.bytes_read
+        d['bytes_written'] = self.bytes_written
+        d['peak_memory'] = self.peak_memory
+        return d
+
+
+class Profiler(object):
+
+    def __init__(self):
+        """
+        Profiler of the processing stages. Wall time, CPU time, bytes read and written and peak
+        memory of each stage are recorded with the sector, pollutant and period. The stages are
+        nested in each thread, and the values of a stage include its child stages.
+
+        CPU time is of the thread under Jython and of the process under CPython. Peak memory is
+        sampled at the start and the end of the stages, it is the used JVM heap under Jython and
+        the peak resident memory under CPython. The stages run in worker processes are not
+        recorded.
+        """
+        self.records = []
+        self.start = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return 'Profiler: {} stages'.format(len(self.records))
+
+    __repr__ = __str__
+
+    def current(self):
+        """
+        Get current stage of this thread.
+
+        :return: (*StageRecord*) Current stage. `None` if not in a stage.
+        """
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def stage(self, name, sector=None, pollutant=None, period=None):
+        """
+        Profile a stage. The sector, pollutant and period are inherited from the parent stage if
+        they are not set.
+
+        :param name: (*str*) The stage name.
+        :param sector: (*Sector*) The sector. Default is `None`.
+        :param pollutant: (*Pollutant*) The pollutant. Default is `None`.
+        :param period: (*str*) The period. Default is `None`.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        parent = stack[-1] if stack else None
+        sector = _name(sector) or (parent.sector if parent else '')
+        pollutant = _name(pollutant) or (parent.pollutant if parent else '')
+        period = period or (parent.period if parent else '')
+        record = StageRecord(name, sector, pollutant, period, parent)
+        stack.append(record)
+        try:
+            yield record
+        finally:
+            stack.pop()
+            record.finish()
+            with self._lock:
+                self.records.append(record)
+
+    def add_io(self, read=0, written=0):
+        """
+        Add bytes read and written to current stage of this thread.
+
+        :param read: (*int*) Bytes read.
+        :param written: (*int*) Bytes written.
+        """
+        record = self.current()
+        if record is not None:
+            record.bytes_read += read
+            record.bytes_written += written
+            record.sample_memory()
+
+    def summary(self):
+        """
+        Summary of the stages by stage name.
+
+        :return: (*list*) Summary dicts sorted by self wall time.
+        """
+        summary = OrderedDict()
+        for record in self.records:
+            d = record.to_dict()
+            s = summary.get(record.name)
+            if s is None:
+                s = OrderedDict([('stage', record.name), ('count', 0), ('wall', 0.), ('self_wall', 0.),
+                                 ('cpu', 0.), ('bytes_read', 0), ('bytes_written', 0), ('peak_memory', 0)])
+                summary[record.name] = s
+            s['count'] += 1
+            for key in ['wall', 'self_wall', 'cpu', 'bytes_read', 'bytes_written']:
+                s[key] += d[key]
+            s['peak_memory'] = max(s['peak_memory'], d['peak_memory'])
+        return sorted(summary.values(), key=lambda s: s['self_wall'], reverse=True)
+
+    def write_json(self, fn):
+        """
+        Write the stage records and summary to a JSON file.
+
+        :param fn: (*str*) The file name.
+        """
+        d = OrderedDict()
+        d['start'] = self.start
+        d['summary'] = self.summary()
+        d['stages'] = [record.to_dict() for record in self.records]
+        with open(fn, 'w') as f:
+            json.dump(d, f, indent=1)
+
+    def write_csv(self, fn):
+        """
+        Write the stage records to a CSV file.
+
+        :param fn: (*str*) The file name.
+        """
+        with open(fn, 'wb') as f:
+            writer = None
+            for record in self.records:
+                d = record.to_dict()
+                if writer is None:
+                    writer = csv.writer(f)
+                    writer.writerow(d.keys())
+                writer.writerow(d.values())
+
+    def write_trace(self, fn):
+        """
+        Write the stages to a trace event file (Chrome tracing JSON format), which can be viewed
+        as a flame chart in chrome://tracing, Perfetto or speedscope.
+
+        :param fn: (*str*) The file name.
+        """
+        threads = OrderedDict()
+        events = []
+        for record in self.records:
+            tid = threads.setdefault(record.thread, len(threads) + 1)
+            args = record.to_dict()
+            del args['stack']
+            events.append(OrderedDict([('name', record.name), ('cat', record.sector or 'run'),
+                                       ('ph', 'X'), ('pid', 1), ('tid', tid),
+                                       ('ts', int((record.start - self.start) * 1e6)),
+                                       ('dur', int(record.wall * 1e6)), ('args', args)]))
+        for thread, tid in threads.items():
+            events.append(OrderedDict([('name', 'thread_name'), ('ph', 'M'), ('pid', 1), ('tid', tid),
+                                       ('args', {'name': thread})]))
+        with open(fn, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def write_folded(self, fn):
+        """
+        Write the self wall time (microseconds) of the stage stacks to a folded stacks file,
+        which is the input of flamegraph.pl. The sector and pollutant are added to the stacks.
+
+        :param fn: (*str*) The file name.
+        """
+        folded = OrderedDict()
+        for record in self.records:
+            d = record.to_dict()
+            frames = [v for v in [d['period'], d['sector'], d['pollutant']] if v] + record.stack
+            key = ';'.join(frames)
+            folded[key] = folded.get(key, 0) + int(d['self_wall'] * 1e6)
+        with open(fn, 'w') as f:
+            for key, value in folded.items():
+                f.write('{} {}\n'.format(key, value))
+
+    def save(self, dir_out, name='profile'):
+        """
+        Write the JSON, CSV, trace and folded stacks files.
+
+        :param dir_out: (*str*) The output directory.
+        :param name: (*str*) The name prefix of the files. Default is `profile`.
+
+        :return: (*str*) The JSON file name.
+        """
+        if not os.path.exists(dir_out):
+            os.makedirs(dir_out)
+        fn = os.path.join(dir_out, '{}_{}'.format(name, time.strftime('%Y%m%d_%H%M%S')))
+        self.write_json(fn + '.json')
+        self.write_csv(fn + '.csv')
+        self.write_trace(fn + '.trace.json')
+        self.write_folded(fn + '.folded')
+        print('Profile: {}.json'.format(fn))
+        for s in self.summary():
+            print('{}: {} calls; wall {:.2f}s; self {:.2f}s; cpu {:.2f}s'.format(
+                s['stage'], s['count'], s['wall'], s['self_wall'], s['cpu']))
+        return fn + '.json'
+
+
+def get_profiler():
+    """
+    Get the active profiler.
+
+    :return: (*Profiler*) The active profiler. `None` if profiling is not enabled.
+    """
+    return _profiler
+
+
+@contextmanager
+def profile(name, sector=None, pollutant=None, period=None):
+    """
+    Profile a stage with the active profiler. Nothing is done if profiling is not enabled.
+
+    :param name: (*str*) The stage name.
+    :param sector: (*Sector*) The sector. Default is `None`.
+    :param pollutant: (*Pollutant*) The pollutant. Default is `None`.
+    :param period: (*str*) The period. Default is `None`.
+    """
+    profiler = _profiler
+    if profiler is None:
+        yield None
+    else:
+        with profiler.stage(name, sector, pollutant, period) as record:
+            yield record
+
+
+def add_io(read=0, written=0):
+    """
+    Add bytes read and written to current stage of the active profiler.
+
+    :param read: (*int*) Bytes read.
+    :param written: (*int*) Bytes written.
+    """
+    profiler = _profiler
+    if profiler is not None:
+        profiler.add_io(read, written)
+
+
+def _get_period(callargs):
+    run_config = callargs.get('run_config')
+    if run_config is not None:
+        return '{}-{}'.format(run_config.emission_year, run_config.emission_month)
+    if 'year' in callargs and 'month' in callargs:
+        return '{}-{}'.format(callargs['year'], callargs['month'])
+    return None
+
+
+def profiled(name):
+    """
+    Decorator to profile a function as a stage. The sector, pollutant and period are got from
+    the `sector`, `pollutant`, `run_config` (or `year` and `month`) arguments of the function.
+
+    :param name: (*str*) The stage name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return func(*args, **kwargs)
+            callargs = inspect.getcallargs(func, *args, **kwargs)
+            with profiler.stage(name, callargs.get('sector'), callargs.get('pollutant'),
+                                _get_period(callargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_run(name):
+    """
+    Decorator of a run entry function with a `run_config` argument. If `run_profile` of the run
+    configure is True and no profiler is active, a profiler is active during the function and
+    the reports are written to the `profile` directory of the output directory.
+
+    :param name: (*str*) The run name, which is the stage name and the name prefix of the reports.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            global _profiler
+            callargs = inspect.getcallargs(func, *args, **kwargs)
+            run_config = callargs.get('run_config')
+            with _profiler_lock:
+                start = _profiler is None and getattr(run_config, 'run_profile', False)
+                if start:
+                    _profiler = Profiler()
+            if not start:
+                with profile(name, period=_get_period(callargs)):
+                    return func(*args, **kwargs)
+            profiler = _profiler
+            try:
+                with profiler.stage(name, period=_get_period(callargs)):
+                    return func(*args, **kwargs)
+            finally:
+                with _profiler_lock:
+                    _profiler = None
+                profiler.save(os.path.join(run_config.run_output_dir, 'profile'), name)
+        return wrapper
+    return decorator
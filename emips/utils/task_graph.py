@@ -0,0 +1,248 @@
+import os
+import sys
+import threading
+import traceback
+import Queue
+
+__all__ = ['TaskGraph', 'is_jython', 'cpu_count']
+
+# Graph being run by the process pool. Worker processes are forked from the
+# parent so they see this module global and only need the task name.
+_process_graph = None
+
+
+def is_jython():
+    """
+    Whether running under Jython.
+
+    :return: (*bool*) True under Jython, otherwise False.
+    """
+    return sys.platform.startswith('java')
+
+
+def cpu_count():
+    """
+    Get number of available processors.
+
+    :return: (*int*) Number of processors.
+    """
+    if is_jython():
+        from java.lang import Runtime
+        return Runtime.getRuntime().availableProcessors()
+    else:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+
+
+def _run_process_task(name):
+    task = _process_graph.tasks[name]
+    try:
+        return name, True, task.func(*task.args, **task.kwargs)
+    except Exception:
+        return name, False, traceback.format_exc()
+
+
+class Task(object):
+
+    def __init__(self, name, func, args=(), kwargs=None, deps=None):
+        """
+        Task of a task graph.
+
+        :param name: (*str*) Unique task name.
+        :param func: (*function*) The function to be run.
+        :param args: (*tuple*) Positional arguments of the function.
+        :param kwargs: (*dict*) Keyword arguments of the function.
+        :param deps: (*list of str*) Names of the tasks need to be finished before this task.
+        """
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = {} if kwargs is None else kwargs
+        self.deps = [] if deps is None else list(deps)
+
+    def __str__(self):
+        return 'Task: {}; Deps: {}'.format(self.name, self.deps)
+
+    __repr__ = __str__
+
+
+class TaskGraph(object):
+
+    def __init__(self, workers=None, use_process=None):
+        """
+        Task graph scheduler. A task is submitted to the worker pool as soon as all its
+        dependencies are finished.
+
+        :param workers: (*int*) Number of workers. Default is `None` that the number of
+            processors is used. Tasks are run one by one in current thread if it is 1.
+        :param use_process: (*bool*) Use a process pool or a thread pool. Default is `None`
+            that threads are used under Jython and processes are used under CPython.
+        """
+        if workers is None or workers < 1:
+            workers = cpu_count()
+        self.workers = workers
+        if use_process is None:
+            use_process = not is_jython()
+        if use_process and os.name == 'nt':
+            # Worker processes are not forked on Windows
+            use_process = False
+        self.use_process = use_process
+        self.tasks = {}
+        self.order = []
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def add_task(self, name, func, args=(), kwargs=None, deps=None):
+        """
+        Add a task.
+
+        :param name: (*str*) Unique task name.
+        :param func: (*function*) The function to be run.
+        :param args: (*tuple*) Positional arguments of the function.
+        :param kwargs: (*dict*) Keyword arguments of the function.
+        :param deps: (*list of str*) Names of the tasks need to be finished before this task.
+
+        :return: (*Task*) The added task.
+        """
+        if name in self.tasks:
+            raise ValueError('Task already exists: {}'.format(name))
+        task = Task(name, func, args, kwargs, deps)
+        self.tasks[name] = task
+        self.order.append(name)
+        return task
+
+    def _check(self):
+        for name in self.order:
+            for dep in self.tasks[name].deps:
+                if dep not in self.tasks:
+                    raise ValueError('Task {} depends on unknown task: {}'.format(name, dep))
+
+    def run(self):
+        """
+        Run all tasks.
+
+        :return: (*dict*) Task results by task name.
+        """
+        self._check()
+        self.results = {}
+        self.errors = {}
+        self.skipped = []
+        self.n_deps = {}
+        self.dependents = dict((name, []) for name in self.order)
+        for name in self.order:
+            task = self.tasks[name]
+            self.n_deps[name] = len(task.deps)
+            for dep in task.deps:
+                self.dependents[dep].append(name)
+
+        ready = [name for name in self.order if self.n_deps[name] == 0]
+        if self.workers == 1:
+            self._run_serial(ready)
+        elif self.use_process:
+            self._run_process(ready)
+        else:
+            self._run_thread(ready)
+
+        if self.errors:
+            for name in self.order:
+                if name in self.errors:
+                    print('Task failed: {}\n{}'.format(name, self.errors[name]))
+            if self.skipped:
+                print('Tasks skipped: {}'.format(self.skipped))
+            raise RuntimeError('{} task(s) failed'.format(len(self.errors)))
+
+        return self.results
+
+    def _finish(self, name, ok, result):
+        """
+        Record a finished task and get the tasks become ready.
+        """
+        ready = []
+        if ok:
+            self.results[name] = result
+            for dep_name in self.dependents[name]:
+                self.n_deps[dep_name] -= 1
+                if self.n_deps[dep_name] == 0:
+                    ready.append(dep_name)
+        else:
+            self.errors[name] = result
+            self._skip(name)
+        return ready
+
+    def _skip(self, name):
+        for dep_name in self.dependents[name]:
+            if dep_name not in self.skipped:
+                self.skipped.append(dep_name)
+                self._skip(dep_name)
+
+    def _run_serial(self, ready):
+        ready = list(ready)
+        while ready:
+            name = ready.pop(0)
+            task = self.tasks[name]
+            try:
+                result = task.func(*task.args, **task.kwargs)
+                ready.extend(self._finish(name, True, result))
+            except Exception:
+                self._finish(name, False, traceback.format_exc())
+
+    def _run_thread(self, ready):
+        task_queue = Queue.Queue()
+        done_queue = Queue.Queue()
+
+        def worker():
+            while True:
+                name = task_queue.get()
+                if name is None:
+                    break
+                task = self.tasks[name]
+                try:
+                    done_queue.put((name, True, task.func(*task.args, **task.kwargs)))
+                except Exception:
+                    done_queue.put((name, False, traceback.format_exc()))
+
+        threads = []
+        for i in range(min(self.workers, len(self.order))):
+            t = threading.Thread(target=worker, name='emips-worker-{}'.format(i))
+            t.setDaemon(True)
+            t.start()
+            threads.append(t)
+
+        n_running = 0
+        for name in ready:
+            task_queue.put(name)
+            n_running += 1
+        while n_running > 0:
+            name, ok, result = done_queue.get()
+            n_running -= 1
+            for ready_name in self._finish(name, ok, result):
+                task_queue.put(ready_name)
+                n_running += 1
+
+        for t in threads:
+            task_queue.put(None)
+        for t in threads:
+            t.join()
+
+    def _run_process(self, ready):
+        import multiprocessing
+        global _process_graph
+        _process_graph = self
+        done_queue = Queue.Queue()
+        pool = multiprocessing.Pool(min(self.workers, len(self.order)))
+        try:
+            n_running = 0
+            for name in ready:
+                pool.apply_async(_run_process_task, (name,), callback=done_queue.put)
+                n_running += 1
+            while n_running > 0:
+                name, ok, result = done_queue.get()
+                n_running -= 1
+                for ready_name in self._finish(name, ok, result):
+                    pool.apply_async(_run_process_task, (ready_name,), callback=done_queue.put)
+                    n_running += 1
+        finally:
+            pool.close()
+            pool.join()
+            _process_graph = None
@@ -1,5 +1,7 @@
 from .vertical_profile import VerticalProfile
 from .vertical_allocation import *
+from .vertical_field import *
 
 __all__ = ['VerticalProfile']
 __all__ += vertical_allocation.__all__
+__all__ += vertical_field.__all__
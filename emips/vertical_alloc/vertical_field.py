@@ -0,0 +1,294 @@
+import hashlib
+import os
+import threading
+
+from mipylib import dataset
+from mipylib.geolib import projinfo, project
+import mipylib.numeric as np
+
+__all__ = ['VerticalField', 'plume_fractions', 'read_stack_file', 'read_grid_file',
+           'get_vertical_field']
+
+# Vertical fields by (file, modified time, sector, grid key, layer tops, default ratios)
+_fields = {}
+_fields_lock = threading.Lock()
+
+
+def _attr_str(f, key):
+    v = f.attrvalue(key)
+    if isinstance(v, basestring):
+        return v
+    return str(v[0])
+
+
+def _default_weights(default_ratios, z, grid):
+    if default_ratios is not None and len(default_ratios) != z:
+        raise ValueError('The default layer ratios number {} does not match the layer number {}'.format(
+            len(default_ratios), z))
+    if default_ratios is None:
+        default_ratios = np.zeros(z)
+        default_ratios[0] = 1.
+    return default_ratios.reshape(z, 1, 1) * np.ones((1, grid.y_num, grid.x_num))
+
+
+class VerticalField(object):
+
+    def __init__(self, weights):
+        """
+        Vertical layer fractions of each grid cell.
+
+        :param weights: (*array*) Layer fractions with (z, ny, nx) shape. The fractions of a
+            cell are summed to 1.
+        """
+        self.weights = weights
+
+    def __str__(self):
+        r = self.__class__.__name__
+        r += '\nShape: {}'.format(self.weights.shape)
+        return r
+
+    __repr__ = __str__
+
+    @property
+    def z(self):
+        """
+        Get layer number.
+        """
+        return self.weights.shape[0]
+
+    def get_layer(self, idx):
+        """
+        Get layer fractions.
+
+        :param idx: (*int*) Layer index.
+
+        :return: (*array*) Layer fractions with (ny, nx) shape.
+        """
+        return self.weights[idx]
+
+    def save(self, fn, grid):
+        """
+        Save the layer fractions to a netCDF file.
+
+        :param fn: (*str*) The file name.
+        :param grid: (*GridDesc*) The model grid.
+        """
+        zdim = np.dimension(np.arange(self.z), 'emissions_zdim')
+        ydim = np.dimension(grid.y_coord, 'lat', 'Y')
+        xdim = np.dimension(grid.x_coord, 'lon', 'X')
+        dims = [zdim, ydim, xdim]
+        gattrs = dict(Conventions='CF-1.6', Tools='Created using MeteoInfo', grid=str(grid.key()))
+        dimvar = dataset.DimVariable()
+        dimvar.name = 'fraction'
+        dimvar.dtype = np.dtype.float
+        dimvar.dims = dims
+        ncfile = dataset.addfile(fn, 'c')
+        ncfile.nc_define(dims, gattrs, [dimvar])
+        ncfile.write('fraction', self.weights)
+        ncfile.close()
+
+    @classmethod
+    def load(cls, fn, grid):
+        """
+        Load the layer fractions from a netCDF file.
+
+        :param fn: (*str*) The file name.
+        :param grid: (*GridDesc*) The model grid.
+
+        :return: (*VerticalField*) The vertical field.
+        """
+        f = dataset.addfile(fn)
+        if _attr_str(f, 'grid') != str(grid.key()):
+            f.close()
+            raise ValueError('The vertical fraction file does not match the grid: {}'.format(fn))
+        weights = f['fraction'][:]
+        f.close()
+        return cls(weights)
+
+
+def plume_fractions(stack_height, plume_rise, layer_tops):
+    """
+    Get layer fractions of a point source plume. The plume is centered at the effective height
+    (stack height + plume rise) with the depth of plume rise, and is allocated to the layers by
+    the overlapped heights. The plume above the top layer is allocated to the top layer.
+
+    :param stack_height: (*float*) Stack height (m).
+    :param plume_rise: (*float*) Plume rise (m).
+    :param layer_tops: (*list*) Layer top heights (m).
+
+    :return: (*list*) Layer fractions.
+    """
+    z = len(layer_tops)
+    fractions = [0.] * z
+    height = stack_height + plume_rise
+    bottom = height - 0.5 * plume_rise
+    top = height + 0.5 * plume_rise
+    if plume_rise <= 0 or bottom >= layer_tops[-1]:
+        for k in range(z):
+            if height < layer_tops[k]:
+                fractions[k] = 1.
+                return fractions
+        fractions[-1] = 1.
+        return fractions
+
+    depth = top - bottom
+    layer_bottom = 0.
+    for k in range(z):
+        layer_top = layer_tops[k] if k < z - 1 else max(layer_tops[k], top)
+        overlap = min(top, layer_top) - max(bottom, layer_bottom)
+        if overlap > 0:
+            fractions[k] = overlap / depth
+        layer_bottom = layer_top
+    return fractions
+
+
+def _read_stacks(stack_fn, sector_name):
+    stacks = []
+    stack_f = open(stack_fn)
+    for line in stack_f:
+        line = line.strip()
+        if not line or line[0] == '#':
+            continue
+        data = line.split()
+        if len(data) < 5 or data[0] != sector_name:
+            continue
+        weight = float(data[5]) if len(data) > 5 else 1.
+        stacks.append((float(data[1]), float(data[2]), float(data[3]), float(data[4]), weight))
+    stack_f.close()
+    return stacks
+
+
+def read_stack_file(stack_fn, sector_name, grid, layer_tops, default_ratios=None):
+    """
+    Read point source stack table and get the layer fractions of a sector. Each line of the
+    table is `sector lon lat stack_height plume_rise [weight]`, and the lines start with `#` are
+    comments. The plume fractions of the stacks in a grid cell are averaged by the weights (such
+    as the emission of the stack), and the cells without stacks use the default ratios.
+
+    :param stack_fn: (*str*) The stack table file.
+    :param sector_name: (*str*) The sector name.
+    :param grid: (*GridDesc*) The model grid.
+    :param layer_tops: (*list*) Layer top heights (m).
+    :param default_ratios: (*array*) Default layer ratios, the length should be the layer number.
+        Default is `None` that the emission of the cells without stacks is in the first layer.
+
+    :return: (*VerticalField*) The vertical field. `None` if no stack of the sector.
+    """
+    stacks = _read_stacks(stack_fn, sector_name)
+    if len(stacks) == 0:
+        return None
+
+    z = len(layer_tops)
+    lon = np.array([s[0] for s in stacks])
+    lat = np.array([s[1] for s in stacks])
+    if grid.proj.isLonLat():
+        x, y = lon, lat
+    else:
+        x, y = project(lon, lat, projinfo(), grid.proj)
+
+    cells = {}
+    for n in range(len(stacks)):
+        i = int(round((x[n] - grid.x_orig) / grid.x_cell))
+        j = int(round((y[n] - grid.y_orig) / grid.y_cell))
+        if i < 0 or i >= grid.x_num or j < 0 or j >= grid.y_num:
+            continue
+        weight = stacks[n][4]
+        fractions = plume_fractions(stacks[n][2], stacks[n][3], layer_tops)
+        cell = cells.setdefault((j, i), [0.] * (z + 1))
+        for k in range(z):
+            cell[k] += fractions[k] * weight
+        cell[z] += weight
+
+    weights = _default_weights(default_ratios, z, grid)
+    for (j, i), cell in cells.iteritems():
+        if cell[z] > 0:
+            weights[:, j, i] = np.array(cell[:z]) / cell[z]
+    print('Stacks of {} in {} grid cells'.format(sector_name, len(cells)))
+    return VerticalField(weights)
+
+
+def read_grid_file(grid_fn, sector_name, grid, default_ratios=None):
+    """
+    Read gridded layer fractions of a sector. The netCDF file has a (z, ny, nx) variable named
+    by the sector, or a `fraction` variable for all sectors. The fractions are normalized in
+    each grid cell, and the cells with zero fractions use the default ratios.
+
+    :param grid_fn: (*str*) The gridded fraction file.
+    :param sector_name: (*str*) The sector name.
+    :param grid: (*GridDesc*) The model grid.
+    :param default_ratios: (*array*) Default layer ratios, the length should be the layer number.
+        Default is `None` that the emission of the cells with zero fractions is in the first layer.
+
+    :return: (*VerticalField*) The vertical field. `None` if no variable of the sector.
+    """
+    f = dataset.addfile(grid_fn)
+    if sector_name in f.varnames:
+        weights = f[sector_name][:]
+    elif 'fraction' in f.varnames:
+        weights = f['fraction'][:]
+    else:
+        f.close()
+        return None
+    f.close()
+    if weights.ndim != 3 or weights.shape[1] != grid.y_num or weights.shape[2] != grid.x_num:
+        raise ValueError('The vertical fractions do not match the model grid: {}'.format(grid_fn))
+
+    z = weights.shape[0]
+    weights[weights == np.nan] = 0
+    total = weights.sum(axis=0)
+    default = _default_weights(default_ratios, z, grid)
+    weights = np.where(total > 0, weights / np.where(total > 0, total, 1.), default)
+    return VerticalField(weights)
+
+
+def get_vertical_field(sector_name, grid, stack_fn=None, grid_fn=None, layer_tops=None,
+                       default_ratios=None, cache_dir=None):
+    """
+    Get vertical layer fractions of a sector from a stack table or a gridded fraction file. The
+    fields are cached in memory by the file path and modified time, the sector and the grid, and
+    optionally in a directory.
+
+    :param sector_name: (*str*) The sector name.
+    :param grid: (*GridDesc*) The model grid.
+    :param stack_fn: (*str*) The stack table file. Default is `None`.
+    :param grid_fn: (*str*) The gridded fraction file, used if the stack file is `None`. Default
+        is `None`.
+    :param layer_tops: (*list*) Layer top heights (m), needed for the stack file.
+    :param default_ratios: (*array*) Default layer ratios of the cells without stacks.
+    :param cache_dir: (*str*) The directory to save and load the fraction files. Default is
+        `None`.
+
+    :return: (*VerticalField*) The vertical field. `None` if no fractions of the sector.
+    """
+    fn = stack_fn if stack_fn else grid_fn
+    if not fn:
+        return None
+    fn = os.path.abspath(fn)
+    key = (fn, os.path.getmtime(fn), sector_name, grid.key(),
+           None if layer_tops is None else tuple(layer_tops),
+           None if default_ratios is None else tuple(default_ratios.tolist()))
+    with _fields_lock:
+        if _fields.has_key(key):
+            return _fields[key]
+
+        field = None
+        cache_fn = None
+        if cache_dir is not None:
+            cache_fn = os.path.join(cache_dir, 'vertical_{}.nc'.format(hashlib.md5(str(key)).hexdigest()))
+            if os.path.isfile(cache_fn):
+                print('Load vertical fractions: {}'.format(cache_fn))
+                field = VerticalField.load(cache_fn, grid)
+        if field is None:
+            if stack_fn:
+                if not layer_tops:
+                    raise ValueError('The layer top heights are needed for the stack file')
+                field = read_stack_file(fn, sector_name, grid, layer_tops, default_ratios)
+            else:
+                field = read_grid_file(fn, sector_name, grid, default_ratios)
+            if field is not None and cache_fn is not None:
+                if not os.path.exists(cache_dir):
+                    os.makedirs(cache_dir)
+                print('Save vertical fractions: {}'.format(cache_fn))
+                field.save(cache_fn, grid)
+        _fields[key] = field
+    return field